@@ -0,0 +1,72 @@
+import asyncio
+import functools
+import contextvars
+import threading
+from django.conf import settings
+from django.db import connections
+from concurrent.futures import ThreadPoolExecutor
+
+_query_executor = None
+_query_executor_lock = threading.Lock()
+_thread_connections = []
+_thread_state = threading.local()
+
+
+def get_query_executor():
+  """
+    Return the process thread pool running async views queries, sized by
+    BLOG_ASYNC_QUERY_THREADS setting. Every thread holds its own database
+    connection, so the pool size bounds connections opened by async views.
+  """
+  global _query_executor
+  if _query_executor is None:
+    with _query_executor_lock:
+      if _query_executor is None:
+        _query_executor = ThreadPoolExecutor(
+          max_workers=settings.BLOG_ASYNC_QUERY_THREADS, thread_name_prefix="blog-query"
+        )
+  return _query_executor
+
+
+def shutdown_query_executor():
+  """
+    Stop the query thread pool and close its threads database connections,
+    e.g. before their database is dropped. Next 'run_query' starts a new pool.
+  """
+  global _query_executor
+  with _query_executor_lock:
+    executor, _query_executor = _query_executor, None
+  if executor is not None:
+    executor.shutdown(wait=True)
+  while _thread_connections:
+    connection = _thread_connections.pop()
+    # Its thread is gone, nothing else uses it
+    connection.inc_thread_sharing()
+    connection.close()
+
+
+def _call(function, args, kwargs):
+  if not getattr(_thread_state, "registered", False):
+    _thread_state.registered = True
+    _thread_connections.extend(connections.all())
+  try:
+    return function(*args, **kwargs)
+  finally:
+    # No request cycle in these threads. Connections stay open for the next
+    # queries, until they are older than CONN_MAX_AGE or broken.
+    for connection in connections.all():
+      connection.close_if_unusable_or_obsolete()
+
+
+async def run_query(function, *args, **kwargs):
+  """
+    Run sync 'function', which may query the database, in the query thread
+    pool. Unlike sync_to_async thread sensitive mode, calls do not wait for
+    each other, so independent queries of a view run concurrently.
+  """
+  loop = asyncio.get_event_loop()
+  # Executor threads do not inherit context variables, like database routing
+  context = contextvars.copy_context()
+  return await loop.run_in_executor(
+    get_query_executor(), functools.partial(context.run, _call, function, args, kwargs)
+  )
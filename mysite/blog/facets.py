@@ -0,0 +1,44 @@
+from . import models
+from django.core.cache import cache
+from django.db.models import F
+from .routers import primary_reads
+
+FEED_FACETS_CACHE_KEY = "blog:feed_facets"
+
+
+def build_feed_facets():
+  """
+    Build feed filters lists from database. Plain values are stored
+    instead of model instances, so they are cheap to pickle.
+    They are read from the primary, they are cached until invalidated.
+  """
+  with primary_reads():
+    return {
+      "categories": list(models.Category.objects.values("name", "slug")),
+      "authors": list(
+        models.AuthorStats.objects.filter(post_count__gt=0)
+        .order_by("author__username").values(username=F("author__username"))
+      ),
+      "tags": list(
+        models.TagStats.objects.filter(published_count__gt=0)
+        .order_by("-published_count", "tag__name")
+        .values(name=F("tag__name"), slug=F("tag__slug"), count=F("published_count"))
+      ),
+    }
+
+
+def get_feed_facets():
+  """
+    Return categories, authors and tags used by feed filters component.
+    They are built once and kept in cache until a signal invalidates them.
+  """
+  facets = cache.get(FEED_FACETS_CACHE_KEY)
+  if facets is None:
+    facets = build_feed_facets()
+    cache.set(FEED_FACETS_CACHE_KEY, facets, timeout=None)
+
+  return facets
+
+
+def invalidate_feed_facets():
+  cache.delete(FEED_FACETS_CACHE_KEY)
@@ -0,0 +1,239 @@
+import datetime
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+BACKFILL_CHANGE_REASON = "Backfilled"
+
+
+class RetentionPolicy:
+  """
+    History retention policy.
+
+    A historical row is pruned when all of the configured rules allow it:
+    it is not one of the 'keep_last' newest rows of its object, it is older
+    than 'keep_days' days and, with 'thin_daily', it is not the last row of
+    its object on that day. Newest row of every object is always kept, so
+    current state and deletion records survive.
+  """
+
+  def __init__(self, keep_last=None, keep_days=None, thin_daily=False):
+    self.keep_last = max(keep_last or 1, 1)
+    self.keep_days = keep_days
+    self.thin_daily = thin_daily
+
+  @classmethod
+  def from_settings(cls, config):
+    return cls(config.get("KEEP_LAST"), config.get("KEEP_DAYS"), config.get("THIN_DAILY", False))
+
+
+def get_retention_policies():
+  """
+    Return {historical model: policy} configured by BLOG_HISTORY_RETENTION
+    setting, keyed by tracked model label.
+  """
+  return {
+    apps.get_model(label).history.model: RetentionPolicy.from_settings(config)
+    for label, config in settings.BLOG_HISTORY_RETENTION.items()
+  }
+
+
+def get_tracked_models():
+  """
+    Return models whose changes are recorded by simple_history.
+  """
+  return [model for model in apps.get_models() if hasattr(model, "history")]
+
+
+def backfill_history(model, batch_size=500):
+  """
+    Create an initial historical row for every 'model' object without any,
+    like rows inserted out of the ORM. Missing objects are found by a
+    single anti-join on the history id index, read through a server-side
+    cursor and written in batches, so objects already tracked cost nothing
+    but that index lookup. Return created rows count.
+  """
+  history_model = model.history.model
+  missing = model.objects.filter(~Exists(history_model.objects.filter(id=OuterRef("pk")))).order_by("pk")
+
+  created = 0
+  batch = []
+  for obj in missing.iterator(chunk_size=batch_size):
+    batch.append(obj)
+    if len(batch) == batch_size:
+      created += len(model.history.bulk_history_create(batch, default_change_reason=BACKFILL_CHANGE_REASON))
+      batch = []
+  if batch:
+    created += len(model.history.bulk_history_create(batch, default_change_reason=BACKFILL_CHANGE_REASON))
+  return created
+
+
+def _prunable_sql(table, policy, now):
+  """
+    Return SQL selecting prunable history_id of 'table' for a list of
+    object ids, and its params after the ids one.
+  """
+  conditions = ["position > %s"]
+  params = [policy.keep_last]
+  if policy.keep_days is not None:
+    conditions.append("history_date < %s")
+    params.append(now - datetime.timedelta(days=policy.keep_days))
+  if policy.thin_daily:
+    conditions.append("day_position > 1")
+
+  sql = f"""
+    SELECT history_id FROM (
+      SELECT
+        history_id, history_date,
+        ROW_NUMBER() OVER (PARTITION BY id ORDER BY history_date DESC, history_id DESC) AS position,
+        ROW_NUMBER() OVER (
+          PARTITION BY id, CAST(history_date AS DATE) ORDER BY history_date DESC, history_id DESC
+        ) AS day_position
+      FROM {table}
+      WHERE id IN %s
+    ) AS ranked
+    WHERE {" AND ".join(conditions)}
+  """
+  return sql, params
+
+
+def prune_history_batch(history_model, policy, after_id=None, batch_size=500, now=None, dry_run=False):
+  """
+    Prune history of the next 'batch_size' objects with id above 'after_id',
+    in its own transaction. Return (last object id, pruned rows), last id
+    is None once every object was visited.
+  """
+  now = now or timezone.now()
+  table = connection.ops.quote_name(history_model._meta.db_table)
+
+  object_ids = history_model.objects.order_by("id")
+  if after_id is not None:
+    object_ids = object_ids.filter(id__gt=after_id)
+  object_ids = list(object_ids.values_list("id", flat=True).distinct()[:batch_size])
+  if not object_ids:
+    return None, 0
+
+  sql, params = _prunable_sql(table, policy, now)
+  with transaction.atomic(), connection.cursor() as cursor:
+    if dry_run:
+      cursor.execute(f"SELECT COUNT(*) FROM ({sql}) AS prunable", [tuple(object_ids), *params])
+      pruned = cursor.fetchone()[0]
+    else:
+      cursor.execute(f"DELETE FROM {table} WHERE history_id IN ({sql})", [tuple(object_ids), *params])
+      pruned = cursor.rowcount
+
+  return object_ids[-1], pruned
+
+
+def _add_months(day, months):
+  month = day.month - 1 + months
+  return day.replace(year=day.year + month // 12, month=month % 12 + 1, day=1)
+
+
+def _create_month_partitions(cursor, table, first_month, last_month, check_default=False):
+  month = first_month
+  while month <= last_month:
+    next_month = _add_months(month, 1)
+    if check_default:
+      # A partition can not take over rows already stored in default one
+      cursor.execute(
+        f"SELECT EXISTS (SELECT 1 FROM {table}_default WHERE history_date >= %s AND history_date < %s)",
+        [month, next_month]
+      )
+      if cursor.fetchone()[0]:
+        month = next_month
+        continue
+    cursor.execute(
+      f"CREATE TABLE IF NOT EXISTS {table}_p{month:%Y%m} PARTITION OF {table} "
+      f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')"
+    )
+    month = next_month
+
+
+def is_partitioned(history_model):
+  with connection.cursor() as cursor:
+    cursor.execute(
+      "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass)",
+      [history_model._meta.db_table]
+    )
+    return cursor.fetchone()[0]
+
+
+def partition_history_table(history_model, months_ahead=3, now=None):
+  """
+    Lay out a historical table as monthly range partitions of history_date,
+    PostgreSQL only. A plain table is converted in place: rows are copied
+    into a partitioned table keeping columns, indexes, foreign keys and id
+    sequence, under an exclusive lock. An already partitioned table only
+    gets partitions up to 'months_ahead' months from now. Rows out of every
+    partition land in the default one. Return created partitions count.
+  """
+  table = history_model._meta.db_table
+  now = now or timezone.now()
+  last_month = _add_months(now.date().replace(day=1), months_ahead)
+
+  with transaction.atomic(), connection.cursor() as cursor:
+    cursor.execute(
+      "SELECT COUNT(*) FROM pg_inherits WHERE inhparent = %s::regclass", [table]
+    )
+    partitions_before = cursor.fetchone()[0]
+
+    if is_partitioned(history_model):
+      _create_month_partitions(cursor, table, now.date().replace(day=1), last_month, check_default=True)
+    else:
+      # Deferred foreign key checks of an outer transaction would block table changes
+      cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+      cursor.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+      cursor.execute(
+        "SELECT pg_get_indexdef(indexrelid) FROM pg_index WHERE indrelid = %s::regclass AND NOT indisprimary",
+        [table]
+      )
+      index_defs = [row[0] for row in cursor.fetchall()]
+      cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype IN ('c', 'f')",
+        [table]
+      )
+      constraints = cursor.fetchall()
+      cursor.execute("SELECT pg_get_serial_sequence(%s, 'history_id')", [table])
+      sequence = cursor.fetchone()[0]
+      cursor.execute(f"SELECT MIN(history_date) FROM {table}")
+      oldest = cursor.fetchone()[0] or now
+
+      # Names are reused by the partitioned table, old table keeps its rows only
+      old_table = f"{table}_unpartitioned"
+      cursor.execute(f"ALTER TABLE {table} RENAME TO {old_table}")
+      cursor.execute(
+        "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'c', 'f')", [old_table]
+      )
+      for (constraint, ) in cursor.fetchall():
+        cursor.execute(f'ALTER TABLE {old_table} DROP CONSTRAINT "{constraint}"')
+      cursor.execute(
+        "SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = %s::regclass", [old_table]
+      )
+      for (index, ) in cursor.fetchall():
+        cursor.execute(f"DROP INDEX {index}")
+
+      # Partition key must be part of the primary key, history_id stays
+      # unique through its sequence.
+      cursor.execute(
+        f"CREATE TABLE {table} (LIKE {old_table} INCLUDING DEFAULTS) PARTITION BY RANGE (history_date)"
+      )
+      cursor.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (history_id, history_date)")
+      for index_def in index_defs:
+        cursor.execute(index_def)
+      for constraint, definition in constraints:
+        cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT "{constraint}" {definition}')
+      cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.history_id")
+
+      _create_month_partitions(cursor, table, oldest.date().replace(day=1), last_month)
+      cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+      cursor.execute(f"INSERT INTO {table} SELECT * FROM {old_table}")
+      cursor.execute(f"DROP TABLE {old_table}")
+
+    cursor.execute(
+      "SELECT COUNT(*) FROM pg_inherits WHERE inhparent = %s::regclass", [table]
+    )
+    return cursor.fetchone()[0] - partitions_before
@@ -0,0 +1,154 @@
+import atexit
+import logging
+import threading
+from . import models
+from . import pagecache
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class LikeBuffer:
+  """
+    Write-behind like buffer.
+
+    Like and unlike toggles are kept in process memory, coalesced per
+    (user, post) so only the last state is written, and flushed in bulk by
+    a background thread every 'flush_interval' seconds or as soon as
+    'max_pending' toggles are waiting. It absorbs like storms on hot posts,
+    which otherwise contend on the same likes and post rows.
+    Buffered state is local to the process, so a user only sees their own
+    pending like on requests served by the same worker.
+  """
+
+  def __init__(self, flush_interval=1.0, max_pending=1000, start_flusher=True):
+    self.flush_interval = flush_interval
+    self.max_pending = max_pending
+    self.start_flusher = start_flusher
+    self._pending = {}
+    self._lock = threading.Lock()
+    self._wakeup = threading.Event()
+    self._thread = None
+
+  def record(self, user_id, post_id, liked):
+    """
+      Store the new like state of an user on a post. It replaces any
+      pending toggle for the same (user, post).
+    """
+    with self._lock:
+      self._pending[(user_id, post_id)] = liked
+      full = len(self._pending) >= self.max_pending
+
+    self._ensure_flusher()
+    if full:
+      self._wakeup.set()
+
+  def pending_state(self, user_id, post_id):
+    """
+      Return the buffered like state of an user on a post, or None when
+      there is nothing pending.
+    """
+    with self._lock:
+      return self._pending.get((user_id, post_id))
+
+  def merge(self, user_id, post_id, like_count, liked):
+    """
+      Merge stored like state with the buffered one, so users see their own
+      like before it is flushed. Returns a (like_count, liked) tuple.
+    """
+    pending = self.pending_state(user_id, post_id)
+    if pending is None or pending == liked:
+      return like_count, liked
+    return like_count + (1 if pending else -1), pending
+
+  def flush(self):
+    """
+      Write every pending toggle to database. Returns the number of
+      (user, post) toggles written.
+    """
+    with self._lock:
+      pending, self._pending = self._pending, {}
+    if not pending:
+      return 0
+
+    try:
+      post_ids = models.Post.objects.apply_like_changes(pending)
+    except Exception:
+      # Put toggles back, newer toggles recorded meanwhile win
+      with self._lock:
+        for key, liked in pending.items():
+          self._pending.setdefault(key, liked)
+      raise
+
+    # Authors likes totals move once per flush
+    models.AuthorStats.objects.apply_total_deltas()
+    pagecache.purge(*(pagecache.post_key(post_id) for post_id in post_ids))
+    return len(pending)
+
+  def _ensure_flusher(self):
+    if not self.start_flusher or self._thread is not None:
+      return
+
+    with self._lock:
+      if self._thread is None:
+        self._thread = threading.Thread(target=self._run, name="like-buffer-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+  def _run(self):
+    while True:
+      self._wakeup.wait(self.flush_interval)
+      self._wakeup.clear()
+      close_old_connections()
+      try:
+        self.flush()
+      except Exception:
+        logger.exception("Like buffer flush failed")
+
+
+_like_buffer = None
+_like_buffer_lock = threading.Lock()
+
+
+def get_like_buffer():
+  """
+    Return the process like buffer, or None if buffered likes are disabled
+    in BLOG_LIKE_BUFFER setting.
+  """
+  global _like_buffer
+  config = settings.BLOG_LIKE_BUFFER
+  if not config["ENABLED"]:
+    return None
+
+  if _like_buffer is None:
+    with _like_buffer_lock:
+      if _like_buffer is None:
+        _like_buffer = LikeBuffer(config["FLUSH_INTERVAL"], config["MAX_PENDING"])
+  return _like_buffer
+
+
+def write_like(post_id, user, liked):
+  """
+    Like or unlike a post. Writes go straight to database unless the like
+    buffer is enabled. Returns the likes count seen by the user, or None if
+    post does not exist.
+  """
+  like_buffer = get_like_buffer()
+  if like_buffer is None:
+    if liked:
+      like_count = models.Post.objects.add_like(post_id, user.id)
+    else:
+      like_count = models.Post.objects.remove_like(post_id, user.id)
+
+    if like_count is not None:
+      pagecache.purge_on_commit(pagecache.post_key(post_id))
+    return like_count
+
+  post = models.Post.objects.with_liked_by(user).filter(pk=post_id).values("like_count", "liked_post").first()
+  if post is None:
+    return None
+
+  like_buffer.record(user.id, post_id, liked)
+  like_count, _ = like_buffer.merge(user.id, post_id, post["like_count"], post["liked_post"])
+  return like_count
@@ -0,0 +1,32 @@
+from blog.history import backfill_history, get_tracked_models
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+  help = "Create an initial historical row for tracked objects without any"
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      "--model", action="append", default=[],
+      help="Tracked model label, like blog.Post. Every tracked model by default."
+    )
+    parser.add_argument(
+      "--batch-size", type=int, default=500,
+      help="Historical rows inserted per query."
+    )
+
+  def handle(self, *args, **options):
+    models = get_tracked_models()
+    if options["model"]:
+      try:
+        models = [apps.get_model(label) for label in options["model"]]
+      except LookupError as error:
+        raise CommandError(f"Unknown tracked model: {error}")
+      untracked = [model for model in models if not hasattr(model, "history")]
+      if untracked:
+        raise CommandError(f"Unknown tracked model: {untracked[0]._meta.label}")
+
+    for model in models:
+      created = backfill_history(model, options["batch_size"])
+      self.stdout.write(f"{model._meta.label}: {created} historical rows created")
@@ -0,0 +1,126 @@
+import time
+import asyncio
+from django.conf import settings
+from django.test import RequestFactory
+from django.db.backends.signals import connection_created
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(latencies, percent):
+  index = min(len(latencies) - 1, int(round(percent / 100 * (len(latencies) - 1))))
+  return latencies[index]
+
+
+class Command(BaseCommand):
+  help = (
+    "Compare WSGI and ASGI request latencies of blog pages, in process. "
+    "Requests are sent by concurrent clients against current database."
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      "paths", nargs="*", default=["/home/"],
+      help="Paths to request, every client requests them in turn."
+    )
+    parser.add_argument(
+      "--requests", type=int, default=200,
+      help="Requests per path and handler."
+    )
+    parser.add_argument(
+      "--concurrency", type=int, default=20,
+      help="Concurrent clients."
+    )
+    parser.add_argument(
+      "--wsgi-threads", type=int, default=4,
+      help="WSGI worker threads, like a threaded WSGI server worker."
+    )
+    parser.add_argument(
+      "--query-delay", type=float, default=0.0,
+      help="Milliseconds added to every query, to simulate a remote or loaded database."
+    )
+
+  def handle(self, *args, **options):
+    host = next((host for host in settings.ALLOWED_HOSTS if "*" not in host), "localhost")
+    if options["query_delay"]:
+      delay = options["query_delay"] / 1000
+
+      def delayed_execute(execute, sql, params, many, context):
+        time.sleep(delay)
+        return execute(sql, params, many, context)
+
+      def add_delay(sender, connection, **kwargs):
+        connection.execute_wrappers.append(delayed_execute)
+
+      connection_created.connect(add_delay, weak=False)
+
+    paths = options["paths"] * options["requests"]
+    for name, run in (("WSGI", self.run_wsgi), ("ASGI", self.run_asgi)):
+      # Warm up caches and connections, then measure
+      run(options["paths"] * options["concurrency"], host, options)
+      started = time.monotonic()
+      latencies = sorted(run(paths, host, options))
+      elapsed = time.monotonic() - started
+      self.stdout.write(
+        f"{name}: {len(latencies)} requests, {len(latencies) / elapsed:.1f} req/s, "
+        f"p50 {percentile(latencies, 50):.1f} ms, p95 {percentile(latencies, 95):.1f} ms, "
+        f"p99 {percentile(latencies, 99):.1f} ms, max {latencies[-1]:.1f} ms"
+      )
+
+  def run_wsgi(self, paths, host, options):
+    """
+      Clients wait for a free WSGI worker thread, like on a threaded server.
+    """
+    handler = WSGIHandler()
+    factory = RequestFactory(HTTP_HOST=host)
+
+    def request(path):
+      response = handler(factory.get(path).environ, lambda status, headers: None)
+      b"".join(response)
+      response.close()
+
+    def client(path):
+      # Time waiting for a free worker is part of the latency
+      started = time.monotonic()
+      workers.submit(request, path).result()
+      return (time.monotonic() - started) * 1000
+
+    with ThreadPoolExecutor(options["wsgi_threads"]) as workers:
+      with ThreadPoolExecutor(options["concurrency"]) as clients:
+        return list(clients.map(client, paths))
+
+  def run_asgi(self, paths, host, options):
+    """
+      Clients share a single event loop, like a single ASGI server worker.
+    """
+    handler = ASGIHandler()
+
+    async def request(path, slots):
+      async with slots:
+        started = time.monotonic()
+        done = asyncio.Event()
+
+        async def receive():
+          return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+          if message["type"] == "http.response.body" and not message.get("more_body"):
+            done.set()
+
+        path, _, query_string = path.partition("?")
+        scope = {
+          "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+          "scheme": "http", "path": path, "query_string": query_string.encode(), "server": (host, 80),
+          "client": ("127.0.0.1", 0), "headers": [(b"host", host.encode())],
+        }
+        await handler(scope, receive, send)
+        await done.wait()
+        return (time.monotonic() - started) * 1000
+
+    async def run():
+      slots = asyncio.Semaphore(options["concurrency"])
+      return await asyncio.gather(*(request(path, slots) for path in paths))
+
+    return asyncio.run(run())
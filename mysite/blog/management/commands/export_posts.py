@@ -0,0 +1,26 @@
+from blog.transfer import export_posts
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+  help = "Export posts with their tags, likes and comments as JSON lines"
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      "--output", "-o",
+      help="File to write to, standard output by default."
+    )
+    parser.add_argument(
+      "--chunk-size", type=int, default=500,
+      help="Posts fetched per server-side cursor round trip."
+    )
+
+  def handle(self, *args, **options):
+    if options["output"]:
+      with open(options["output"], "w", encoding="utf-8") as stream:
+        exported = export_posts(stream, chunk_size=options["chunk_size"])
+    else:
+      exported = export_posts(self.stdout, chunk_size=options["chunk_size"])
+
+    # Standard output may hold the posts, summary goes to standard error
+    self.stderr.write(f"{exported} posts exported!")
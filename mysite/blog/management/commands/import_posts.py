@@ -0,0 +1,30 @@
+import sys
+from blog.transfer import PostImporter
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+  help = "Import posts with their tags, likes and comments from JSON lines written by export_posts"
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      "input",
+      help="File to read from, '-' for standard input."
+    )
+    parser.add_argument(
+      "--batch-size", type=int, default=500,
+      help="Posts imported per transaction."
+    )
+
+  def handle(self, *args, **options):
+    importer = PostImporter(batch_size=options["batch_size"])
+    try:
+      if options["input"] == "-":
+        imported, skipped = importer.import_lines(sys.stdin)
+      else:
+        with open(options["input"], encoding="utf-8") as stream:
+          imported, skipped = importer.import_lines(stream)
+    except (KeyError, ValueError) as error:
+      raise CommandError(f"Invalid post record: {error!r}")
+
+    self.stdout.write(f"{imported} posts imported, {skipped} already existing posts skipped!")
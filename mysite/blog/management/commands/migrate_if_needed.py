@@ -0,0 +1,30 @@
+from django.db import connection
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db.migrations.executor import MigrationExecutor
+
+# pg_advisory_lock key, shared by every container starting at once
+MIGRATION_LOCK_ID = 4502
+
+
+class Command(BaseCommand):
+  help = (
+    "Apply pending migrations, skipped when the database schema is current. "
+    "Concurrent runs wait for each other on PostgreSQL."
+  )
+
+  def handle(self, *args, **options):
+    with connection.cursor() as cursor:
+      if connection.vendor == "postgresql":
+        cursor.execute("SELECT pg_advisory_lock(%s)", [MIGRATION_LOCK_ID])
+      try:
+        executor = MigrationExecutor(connection)
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+        if not plan:
+          self.stdout.write("No pending migrations, skipping.")
+          return
+        self.stdout.write(f"{len(plan)} pending migrations.")
+        call_command("migrate", interactive=False, verbosity=options["verbosity"], stdout=self.stdout)
+      finally:
+        if connection.vendor == "postgresql":
+          cursor.execute("SELECT pg_advisory_unlock(%s)", [MIGRATION_LOCK_ID])
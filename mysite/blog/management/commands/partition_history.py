@@ -0,0 +1,33 @@
+from blog.history import partition_history_table
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+  help = "Lay out historical tables as monthly partitions, or add upcoming months to them"
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      "--model", action="append", default=[],
+      help="Tracked model label, like blog.Post. Every model of BLOG_HISTORY_RETENTION by default."
+    )
+    parser.add_argument(
+      "--months-ahead", type=int, default=3,
+      help="Months after the current one to create partitions for."
+    )
+
+  def handle(self, *args, **options):
+    if connection.vendor != "postgresql":
+      raise CommandError("History partitioning needs PostgreSQL")
+
+    labels = options["model"] or list(settings.BLOG_HISTORY_RETENTION)
+    for label in labels:
+      try:
+        history_model = apps.get_model(label).history.model
+      except (LookupError, AttributeError) as error:
+        raise CommandError(f"Unknown tracked model: {error}")
+
+      created = partition_history_table(history_model, options["months_ahead"])
+      self.stdout.write(f"{label}: {created} partitions created")
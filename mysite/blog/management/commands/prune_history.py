@@ -0,0 +1,73 @@
+import time
+from blog.history import get_retention_policies, prune_history_batch
+from django.apps import apps
+from django.utils import timezone
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+  help = "Prune historical rows out of BLOG_HISTORY_RETENTION policies, in batches of objects"
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      "--model", action="append", default=[],
+      help="Tracked model label, like blog.Post. Every configured model by default."
+    )
+    parser.add_argument(
+      "--after-id", type=int,
+      help="Resume after this object id, printed by an interrupted or failed run. Needs a single --model."
+    )
+    parser.add_argument(
+      "--batch-size", type=int, default=500,
+      help="Objects pruned per transaction."
+    )
+    parser.add_argument(
+      "--sleep", type=float, default=0.0,
+      help="Seconds to sleep between batches, to leave room to other writes."
+    )
+    parser.add_argument(
+      "--dry-run", action="store_true",
+      help="Count prunable rows without deleting them."
+    )
+
+  def handle(self, *args, **options):
+    policies = get_retention_policies()
+    history_models = list(policies)
+    if options["model"]:
+      try:
+        history_models = [apps.get_model(label).history.model for label in options["model"]]
+      except (LookupError, AttributeError) as error:
+        raise CommandError(f"Unknown tracked model: {error}")
+      unconfigured = [model for model in history_models if model not in policies]
+      if unconfigured:
+        raise CommandError(f"No retention policy for {unconfigured[0].instance_type._meta.label}")
+    if options["after_id"] is not None and len(history_models) != 1:
+      raise CommandError("--after-id needs a single --model")
+
+    # Same cutoff for every batch, a long run does not prune a moving window
+    now = timezone.now()
+    for history_model in history_models:
+      label = history_model.instance_type._meta.label
+      after_id = options["after_id"]
+      total = 0
+      finished = False
+      try:
+        while True:
+          last_id, pruned = prune_history_batch(
+            history_model, policies[history_model], after_id, options["batch_size"], now, options["dry_run"]
+          )
+          if last_id is None:
+            break
+          after_id = last_id
+          total += pruned
+          if options["sleep"]:
+            time.sleep(options["sleep"])
+        finished = True
+      finally:
+        # Interrupted or failed, a database error included: batches up to
+        # 'after_id' are committed
+        if not finished and after_id is not None:
+          self.stderr.write(f"Stopped, resume with: --model {label} --after-id {after_id}")
+
+      action = "prunable" if options["dry_run"] else "pruned"
+      self.stdout.write(f"{label}: {total} historical rows {action}")
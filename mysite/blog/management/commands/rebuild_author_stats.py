@@ -0,0 +1,31 @@
+from blog.models import AuthorStats, AuthorStatsDelta, Post
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max, Q, Sum
+
+
+class Command(BaseCommand):
+  help = "Rebuild authors stats table from posts table"
+
+  def handle(self, *args, **options):
+    with transaction.atomic():
+      if connection.vendor == "postgresql":
+        # Posts writes would update stats rows being rebuilt, they wait until commit.
+        with connection.cursor() as cursor:
+          cursor.execute(f"LOCK TABLE {Post._meta.db_table} IN SHARE MODE")
+
+      stats = (
+        Post.objects.order_by().values("author_id").annotate(
+          post_count=Count("id"),
+          published_count=Count("id", filter=Q(is_live=True)),
+          like_count=Sum("like_count"),
+          comment_count=Sum("comment_count"),
+          last_published_at=Max("publish_date", filter=Q(is_live=True))
+        )
+      )
+      # Rebuilt totals already hold pending deltas
+      AuthorStatsDelta.objects.all().delete()
+      AuthorStats.objects.all().delete()
+      created = AuthorStats.objects.bulk_create([AuthorStats(**author_stats) for author_stats in stats])
+
+    self.stdout.write(f"Stats rebuilt for {len(created)} authors!")
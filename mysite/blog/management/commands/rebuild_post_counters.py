@@ -0,0 +1,22 @@
+from blog.models import Post, PostComment
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+class Command(BaseCommand):
+  help = "Rebuild posts 'like_count' and 'comment_count' columns from likes and comments tables"
+
+  def handle(self, *args, **options):
+    likes = Post.likes.through.objects.filter(post_id=OuterRef("pk")).order_by().values("post_id")
+    comments = PostComment.objects.filter(post_id=OuterRef("pk")).order_by().values("post_id")
+
+    updated = Post.objects.update(
+      like_count=Coalesce(
+        Subquery(likes.annotate(total=Count("*")).values("total"), output_field=IntegerField()), 0
+      ),
+      comment_count=Coalesce(
+        Subquery(comments.annotate(total=Count("*")).values("total"), output_field=IntegerField()), 0
+      )
+    )
+    self.stdout.write(f"Counters rebuilt for {updated} posts!")
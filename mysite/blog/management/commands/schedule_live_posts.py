@@ -0,0 +1,45 @@
+import time
+from blog import pagecache
+from blog.models import AuthorStats, Post
+from blog.facets import invalidate_feed_facets
+from django.utils import timezone
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+  help = "Flip posts 'is_live' flag when their publish or deactivate date is reached"
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      "--once", action="store_true",
+      help="Refresh live posts a single time and exit."
+    )
+    parser.add_argument(
+      "--max-sleep", type=float, default=60.0,
+      help="Max seconds to sleep between refreshes, so new scheduled posts are noticed."
+    )
+    parser.add_argument(
+      "--stats-interval", type=float, default=10.0,
+      help="Max seconds between updates of authors likes and comments totals."
+    )
+
+  def handle(self, *args, **options):
+    while True:
+      published_ids, deactivated_ids = Post.objects.refresh_live_posts()
+      if published_ids or deactivated_ids:
+        # Tags counts of filters component change too
+        invalidate_feed_facets()
+        pagecache.purge(pagecache.FACETS_KEY, *pagecache.post_listing_keys([*published_ids, *deactivated_ids]))
+        self.stdout.write(f"{len(published_ids)} posts published, {len(deactivated_ids)} posts deactivated")
+      AuthorStats.objects.apply_total_deltas()
+
+      if options["once"]:
+        break
+
+      now = timezone.now()
+      next_transition = Post.objects.get_next_transition(now)
+      sleep_time = min(options["max_sleep"], options["stats_interval"])
+      if next_transition is not None:
+        # Deactivate date is inclusive, wake up right after the boundary.
+        sleep_time = min(sleep_time, (next_transition - now).total_seconds() + 0.001)
+      time.sleep(max(sleep_time, 0))
@@ -1,6 +1,75 @@
-import datetime
-from django.db import models
-from django.db.models import Q
+from taggit.models import Tag, TaggedItem
+from django.utils import timezone
+from django.dispatch import Signal
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, models, router, transaction
+from django.db.models.functions import Cast
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import (
+  Q, F, Min, Case, Count, Exists, OuterRef, Value, When, BooleanField, FloatField
+)
+
+# Text search configuration used by 'blog_post_search_vector_trigger'
+SEARCH_CONFIG = "english"
+
+# Sent by PostManager.save_with_tags with added and removed tags ids.
+# Tagged items are bulk inserted, so they do not send post_save.
+post_tags_synced = Signal()
+
+
+def live_posts_q(now):
+  """
+    Return the predicate matching posts which can be considered as 'Published'
+    at 'now' date. It is only evaluated by the live posts scheduler, feed
+    queries use the materialized 'is_live' flag.
+  """
+  return (
+    Q(publish_date__lte=now) &
+    Q(status="published") &
+    (Q(deactivate_date=None) | Q(deactivate_date__gte=now))
+  )
+
+# Single statement like writes for PostgreSQL. Post row is only updated
+# when the like row was really inserted or deleted.
+LIKE_INSERT_SQL = """
+  WITH changed AS (
+    INSERT INTO {likes} ({post_id}, {user_id}) VALUES (%(post)s, %(user)s)
+    ON CONFLICT DO NOTHING RETURNING 1
+  ), updated AS (
+    UPDATE {posts} SET like_count = like_count + 1
+    WHERE id = %(post)s AND EXISTS (SELECT 1 FROM changed) RETURNING like_count
+  )
+  SELECT like_count FROM updated
+  UNION ALL
+  SELECT like_count FROM {posts} WHERE id = %(post)s AND NOT EXISTS (SELECT 1 FROM changed)
+"""
+LIKE_DELETE_SQL = """
+  WITH changed AS (
+    DELETE FROM {likes} WHERE {post_id} = %(post)s AND {user_id} = %(user)s RETURNING 1
+  ), updated AS (
+    UPDATE {posts} SET like_count = like_count - 1
+    WHERE id = %(post)s AND EXISTS (SELECT 1 FROM changed) RETURNING like_count
+  )
+  SELECT like_count FROM updated
+  UNION ALL
+  SELECT like_count FROM {posts} WHERE id = %(post)s AND NOT EXISTS (SELECT 1 FROM changed)
+"""
+# Pending deltas are deleted and summed per author in the same statement,
+# so a concurrent fold can not apply them twice.
+AUTHOR_TOTALS_SQL = """
+  WITH deltas AS (
+    DELETE FROM {deltas} RETURNING author_id, like_count, comment_count
+  )
+  UPDATE {stats} SET
+    like_count = {stats}.like_count + totals.like_count,
+    comment_count = {stats}.comment_count + totals.comment_count
+  FROM (
+    SELECT author_id, sum(like_count) AS like_count, sum(comment_count) AS comment_count
+    FROM deltas GROUP BY author_id
+  ) AS totals
+  WHERE {stats}.author_id = totals.author_id
+"""
+
 
 # Customs Queries Sets
 class PostQuerySet(models.query.QuerySet):
@@ -14,17 +83,11 @@ class PostQuerySet(models.query.QuerySet):
 
   def get_published_posts(self):
     """
-      This function return published posts. It takes into accounts
-      posts 'publish date', their 'post status' and their 'deactivate_date'.
+      This function return published posts. Publish window is materialized
+      in 'is_live' flag, which is flipped by the live posts scheduler when
+      a 'publish_date' or 'deactivate_date' is reached.
     """
-    now_date = datetime.datetime.now()
-    posts = self.filter(
-      Q(publish_date__lte=now_date) &
-      Q(status="published") &
-      (Q(deactivate_date=None) | Q(deactivate_date__gte=now_date))
-    )
-
-    return posts
+    return self.filter(is_live=True)
   
   def get_posts_by_category(self, category):
     """
@@ -40,9 +103,65 @@ class PostQuerySet(models.query.QuerySet):
   
   def get_posts_by_tags(self, tags):
     """
-      This functions returns every posts filtered by a tag.
+      This functions returns every posts having any of 'tags'. Tags are
+      matched in a semi-join subquery, so a post having several of them
+      is returned once.
     """
-    return self.filter(tags__name__in=tags)
+    return self.filter(pk__in=self._tagged_items(tags).values("object_id"))
+
+  def get_posts_by_all_tags(self, tags):
+    """
+      This functions returns every posts having all of 'tags'. Tagged items
+      are grouped by post and only posts matching every tag are kept
+      (HAVING COUNT), instead of joining tags table once per tag.
+    """
+    tags = sorted(set(tags))
+    tagged_posts = (
+      self._tagged_items(tags).values("object_id")
+      .annotate(matched_tags=Count("tag_id", distinct=True))
+      .filter(matched_tags=len(tags))
+      .values("object_id")
+    )
+    return self.filter(pk__in=tagged_posts)
+
+  def _tagged_items(self, tags):
+    content_type = ContentType.objects.get_for_model(self.model)
+    return TaggedItem.objects.filter(content_type=content_type, tag__name__in=tags)
+
+  def search(self, text):
+    """
+      This function returns posts matching a web search style 'text'
+      (quoted phrases, 'or', '-word'), annotated with their 'rank'.
+      Title matches weigh more than content ones.
+    """
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+    # ts_rank is a 'real', it is casted so keyset cursors keep its exact value
+    rank = Cast(SearchRank(F("search_vector"), query), output_field=FloatField())
+
+    return self.filter(search_vector=query).annotate(rank=rank)
+
+  def with_liked_by(self, user):
+    """
+      This function annotates 'liked_post' on every post, it means if 'user'
+      likes the post. It is resolved in the same query as posts.
+    """
+    if not user.is_authenticated:
+      return self.annotate(liked_post=Value(False, output_field=BooleanField()))
+
+    likes = self.model.likes.through.objects.filter(post_id=OuterRef("pk"), user_id=user.pk)
+    return self.annotate(liked_post=Exists(likes))
+
+  def for_feed(self):
+    """
+      This function returns posts ready for feeds. Post author is joined in
+      the same query and only columns rendered by posts cards are fetched,
+      so 'content' is never loaded. Likes and comments counts come from
+      denormalized columns, no extra aggregate is needed.
+    """
+    return self.select_related("author").only(
+      "id", "title", "slug", "publish_date", "updated_at", "like_count", "comment_count",
+      "author", "author__id", "author__username"
+    )
 
 
 # Custom Managers
@@ -67,4 +186,311 @@ class PostManager(models.Manager):
     return self.get_queryset().get_posts_by_author(author)
 
   def get_posts_by_tags(self, tags):
-    return self.get_queryset().get_posts_by_tags(tags)
\ No newline at end of file
+    return self.get_queryset().get_posts_by_tags(tags)
+
+  def get_posts_by_all_tags(self, tags):
+    return self.get_queryset().get_posts_by_all_tags(tags)
+
+  def search(self, text):
+    return self.get_queryset().search(text)
+
+  def with_liked_by(self, user):
+    return self.get_queryset().with_liked_by(user)
+
+  def for_feed(self):
+    return self.get_queryset().for_feed()
+
+  def refresh_live_posts(self, now=None):
+    """
+      Flip 'is_live' flag of posts whose publish window started or ended.
+      Returns a tuple with published posts ids and deactivated posts ids.
+      Rows are locked while ids are read and the window predicate is
+      checked again by the updates, so a post edited meanwhile (back to
+      draft, say) is never flipped from its old state.
+    """
+    now = now or timezone.now()
+    live = live_posts_q(now)
+
+    with transaction.atomic():
+      published = self.filter(live, is_live=False)
+      deactivated = self.filter(is_live=True).exclude(live)
+      published_ids = list(published.select_for_update().values_list("id", flat=True))
+      deactivated_ids = list(deactivated.select_for_update().values_list("id", flat=True))
+      published.filter(id__in=published_ids).update(is_live=True)
+      deactivated.filter(id__in=deactivated_ids).update(is_live=False)
+
+    return published_ids, deactivated_ids
+
+  def get_next_transition(self, now=None):
+    """
+      Return the next date when a post is published or deactivated, so
+      schedulers and caches know when feed content will change.
+      Returns None if there are no scheduled changes.
+    """
+    now = now or timezone.now()
+    next_publish = self.filter(
+      status="published", is_live=False, publish_date__gt=now
+    ).aggregate(date=Min("publish_date"))["date"]
+    next_deactivate = self.filter(
+      is_live=True, deactivate_date__gte=now
+    ).aggregate(date=Min("deactivate_date"))["date"]
+
+    dates = [date for date in (next_publish, next_deactivate) if date is not None]
+    return min(dates) if dates else None
+
+  def add_like(self, post_id, user_id):
+    """
+      Store a like from an user on a post. 'like_count' column is increased
+      atomically only when the like did not exist before, so repeated likes
+      are harmless. Returns the new likes count, or None if post does not exist.
+    """
+    using = router.db_for_write(self.model)
+    if connections[using].vendor == "postgresql":
+      return self._write_like(LIKE_INSERT_SQL, post_id, user_id, using)
+
+    through = self.model.likes.through
+    with transaction.atomic(using=using):
+      _, created = through.objects.using(using).get_or_create(post_id=post_id, user_id=user_id)
+      if created:
+        self.using(using).filter(pk=post_id).update(like_count=F("like_count") + 1)
+      return self._get_like_count(post_id, using)
+
+  def remove_like(self, post_id, user_id):
+    """
+      Remove a like from an user on a post. 'like_count' column is decreased
+      atomically only when a like was really deleted, so repeated unlikes
+      are harmless. Returns the new likes count, or None if post does not exist.
+    """
+    using = router.db_for_write(self.model)
+    if connections[using].vendor == "postgresql":
+      return self._write_like(LIKE_DELETE_SQL, post_id, user_id, using)
+
+    through = self.model.likes.through
+    with transaction.atomic(using=using):
+      deleted, _ = through.objects.using(using).filter(post_id=post_id, user_id=user_id).delete()
+      if deleted:
+        self.using(using).filter(pk=post_id).update(like_count=F("like_count") - deleted)
+      return self._get_like_count(post_id, using)
+
+  def _write_like(self, sql, post_id, user_id, using):
+    """
+      Run a like insert/delete and its counter update as a single statement.
+      Post row is only written when the like really changed.
+    """
+    through = self.model.likes.through
+    quote_name = connections[using].ops.quote_name
+    sql = sql.format(
+      likes=quote_name(through._meta.db_table),
+      post_id=quote_name(through._meta.get_field("post").column),
+      user_id=quote_name(through._meta.get_field("user").column),
+      posts=quote_name(self.model._meta.db_table),
+    )
+
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+      cursor.execute(sql, {"post": post_id, "user": user_id})
+      row = cursor.fetchone()
+      if row is None:
+        # Unknown post, likes foreign key is deferred so the write is discarded here.
+        transaction.set_rollback(True, using=using)
+        return None
+
+    return row[0]
+
+  def _get_like_count(self, post_id, using):
+    like_count = self.using(using).filter(pk=post_id).values_list("like_count", flat=True).first()
+    if like_count is None:
+      transaction.set_rollback(True, using=using)
+    return like_count
+
+  def apply_like_changes(self, changes):
+    """
+      Write a batch of like changes in a constant number of statements.
+      'changes' maps (user_id, post_id) to the final like state. Only likes
+      rows really inserted or deleted are counted, their net delta per post
+      is added to 'like_count' with a single F-expression update, so a hot
+      post likes are never counted again.
+      Returns the ids of the updated posts.
+    """
+    using = router.db_for_write(self.model)
+    post_ids = {post_id for _, post_id in changes}
+
+    with transaction.atomic(using=using):
+      post_ids = set(self.using(using).filter(pk__in=post_ids).values_list("pk", flat=True))
+      likes = [(user_id, post_id) for (user_id, post_id), liked in changes.items() if liked and post_id in post_ids]
+      unlikes = [(user_id, post_id) for (user_id, post_id), liked in changes.items() if not liked and post_id in post_ids]
+
+      if connections[using].vendor == "postgresql":
+        inserted, deleted = self._write_like_rows(likes, unlikes, using)
+      else:
+        inserted, deleted = self._diff_like_rows(likes, unlikes, using)
+
+      deltas = {}
+      for post_id in inserted:
+        deltas[post_id] = deltas.get(post_id, 0) + 1
+      for post_id in deleted:
+        deltas[post_id] = deltas.get(post_id, 0) - 1
+      deltas = {post_id: delta for post_id, delta in deltas.items() if delta}
+      if deltas:
+        self.using(using).filter(pk__in=deltas).update(like_count=Case(
+          *(When(pk=post_id, then=F("like_count") + delta) for post_id, delta in deltas.items()),
+          default=F("like_count")
+        ))
+
+    return post_ids
+
+  def _write_like_rows(self, likes, unlikes, using):
+    """
+      Insert 'likes' and delete 'unlikes' (user_id, post_id) rows, each in
+      a single statement. Returns the post ids of the rows really inserted
+      and deleted, one per row.
+    """
+    through = self.model.likes.through
+    quote_name = connections[using].ops.quote_name
+    table = quote_name(through._meta.db_table)
+    user_column = quote_name(through._meta.get_field("user").column)
+    post_column = quote_name(through._meta.get_field("post").column)
+    inserted, deleted = [], []
+
+    with connections[using].cursor() as cursor:
+      if likes:
+        cursor.execute(
+          f"INSERT INTO {table} ({user_column}, {post_column}) VALUES {', '.join(['(%s, %s)'] * len(likes))} "
+          f"ON CONFLICT DO NOTHING RETURNING {post_column}",
+          [value for pair in likes for value in pair]
+        )
+        inserted = [row[0] for row in cursor.fetchall()]
+      if unlikes:
+        cursor.execute(
+          f"DELETE FROM {table} WHERE ({user_column}, {post_column}) IN "
+          f"({', '.join(['(%s, %s)'] * len(unlikes))}) RETURNING {post_column}",
+          [value for pair in unlikes for value in pair]
+        )
+        deleted = [row[0] for row in cursor.fetchall()]
+    return inserted, deleted
+
+  def _diff_like_rows(self, likes, unlikes, using):
+    """
+      Same as '_write_like_rows' for databases without RETURNING support,
+      existing rows are read first inside the batch transaction.
+    """
+    through = self.model.likes.through
+    predicate = Q()
+    for user_id, post_id in likes + unlikes:
+      predicate |= Q(user_id=user_id, post_id=post_id)
+    existing = set()
+    if predicate:
+      existing = set(through.objects.using(using).filter(predicate).values_list("user_id", "post_id"))
+
+    inserted = [pair for pair in likes if pair not in existing]
+    deleted = [pair for pair in unlikes if pair in existing]
+    through.objects.using(using).bulk_create(
+      [through(user_id=user_id, post_id=post_id) for user_id, post_id in inserted], ignore_conflicts=True
+    )
+    if deleted:
+      predicate = Q()
+      for user_id, post_id in deleted:
+        predicate |= Q(user_id=user_id, post_id=post_id)
+      through.objects.using(using).filter(predicate).delete()
+    return [post_id for _, post_id in inserted], [post_id for _, post_id in deleted]
+
+  def forget_user_likes(self, user_id):
+    """
+      Decrease 'like_count' of every post liked by 'user_id'. Likes rows of
+      a deleted user are removed without signals, so this runs before.
+    """
+    liked = self.model.likes.through.objects.filter(user_id=user_id).values("post_id")
+    return self.filter(pk__in=liked).update(like_count=F("like_count") - 1)
+
+  def update_comment_count(self, post_id, delta):
+    """
+      Add 'delta' to 'comment_count' column using an atomic F-expression.
+    """
+    return self.filter(pk=post_id).update(comment_count=F("comment_count") + delta)
+
+  def save_with_tags(self, post, names):
+    """
+      Save 'post' and set its tags to 'names'. Current tags are diffed
+      against submitted ones, so only missing tags and tagged items are
+      inserted and only removed tagged items are deleted, each in a single
+      statement whatever the number of tags. Tags changes are stored as
+      the change reason of the post history entry.
+    """
+    names = list(dict.fromkeys(names))
+    content_type = ContentType.objects.get_for_model(self.model)
+    current = {}
+    if post.pk is not None:
+      current = dict(
+        TaggedItem.objects.filter(content_type=content_type, object_id=post.pk).values_list("tag__name", "tag_id")
+      )
+
+    added_names = [name for name in names if name not in current]
+    removed_ids = [tag_id for name, tag_id in current.items() if name not in names]
+    if added_names or removed_ids:
+      reason = ", ".join([f"+{name}" for name in added_names] + [f"-{name}" for name in current if name not in names])
+      post._change_reason = f"Tags: {reason}"[:100]
+
+    with transaction.atomic():
+      post.save()
+      if removed_ids:
+        TaggedItem.objects.filter(content_type=content_type, object_id=post.pk, tag_id__in=removed_ids).delete()
+
+      added_ids = []
+      if added_names:
+        added_ids = list(self.get_or_create_tags(added_names).values())
+        TaggedItem.objects.bulk_create(
+          [TaggedItem(content_type=content_type, object_id=post.pk, tag_id=tag_id) for tag_id in added_ids],
+          ignore_conflicts=True
+        )
+
+    if added_ids or removed_ids:
+      post_tags_synced.send(sender=self.model, instance=post, added=added_ids, removed=removed_ids)
+    return added_ids, removed_ids
+
+  def get_or_create_tags(self, names):
+    """
+      Return a name -> id dict of 'names' tags, missing ones are bulk
+      created. A tag whose slug is already taken is created by taggit,
+      which picks another slug.
+    """
+    tags = dict(Tag.objects.filter(name__in=names).values_list("name", "id"))
+    missing_names = [name for name in names if name not in tags]
+    if missing_names:
+      Tag.objects.bulk_create(
+        [Tag(name=name, slug=Tag().slugify(name)) for name in missing_names], ignore_conflicts=True
+      )
+      tags.update(Tag.objects.filter(name__in=missing_names).values_list("name", "id"))
+
+    for name in names:
+      if name not in tags:
+        tags[name] = Tag.objects.create(name=name).id
+    return tags
+
+
+class AuthorStatsManager(models.Manager):
+  """
+    Author stats manager.
+
+    Likes and comments totals of an author are moved in batches, from the
+    deltas appended by posts counters updates, see AuthorStatsDelta.
+  """
+
+  def apply_total_deltas(self):
+    """
+      Fold pending likes and comments deltas into authors stats rows with a
+      single statement, every author row is written once per batch.
+      Returns the number of authors updated.
+    """
+    using = router.db_for_write(self.model)
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+      # Stats are kept by PostgreSQL triggers only
+      return 0
+
+    delta_model = self.model._meta.apps.get_model("blog", "AuthorStatsDelta")
+    sql = AUTHOR_TOTALS_SQL.format(
+      stats=connection.ops.quote_name(self.model._meta.db_table),
+      deltas=connection.ops.quote_name(delta_model._meta.db_table),
+    )
+    with connection.cursor() as cursor:
+      cursor.execute(sql)
+      return cursor.rowcount
@@ -0,0 +1,31 @@
+from .routers import pin_to_primary
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.deprecation import MiddlewareMixin
+
+
+class AsgiUrlconfMiddleware(MiddlewareMixin):
+  """
+    ASGI urlconf middleware.
+
+    Routes ASGI requests with BLOG_ASGI_URLCONF setting, where read only
+    blog views are native async views. WSGI requests keep ROOT_URLCONF.
+  """
+
+  def process_request(self, request):
+    if isinstance(request, ASGIRequest) and settings.BLOG_ASGI_URLCONF:
+      request.urlconf = settings.BLOG_ASGI_URLCONF
+
+
+class PrimaryStickinessMiddleware(MiddlewareMixin):
+  """
+    Primary stickiness middleware.
+
+    Clients sending a write request (comment, like, post edit, ...) read
+    from the primary database for a while, see blog/routers.py.
+  """
+
+  def process_response(self, request, response):
+    if settings.BLOG_DB_REPLICAS and request.method not in ("GET", "HEAD", "OPTIONS", "TRACE"):
+      pin_to_primary(response)
+    return response
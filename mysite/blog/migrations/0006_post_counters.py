@@ -0,0 +1,47 @@
+# Generated by Django 3.1.5 on 2026-10-18 15:07
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_post_counters(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    PostComment = apps.get_model('blog', 'PostComment')
+    likes = Post.likes.through.objects.filter(post_id=OuterRef('pk')).order_by().values('post_id')
+    comments = PostComment.objects.filter(post_id=OuterRef('pk')).order_by().values('post_id')
+    Post.objects.update(
+        like_count=Coalesce(Subquery(likes.annotate(total=Count('*')).values('total'), output_field=IntegerField()), 0),
+        comment_count=Coalesce(Subquery(comments.annotate(total=Count('*')).values('total'), output_field=IntegerField()), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_auto_20210115_1928'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalpost',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='historicalpost',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_post_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.5 on 2026-10-18 15:10
+
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+
+def fill_is_live(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    now = timezone.now()
+    Post.objects.filter(
+        Q(publish_date__lte=now) &
+        Q(status='published') &
+        (Q(deactivate_date=None) | Q(deactivate_date__gte=now))
+    ).update(is_live=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_post_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalpost',
+            name='is_live',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='is_live',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(fill_is_live, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.1.5 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taggit', '0003_taggeditem_add_unique_index'),
+        ('blog', '0007_post_is_live'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(is_live=True), fields=['-publish_date', '-id'], name='blog_post_live_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-publish_date', '-id'], name='blog_post_author_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(is_live=True), fields=['category', '-publish_date', '-id'], name='blog_post_cat_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', 'publish_date', 'deactivate_date'], name='blog_post_window_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(is_live=True), fields=['deactivate_date'], name='blog_post_live_deact_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-created_at'], name='blog_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postcomment',
+            index=models.Index(fields=['post', '-posted_at', '-id'], name='blog_comment_post_idx'),
+        ),
+        # Tag -> posts lookups used by tags filter. Taggit model can not be
+        # changed from this app, so its index is created with raw SQL.
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS blog_taggeditem_tag_obj_idx '
+            'ON taggit_taggeditem (tag_id, content_type_id, object_id);',
+            'DROP INDEX IF EXISTS blog_taggeditem_tag_obj_idx;',
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 3.1.5 on 2026-10-18 17:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Likes and comments totals are summed from posts counters on read, the
+# trigger does not run on counters updates, so likes and comments of an
+# author's posts do not all wait on their single stats row.
+AUTHOR_STATS_SQL = """
+CREATE FUNCTION blog_authorstats_update() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'UPDATE' AND NEW.author_id = OLD.author_id THEN
+    IF NEW.is_live IS DISTINCT FROM OLD.is_live OR NEW.publish_date IS DISTINCT FROM OLD.publish_date THEN
+      UPDATE blog_authorstats SET
+        published_count = published_count + NEW.is_live::int - OLD.is_live::int,
+        last_published_at = CASE
+          WHEN NEW.is_live THEN GREATEST(last_published_at, NEW.publish_date) ELSE last_published_at
+        END
+      WHERE author_id = NEW.author_id;
+    END IF;
+  ELSE
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+      UPDATE blog_authorstats SET
+        post_count = post_count - 1,
+        published_count = published_count - OLD.is_live::int
+      WHERE author_id = OLD.author_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+      INSERT INTO blog_authorstats (author_id, post_count, published_count, last_published_at)
+      VALUES (NEW.author_id, 1, NEW.is_live::int, CASE WHEN NEW.is_live THEN NEW.publish_date END)
+      ON CONFLICT (author_id) DO UPDATE SET
+        post_count = blog_authorstats.post_count + 1,
+        published_count = blog_authorstats.published_count + EXCLUDED.published_count,
+        last_published_at = GREATEST(blog_authorstats.last_published_at, EXCLUDED.last_published_at);
+    END IF;
+  END IF;
+
+  -- A live post left the author feed, last published date is looked up again
+  IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.is_live AND (
+    TG_OP = 'DELETE' OR NOT NEW.is_live OR NEW.author_id <> OLD.author_id OR NEW.publish_date < OLD.publish_date
+  ) THEN
+    UPDATE blog_authorstats SET last_published_at = (
+      SELECT max(publish_date) FROM blog_post WHERE author_id = OLD.author_id AND is_live
+    )
+    WHERE author_id = OLD.author_id;
+  END IF;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER blog_authorstats_trigger
+AFTER INSERT OR DELETE OR UPDATE OF author_id, is_live, publish_date ON blog_post
+FOR EACH ROW EXECUTE PROCEDURE blog_authorstats_update();
+
+INSERT INTO blog_authorstats (author_id, post_count, published_count, last_published_at)
+SELECT author_id, count(*), count(*) FILTER (WHERE is_live), max(publish_date) FILTER (WHERE is_live)
+FROM blog_post GROUP BY author_id;
+"""
+
+DROP_AUTHOR_STATS_SQL = """
+DROP TRIGGER IF EXISTS blog_authorstats_trigger ON blog_post;
+DROP FUNCTION IF EXISTS blog_authorstats_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('blog', '0009_post_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='blog_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('post_count', models.PositiveIntegerField(default=0)),
+                ('published_count', models.PositiveIntegerField(default=0)),
+                ('last_published_at', models.DateTimeField(null=True)),
+            ],
+            options={
+                'verbose_name': 'author stats',
+                'verbose_name_plural': 'author stats',
+            },
+        ),
+        migrations.RunSQL(AUTHOR_STATS_SQL, DROP_AUTHOR_STATS_SQL),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 3.1.5 on 2026-10-18 17:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+POST_CONTENT_TYPE_SQL = "(SELECT id FROM django_content_type WHERE app_label = 'blog' AND model = 'post')"
+
+TAG_STATS_SQL = f"""
+CREATE FUNCTION blog_tagstats_item_update() RETURNS trigger AS $$
+DECLARE
+  item taggit_taggeditem;
+  delta integer;
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    item := NEW;
+    delta := 1;
+  ELSE
+    item := OLD;
+    delta := -1;
+  END IF;
+
+  IF item.content_type_id <> {POST_CONTENT_TYPE_SQL}
+    OR NOT EXISTS (SELECT 1 FROM blog_post WHERE id = item.object_id AND is_live) THEN
+    RETURN NULL;
+  END IF;
+
+  -- Check constraint is evaluated before ON CONFLICT, decrements are plain updates
+  IF delta > 0 THEN
+    INSERT INTO blog_tagstats (tag_id, published_count) VALUES (item.tag_id, 1)
+    ON CONFLICT (tag_id) DO UPDATE SET published_count = blog_tagstats.published_count + 1;
+  ELSE
+    UPDATE blog_tagstats SET published_count = published_count - 1 WHERE tag_id = item.tag_id;
+  END IF;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER blog_tagstats_item_trigger
+AFTER INSERT OR DELETE ON taggit_taggeditem
+FOR EACH ROW EXECUTE PROCEDURE blog_tagstats_item_update();
+
+CREATE FUNCTION blog_tagstats_post_update() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'UPDATE' AND NEW.is_live AND NOT OLD.is_live THEN
+    INSERT INTO blog_tagstats (tag_id, published_count)
+    SELECT tag_id, 1 FROM taggit_taggeditem
+    WHERE content_type_id = {POST_CONTENT_TYPE_SQL} AND object_id = OLD.id
+    ON CONFLICT (tag_id) DO UPDATE SET published_count = blog_tagstats.published_count + 1;
+  ELSIF OLD.is_live AND (TG_OP = 'DELETE' OR NOT NEW.is_live) THEN
+    UPDATE blog_tagstats SET published_count = published_count - 1
+    WHERE tag_id IN (
+      SELECT tag_id FROM taggit_taggeditem
+      WHERE content_type_id = {POST_CONTENT_TYPE_SQL} AND object_id = OLD.id
+    );
+  END IF;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER blog_tagstats_post_trigger
+AFTER DELETE OR UPDATE OF is_live ON blog_post
+FOR EACH ROW EXECUTE PROCEDURE blog_tagstats_post_update();
+
+INSERT INTO blog_tagstats (tag_id, published_count)
+SELECT item.tag_id, count(*) FROM taggit_taggeditem item
+JOIN blog_post post ON post.id = item.object_id AND post.is_live
+WHERE item.content_type_id = {POST_CONTENT_TYPE_SQL}
+GROUP BY item.tag_id;
+"""
+
+DROP_TAG_STATS_SQL = """
+DROP TRIGGER IF EXISTS blog_tagstats_item_trigger ON taggit_taggeditem;
+DROP TRIGGER IF EXISTS blog_tagstats_post_trigger ON blog_post;
+DROP FUNCTION IF EXISTS blog_tagstats_item_update();
+DROP FUNCTION IF EXISTS blog_tagstats_post_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taggit', '0003_taggeditem_add_unique_index'),
+        ('blog', '0010_author_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagStats',
+            fields=[
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='blog_stats', serialize=False, to='taggit.tag')),
+                ('published_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'tag stats',
+                'verbose_name_plural': 'tag stats',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='tagstats',
+            index=models.Index(fields=['-published_count'], name='blog_tagstats_count_idx'),
+        ),
+        migrations.RunSQL(TAG_STATS_SQL, DROP_TAG_STATS_SQL),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.1.5 on 2026-10-18 19:02
+
+from django.db import migrations
+
+# Historical models are built by simple_history, their Meta can not declare
+# indexes. These serve the audit query of one object, newest first, and the
+# per object window of history retention.
+AUDIT_INDEXES = (
+    ("blog_histpost_audit_idx", "blog_historicalpost"),
+    ("blog_histcat_audit_idx", "blog_historicalcategory"),
+    ("blog_histcomment_audit_idx", "blog_historicalpostcomment"),
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_tag_stats'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            f"CREATE INDEX {name} ON {table} (id, history_date DESC, history_id DESC)",
+            f"DROP INDEX {name}"
+        )
+        for name, table in AUDIT_INDEXES
+    ]
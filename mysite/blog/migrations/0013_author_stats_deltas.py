@@ -0,0 +1,129 @@
+# Generated by Django 3.1.5 on 2026-10-19 09:12
+
+from importlib import import_module
+from django.db import migrations, models
+
+# Likes and comments totals are stored again, but still not written by the
+# stats trigger, likes and comments of an author's posts would all wait on
+# their single stats row. Counters updates append deltas instead, folded in
+# batches by AuthorStatsManager.apply_total_deltas.
+AUTHOR_STATS_SQL = """
+CREATE OR REPLACE FUNCTION blog_authorstats_update() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'UPDATE' AND NEW.author_id = OLD.author_id THEN
+    IF NEW.is_live IS DISTINCT FROM OLD.is_live OR NEW.publish_date IS DISTINCT FROM OLD.publish_date THEN
+      UPDATE blog_authorstats SET
+        published_count = published_count + NEW.is_live::int - OLD.is_live::int,
+        last_published_at = CASE
+          WHEN NEW.is_live THEN GREATEST(last_published_at, NEW.publish_date) ELSE last_published_at
+        END
+      WHERE author_id = NEW.author_id;
+    END IF;
+  ELSE
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+      UPDATE blog_authorstats SET
+        post_count = post_count - 1,
+        published_count = published_count - OLD.is_live::int
+      WHERE author_id = OLD.author_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+      INSERT INTO blog_authorstats
+        (author_id, post_count, published_count, like_count, comment_count, last_published_at)
+      VALUES (NEW.author_id, 1, NEW.is_live::int, 0, 0, CASE WHEN NEW.is_live THEN NEW.publish_date END)
+      ON CONFLICT (author_id) DO UPDATE SET
+        post_count = blog_authorstats.post_count + 1,
+        published_count = blog_authorstats.published_count + EXCLUDED.published_count,
+        last_published_at = GREATEST(blog_authorstats.last_published_at, EXCLUDED.last_published_at);
+    END IF;
+  END IF;
+
+  -- A live post left the author feed, last published date is looked up again
+  IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.is_live AND (
+    TG_OP = 'DELETE' OR NOT NEW.is_live OR NEW.author_id <> OLD.author_id OR NEW.publish_date < OLD.publish_date
+  ) THEN
+    UPDATE blog_authorstats SET last_published_at = (
+      SELECT max(publish_date) FROM blog_post WHERE author_id = OLD.author_id AND is_live
+    )
+    WHERE author_id = OLD.author_id;
+  END IF;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION blog_authorstats_delta() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'UPDATE' AND NEW.author_id = OLD.author_id THEN
+    IF NEW.like_count <> OLD.like_count OR NEW.comment_count <> OLD.comment_count THEN
+      INSERT INTO blog_authorstatsdelta (author_id, like_count, comment_count)
+      VALUES (NEW.author_id, NEW.like_count - OLD.like_count, NEW.comment_count - OLD.comment_count);
+    END IF;
+  ELSE
+    IF TG_OP IN ('UPDATE', 'DELETE') AND (OLD.like_count <> 0 OR OLD.comment_count <> 0) THEN
+      INSERT INTO blog_authorstatsdelta (author_id, like_count, comment_count)
+      VALUES (OLD.author_id, -OLD.like_count, -OLD.comment_count);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND (NEW.like_count <> 0 OR NEW.comment_count <> 0) THEN
+      INSERT INTO blog_authorstatsdelta (author_id, like_count, comment_count)
+      VALUES (NEW.author_id, NEW.like_count, NEW.comment_count);
+    END IF;
+  END IF;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER blog_authorstats_delta_trigger
+AFTER INSERT OR DELETE OR UPDATE OF author_id, like_count, comment_count ON blog_post
+FOR EACH ROW EXECUTE PROCEDURE blog_authorstats_delta();
+
+UPDATE blog_authorstats SET
+  like_count = totals.like_count,
+  comment_count = totals.comment_count
+FROM (
+  SELECT author_id, sum(like_count) AS like_count, sum(comment_count) AS comment_count
+  FROM blog_post GROUP BY author_id
+) AS totals
+WHERE blog_authorstats.author_id = totals.author_id;
+"""
+
+# Previous stats function is restored, totals columns are then dropped by
+# reversed AddField operations.
+REVERSE_AUTHOR_STATS_SQL = """
+DROP TRIGGER blog_authorstats_delta_trigger ON blog_post;
+DROP FUNCTION blog_authorstats_delta();
+""" + import_module("blog.migrations.0010_author_stats").AUTHOR_STATS_SQL.split(
+    "\nCREATE TRIGGER blog_authorstats_trigger", 1
+)[0].replace("CREATE FUNCTION", "CREATE OR REPLACE FUNCTION", 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_history_audit_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstats',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='authorstats',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='AuthorStatsDelta',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author_id', models.IntegerField()),
+                ('like_count', models.IntegerField(default=0)),
+                ('comment_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'author stats delta',
+                'verbose_name_plural': 'author stats deltas',
+            },
+        ),
+        migrations.RunSQL(AUTHOR_STATS_SQL, REVERSE_AUTHOR_STATS_SQL),
+    ]
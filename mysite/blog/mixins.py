@@ -0,0 +1,384 @@
+import time
+import asyncio
+import hashlib
+import functools
+from . import pagecache
+from .routers import await_with_replica_reads, is_pinned, pick_replica, replica_iterator, replica_reads
+from .concurrency import run_query
+from django.conf import settings
+from django.http import Http404
+from django.core.exceptions import PermissionDenied
+from django.utils.http import http_date, quote_etag
+from django.utils.cache import get_conditional_response
+from .facets import get_feed_facets
+from .resolver import resolve_post_or_404
+from .pagination import KeysetPaginator, InvalidCursor
+
+
+class KeysetPaginationMixin:
+  """
+    Keyset pagination mixin.
+
+    List views mixin which paginates 'object_list' with a KeysetPaginator.
+    Current page is read from the opaque 'cursor' GET parameter and the
+    page object is stored in 'page' context variable, next to
+    'next_page_url' and 'previous_page_url' links.
+  """
+  keyset_page = None
+  page_size = None
+  page_ordering = ("-publish_date", "-id")
+  cursor_kwarg = "cursor"
+
+  def get_page_size(self):
+    return self.page_size or settings.BLOG_FEED_PAGE_SIZE
+
+  def get_keyset_paginator(self, queryset):
+    return KeysetPaginator(queryset, self.get_page_size(), self.page_ordering)
+
+  def paginate_keyset(self, queryset):
+    paginator = self.get_keyset_paginator(queryset)
+    try:
+      return paginator.page(self.request.GET.get(self.cursor_kwarg))
+    except InvalidCursor:
+      raise Http404("Invalid cursor")
+
+  def get_page(self):
+    """
+      Return current page, fetched once per request: a conditional GET
+      validator reading it does not cost the rendered page a second query.
+    """
+    if self.keyset_page is None:
+      self.keyset_page = self.paginate_keyset(self.get_queryset())
+    return self.keyset_page
+
+  def get_page_url(self, cursor):
+    """
+      Return the query string of the page pointed by 'cursor', keeping the
+      other GET parameters.
+    """
+    if cursor is None:
+      return None
+
+    params = self.request.GET.copy()
+    params[self.cursor_kwarg] = cursor
+    return f"?{params.urlencode()}"
+
+  def get_context_data(self, page=None, **kwargs):
+    """
+      Add current page to context, 'page' may be given when it was fetched
+      beforehand.
+    """
+    if page is None:
+      page = self.keyset_page
+    if page is None:
+      page = self.paginate_keyset(self.object_list)
+    context = super().get_context_data(object_list=page.object_list, **kwargs)
+    context["page"] = page
+    context["next_page_url"] = self.get_page_url(page.next_cursor)
+    context["previous_page_url"] = self.get_page_url(page.previous_cursor)
+
+    return context
+
+
+class FeedFacetsMixin:
+  """
+    Feed facets mixin.
+
+    Adds cached filters lists to context data, 'feed_facets' may be given
+    when they were fetched beforehand.
+    New context variables created:
+      - categories: Save created categories for filter component
+      - authors: Save users who have published posts for filter component
+      - tags: Save created tags
+  """
+
+  def get_context_data(self, feed_facets=None, **kwargs):
+    context = super().get_context_data(**kwargs)
+    if feed_facets is None:
+      feed_facets = get_feed_facets()
+    context.update(feed_facets)
+
+    return context
+
+
+class PageCacheMixin:
+  """
+    Page cache mixin.
+
+    Anonymous GET responses are cached as a whole and tagged with
+    surrogate keys, see blog/pagecache.py. A cached page is served without
+    running any query until one of its keys is purged.
+    'surrogate_keys' are static keys of the view, every listed post adds
+    its own key.
+  """
+  surrogate_keys = ()
+
+  def get_surrogate_keys(self, context):
+    keys = list(self.surrogate_keys)
+    keys += [pagecache.post_key(post.pk) for post in context.get("object_list", ())]
+    return keys
+
+  def dispatch(self, request, *args, **kwargs):
+    if not pagecache.is_cacheable_request(request):
+      return super().dispatch(request, *args, **kwargs)
+
+    response = pagecache.get_cached_response(request)
+    if response is not None:
+      return pagecache.get_conditional_cached_response(request, response)
+
+    started = time.time()
+    response = super().dispatch(request, *args, **kwargs)
+    if hasattr(response, "add_post_render_callback"):
+      response.add_post_render_callback(
+        lambda response: pagecache.store_response(
+          request, response, self.get_surrogate_keys(response.context_data), started
+        )
+      )
+    return response
+
+
+class ConditionalGetMixin:
+  """
+    Conditional GET mixin.
+
+    Answers 'If-None-Match' and 'If-Modified-Since' requests with a 304
+    before the view builds its context. Validators come from
+    'get_validator', which should run a single narrow query. By default it
+    reads the posts of current feed page (KeysetPaginationMixin), which the
+    page renders afterwards, and the feed filters lists, without a date: posts joining or leaving a page
+    (going live, deactivated, deleted) move no timestamp, so feed pages
+    are only validated by their ETag.
+    Like counts have no timestamp, so only ETag notices a like change.
+    The validator is kept in 'validator', for views rendering its date.
+  """
+  validator = None
+
+  def get_validator(self):
+    """
+      Return a (state, last_modified) tuple describing the page content,
+      or None when the page can not be validated. 'state' must change
+      whenever the page changes.
+    """
+    page = self.get_page()
+    posts = [(post.id, post.updated_at, post.like_count, post.comment_count) for post in page]
+    return (posts, page.has_next, get_feed_facets()), None
+
+  def dispatch(self, request, *args, **kwargs):
+    if request.method not in ("GET", "HEAD"):
+      return super().dispatch(request, *args, **kwargs)
+
+    validator = self.validator = self.get_validator()
+    if validator is None:
+      return super().dispatch(request, *args, **kwargs)
+
+    etag, last_modified = self.get_validator_headers(validator)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+      response = super().dispatch(request, *args, **kwargs)
+
+    return self.set_validator_headers(response, etag, last_modified)
+
+  def get_validator_headers(self, validator):
+    """
+      Return (ETag, Last-Modified timestamp) of 'validator'.
+    """
+    # Pages render current user, their state is part of the validator.
+    state, last_modified = validator
+    etag = quote_etag(hashlib.md5(repr((self.request.user.pk, state)).encode()).hexdigest())
+    return etag, int(last_modified.timestamp()) if last_modified else None
+
+  def set_validator_headers(self, response, etag, last_modified):
+    if response.status_code in (200, 304):
+      response["ETag"] = etag
+      if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+class ReplicaReadsMixin:
+  """
+    Replica reads mixin.
+
+    Read only views whose queries may go to a database replica, see
+    blog/routers.py. Clients which wrote recently are pinned to the
+    primary. Put it first, so async views are routed too. Streaming
+    responses read from replicas too, queries run while a template is
+    rendered, after the view returns, stay on the primary. A request
+    reads from a single replica, picked once.
+  """
+
+  @classmethod
+  def as_view(cls, **initkwargs):
+    view = super().as_view(**initkwargs)
+
+    def routed_view(request, *args, **kwargs):
+      if is_pinned(request):
+        return view(request, *args, **kwargs)
+      alias = pick_replica()
+      with replica_reads(alias):
+        response = view(request, *args, **kwargs)
+      if asyncio.iscoroutine(response):
+        return await_with_replica_reads(response, alias)
+      if response.streaming:
+        response.streaming_content = replica_iterator(response.streaming_content, alias)
+      return response
+
+    functools.update_wrapper(routed_view, view)
+    return routed_view
+
+
+class PostSlugMixin:
+  """
+    Post slug mixin.
+
+    Resolves 'slug' URL kwarg with the slug resolver. 'post_ref' gives the
+    post id, author id and status without a query, and detail views fetch
+    the post by its primary key.
+  """
+
+  @property
+  def post_ref(self):
+    if not hasattr(self, "_post_ref"):
+      self._post_ref = resolve_post_or_404(self.kwargs["slug"])
+    return self._post_ref
+
+  def get_object(self, queryset=None):
+    if queryset is None:
+      queryset = self.get_queryset()
+    try:
+      return queryset.get(pk=self.post_ref.id)
+    except queryset.model.DoesNotExist:
+      raise Http404("No post found matching the query")
+
+
+class OwnerRequiredMixin:
+  """
+    Owner required mixin.
+
+    Object level permission for owner only views. Ownership is checked
+    before the view does any work, with 'get_owner_id' which should cost
+    at most one narrow query. Superusers are allowed everywhere. Put it
+    after LoginRequiredMixin, so anonymous users are sent to sign in.
+  """
+
+  def get_owner_id(self):
+    """
+      Return the id of the user owning the requested object.
+    """
+    raise NotImplementedError("OwnerRequiredMixin requires get_owner_id()")
+
+  def is_owner(self, user):
+    return user.is_authenticated and self.get_owner_id() == user.id
+
+  def dispatch(self, request, *args, **kwargs):
+    if not (request.user.is_superuser or self.is_owner(request.user)):
+      raise PermissionDenied
+    return super().dispatch(request, *args, **kwargs)
+
+
+class AsyncViewMixin:
+  """
+    Async view mixin.
+
+    Runs a class based view as a native async view, for ASGI. Handlers
+    ('get', ...) may be coroutines, whose queries go through 'run_query'.
+    Django 3.1 only runs coroutine functions as async views, so 'as_view'
+    wraps the view function. Session user is loaded before the view runs,
+    lazy 'request.user' can not query from the event loop.
+    Async mixins of this module go before it, sync views after it.
+  """
+
+  @classmethod
+  def as_view(cls, **initkwargs):
+    view = super().as_view(**initkwargs)
+
+    async def async_view(request, *args, **kwargs):
+      await run_query(lambda: request.user.is_authenticated)
+      return await view(request, *args, **kwargs)
+
+    functools.update_wrapper(async_view, view)
+    return async_view
+
+  async def dispatch(self, request, *args, **kwargs):
+    if request.method.lower() in self.http_method_names:
+      handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+    else:
+      handler = self.http_method_not_allowed
+
+    response = handler(request, *args, **kwargs)
+    if asyncio.iscoroutine(response):
+      response = await response
+    return response
+
+
+class AsyncFeedMixin(AsyncViewMixin):
+  """
+    Async feed mixin.
+
+    Async 'get' of feed list views (FeedFacetsMixin, KeysetPaginationMixin).
+    Page rows and filters lists are fetched concurrently, then the page is
+    rendered by Django in a sync thread.
+  """
+
+  async def get(self, request, *args, **kwargs):
+    self.object_list = await run_query(self.get_queryset)
+    if self.keyset_page is None:
+      page, feed_facets = await asyncio.gather(
+        run_query(self.paginate_keyset, self.object_list), run_query(get_feed_facets)
+      )
+    else:
+      # Conditional GET validator fetched the page already
+      page, feed_facets = self.keyset_page, await run_query(get_feed_facets)
+    context = self.get_context_data(page=page, feed_facets=feed_facets)
+    return self.render_to_response(context)
+
+
+class AsyncConditionalGetMixin(ConditionalGetMixin):
+  """
+    Async conditional GET mixin.
+
+    ConditionalGetMixin for AsyncViewMixin views, the validator query runs
+    in the query thread pool.
+  """
+
+  async def dispatch(self, request, *args, **kwargs):
+    if request.method not in ("GET", "HEAD"):
+      return await super().dispatch(request, *args, **kwargs)
+
+    validator = self.validator = await run_query(self.get_validator)
+    if validator is None:
+      return await super().dispatch(request, *args, **kwargs)
+
+    etag, last_modified = self.get_validator_headers(validator)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+      response = await super().dispatch(request, *args, **kwargs)
+
+    return self.set_validator_headers(response, etag, last_modified)
+
+
+class AsyncPageCacheMixin(PageCacheMixin):
+  """
+    Async page cache mixin.
+
+    PageCacheMixin for AsyncViewMixin views, cache reads run in the query
+    thread pool. Responses are stored once rendered, in Django sync thread.
+  """
+
+  async def dispatch(self, request, *args, **kwargs):
+    if not pagecache.is_cacheable_request(request):
+      return await super().dispatch(request, *args, **kwargs)
+
+    response = await run_query(pagecache.get_cached_response, request)
+    if response is not None:
+      return pagecache.get_conditional_cached_response(request, response)
+
+    started = time.time()
+    response = await super().dispatch(request, *args, **kwargs)
+    if hasattr(response, "add_post_render_callback"):
+      response.add_post_render_callback(
+        lambda response: pagecache.store_response(
+          request, response, self.get_surrogate_keys(response.context_data), started
+        )
+      )
+    return response
@@ -1,10 +1,17 @@
 from taggit.models import Tag
 from django.db import models
+from django.db.models import Q
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
 from taggit.managers import TaggableManager
-from .managers import PostManager
+from .managers import AuthorStatsManager, PostManager
 from simple_history.models import HistoricalRecords
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+
+# Written by atomic updates only, never by a full row save
+COUNTER_FIELDS = ("like_count", "comment_count")
 
 POST_STATUS = (
   ("draft", "Draft"),
@@ -33,24 +40,74 @@ class Post(models.Model):
   author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="blog_posts")
   content = models.TextField()
   likes = models.ManyToManyField(User, related_name="likes")
+  like_count = models.PositiveIntegerField(default=0)
+  comment_count = models.PositiveIntegerField(default=0)
   tags = TaggableManager(blank=True)
   category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
   status = models.CharField(choices=POST_STATUS, default="draft", max_length=13)
   publish_date = models.DateTimeField()
   deactivate_date = models.DateTimeField(null=True)
+  is_live = models.BooleanField(default=False)
   created_at = models.DateTimeField(auto_now_add=True)
   updated_at = models.DateTimeField(auto_now=True)
-  history = HistoricalRecords()
+  # Maintained by 'blog_post_search_vector_trigger' database trigger
+  search_vector = SearchVectorField(null=True, editable=False)
+  history = HistoricalRecords(excluded_fields=["search_vector"])
 
   class Meta:
     ordering = ["-created_at"]
+    indexes = [
+      # Feeds, ordered by keyset pagination fields (publish_date, id)
+      models.Index(fields=["-publish_date", "-id"], condition=Q(is_live=True), name="blog_post_live_feed_idx"),
+      models.Index(fields=["author", "-publish_date", "-id"], name="blog_post_author_feed_idx"),
+      models.Index(fields=["category", "-publish_date", "-id"], condition=Q(is_live=True), name="blog_post_cat_feed_idx"),
+      # Live posts scheduler
+      models.Index(fields=["status", "publish_date", "deactivate_date"], name="blog_post_window_idx"),
+      models.Index(fields=["deactivate_date"], condition=Q(is_live=True), name="blog_post_live_deact_idx"),
+      # Default ordering
+      models.Index(fields=["-created_at"], name="blog_post_created_idx"),
+      # Full-text search
+      GinIndex(fields=["search_vector"], name="blog_post_search_idx"),
+    ]
   
   def __str__(self):
     return f"<Post: {self.title}>"
+
+  def save(self, *args, **kwargs):
+    """
+      Override save function for keeping 'is_live' flag up to date, so
+      post changes are visible without waiting for the live posts scheduler.
+      Counters columns are only written by atomic updates, an existing
+      post is saved without them so likes and comments stored since it was
+      loaded are kept.
+      'live_changed' tells signals the post joined or left the feeds.
+    """
+    was_live = self.is_live
+    self.is_live = self.compute_is_live()
+    self.live_changed = self.is_live != was_live
+    if not self._state.adding and not kwargs.get("force_insert") and kwargs.get("update_fields") is None:
+      deferred = self.get_deferred_fields()
+      kwargs["update_fields"] = [
+        field.name for field in self._meta.concrete_fields
+        if not field.primary_key and field.attname not in deferred and field.name not in COUNTER_FIELDS
+      ]
+    super().save(*args, **kwargs)
+
+  def compute_is_live(self, now=None):
+    """
+      Check if post can be shown on users feed at 'now' date. It takes into
+      accounts 'publish date', 'post status' and 'deactivate_date'.
+    """
+    now = now or timezone.now()
+    return (
+      self.status == "published" and
+      self.publish_date <= now and
+      (self.deactivate_date is None or self.deactivate_date >= now)
+    )
   
   @property
   def number_of_likes(self):
-    return self.likes.count()
+    return self.like_count
 
 
 class PostComment(models.Model):
@@ -62,6 +119,78 @@ class PostComment(models.Model):
 
   class Meta:
     ordering = ["-posted_at"]
+    indexes = [
+      models.Index(fields=["post", "-posted_at", "-id"], name="blog_comment_post_idx"),
+    ]
   
   def __str__(self):
-    return f"<PostComent: {self.author.username}, {self.post.title}>"
\ No newline at end of file
+    return f"<PostComent: {self.author.username}, {self.post.title}>"
+
+class AuthorStats(models.Model):
+  """
+    Author stats.
+
+    One row per author with their posts totals. Rows are kept up to date
+    by 'blog_authorstats_trigger' database trigger on posts table, when a
+    post is created, deleted, moved to another author or its publish
+    window changes. Likes and comments totals are moved in batches from
+    AuthorStatsDelta rows, every like would wait on the author row
+    otherwise. 'rebuild_author_stats' command rebuilds them from posts.
+  """
+  objects = AuthorStatsManager()
+  author = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="blog_stats")
+  post_count = models.PositiveIntegerField(default=0)
+  published_count = models.PositiveIntegerField(default=0)
+  like_count = models.PositiveIntegerField(default=0)
+  comment_count = models.PositiveIntegerField(default=0)
+  last_published_at = models.DateTimeField(null=True)
+
+  class Meta:
+    verbose_name = "author stats"
+    verbose_name_plural = "author stats"
+
+  def __str__(self):
+    return f"<AuthorStats: {self.author_id}>"
+
+
+class AuthorStatsDelta(models.Model):
+  """
+    Author stats delta.
+
+    Likes and comments totals change of an author, appended by
+    'blog_authorstats_delta_trigger' when posts counters move. Appending
+    rows does not wait on the author stats row, 'apply_total_deltas' folds
+    them into it in batches, from the like buffer flush and the live posts
+    scheduler. 'author_id' is not a foreign key, deltas of a deleted author
+    are appended while their posts are deleted, and dropped on fold.
+  """
+  author_id = models.IntegerField()
+  like_count = models.IntegerField(default=0)
+  comment_count = models.IntegerField(default=0)
+
+  class Meta:
+    verbose_name = "author stats delta"
+    verbose_name_plural = "author stats deltas"
+
+
+class TagStats(models.Model):
+  """
+    Tag stats.
+
+    Number of published (live) posts of every used tag, for the tags
+    filter. Rows are kept up to date by 'blog_tagstats_item_trigger' and
+    'blog_tagstats_post_trigger' database triggers, when a tag is added to
+    or removed from a post and when a post goes live or leaves the feed.
+  """
+  tag = models.OneToOneField(Tag, on_delete=models.CASCADE, primary_key=True, related_name="blog_stats")
+  published_count = models.PositiveIntegerField(default=0)
+
+  class Meta:
+    verbose_name = "tag stats"
+    verbose_name_plural = "tag stats"
+    indexes = [
+      models.Index(fields=["-published_count"], name="blog_tagstats_count_idx"),
+    ]
+
+  def __str__(self):
+    return f"<TagStats: {self.tag_id}>"
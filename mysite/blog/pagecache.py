@@ -0,0 +1,182 @@
+import time
+import hashlib
+from . import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.dispatch import Signal
+from django.http import HttpResponse
+from django.utils.http import parse_http_date_safe
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.contrib.contenttypes.models import ContentType
+from taggit.models import TaggedItem
+
+PAGE_CACHE_PREFIX = "blog:page"
+SURROGATE_KEY_PREFIX = "blog:surrogate"
+
+# Every page listing live posts, a post joining any feed purges it
+FEED_KEY = "feed"
+# Every page rendering feed filters component
+FACETS_KEY = "facets"
+
+# Sent with purged surrogate keys, so a reverse proxy purge can be hooked
+page_cache_purged = Signal()
+
+
+def post_key(post_id):
+  return f"post-{post_id}"
+
+
+def category_key(category_id):
+  return f"category-{category_id}"
+
+
+def tag_key(tag_id):
+  return f"tag-{tag_id}"
+
+
+# Listing keys, for pages listing posts of an author, category or tag.
+# They are apart from category and tag keys, so a post joining a listing
+# does not purge pages only showing the category or tag name.
+def author_feed_key(author_id):
+  return f"author-{author_id}-feed"
+
+
+def category_feed_key(category_id):
+  return f"category-{category_id}-feed"
+
+
+def tag_feed_key(tag_id):
+  return f"tag-{tag_id}-feed"
+
+
+def is_enabled():
+  return settings.BLOG_PAGE_CACHE["ENABLED"]
+
+
+def is_cacheable_request(request):
+  """
+    Only anonymous reads are cached, every anonymous reader gets the
+    same page.
+  """
+  return is_enabled() and request.method in ("GET", "HEAD") and not request.user.is_authenticated
+
+
+def _page_cache_key(request):
+  path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+  return f"{PAGE_CACHE_PREFIX}:{path}"
+
+
+def _version_key(key):
+  return f"{SURROGATE_KEY_PREFIX}:{key}"
+
+
+def get_cached_response(request):
+  """
+    Return the cached response of 'request', or None when it is not cached
+    or any of its surrogate keys was purged after it was stored.
+  """
+  entry = cache.get(_page_cache_key(request))
+  if entry is None:
+    return None
+  if cache.get_many(list(entry["versions"])) != entry["versions"]:
+    return None
+
+  response = HttpResponse(entry["content"])
+  for header, value in entry["headers"]:
+    response[header] = value
+  return response
+
+
+def get_conditional_cached_response(request, response):
+  """
+    Answer conditional requests from the validators stored with a cached
+    response, so a 304 needs no query at all.
+  """
+  last_modified = response.get("Last-Modified")
+  return get_conditional_response(
+    request, etag=response.get("ETag"),
+    last_modified=last_modified and parse_http_date_safe(last_modified), response=response
+  )
+
+
+def store_response(request, response, keys, started):
+  """
+    Cache an anonymous response tagged with 'keys' surrogate keys. The
+    response is not stored if one of its keys was purged since 'started',
+    the page could have been rendered from outdated rows.
+  """
+  if response.status_code != 200 or response.cookies or request.META.get("CSRF_COOKIE_USED"):
+    return
+
+  timeout = settings.BLOG_PAGE_CACHE["TIMEOUT"]
+  keys = sorted(set(keys))
+  patch_cache_control(response, public=True, max_age=0, s_maxage=timeout)
+  patch_vary_headers(response, ("Cookie",))
+  response["Surrogate-Key"] = " ".join(keys)
+
+  version_keys = [_version_key(key) for key in keys]
+  versions = cache.get_many(version_keys)
+  missing_keys = [version_key for version_key in version_keys if version_key not in versions]
+  if missing_keys:
+    for version_key in missing_keys:
+      cache.add(version_key, 0, timeout=None)
+    versions = cache.get_many(version_keys)
+  if len(versions) != len(version_keys) or any(version > started for version in versions.values()):
+    return
+
+  cache.set(
+    _page_cache_key(request),
+    {"content": response.content, "headers": list(response.items()), "versions": versions},
+    timeout=timeout
+  )
+
+
+def purge(*keys):
+  """
+    Purge every cached page tagged with any of 'keys'. Surrogate keys
+    store the time of their last purge, pages stored before it are stale.
+    With replicas, the time is pushed BLOG_PRIMARY_STICKINESS seconds
+    ahead: a page rendered meanwhile may come from a lagging replica, it
+    is served but not stored, as if the purge was repeated after the lag.
+  """
+  if not is_enabled() or not keys:
+    return
+
+  version = time.time()
+  if settings.BLOG_DB_REPLICAS:
+    version += settings.BLOG_PRIMARY_STICKINESS
+  cache.set_many({_version_key(key): version for key in keys}, timeout=None)
+  page_cache_purged.send(sender=None, keys=keys)
+
+
+def purge_on_commit(*keys):
+  """
+    Purge 'keys' once current transaction is committed, otherwise a
+    concurrent request could cache again the old page.
+  """
+  if is_enabled():
+    transaction.on_commit(lambda: purge(*keys))
+
+
+def post_listing_keys(post_ids):
+  """
+    Return the surrogate keys of every page a post could be listed in:
+    the post itself, feeds, its author, category and tags pages.
+  """
+  post_ids = list(post_ids)
+  if not post_ids:
+    return []
+
+  keys = [FEED_KEY]
+  for post in models.Post.objects.filter(pk__in=post_ids).values("id", "author_id", "category_id"):
+    keys.append(author_feed_key(post["author_id"]))
+    if post["category_id"] is not None:
+      keys.append(category_feed_key(post["category_id"]))
+
+  tag_ids = TaggedItem.objects.filter(
+    content_type=ContentType.objects.get_for_model(models.Post), object_id__in=post_ids
+  ).values_list("tag_id", flat=True).distinct()
+  keys += [tag_feed_key(tag_id) for tag_id in tag_ids]
+  keys += [post_key(post_id) for post_id in post_ids]
+  return keys
@@ -0,0 +1,166 @@
+import json
+import base64
+import datetime
+from django.db.models import Q
+from django.core.exceptions import ValidationError
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(Exception):
+  """
+    Raised when a cursor can not be decoded or does not match paginator ordering.
+  """
+  pass
+
+
+class KeysetPage:
+  """
+    Keyset page.
+
+    Contains a page of objects and the opaque cursors needed to fetch the
+    next and the previous pages. A cursor is None when there is no such page.
+  """
+
+  def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+    self.object_list = object_list
+    self.next_cursor = next_cursor
+    self.previous_cursor = previous_cursor
+
+  def __iter__(self):
+    return iter(self.object_list)
+
+  def __len__(self):
+    return len(self.object_list)
+
+  @property
+  def has_next(self):
+    return self.next_cursor is not None
+
+  @property
+  def has_previous(self):
+    return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+  """
+    Keyset (cursor) paginator.
+
+    Unlike Django Paginator, pages are not fetched with OFFSET. Every page
+    continues from the ordering values of the last row shown, so page N
+    costs the same as the first one if there is an index matching the ordering.
+    The ordering must be unique, so its last field should be the primary key.
+  """
+
+  def __init__(self, queryset, per_page, ordering=("-publish_date", "-id")):
+    self.queryset = queryset
+    self.per_page = int(per_page)
+    self.ordering = tuple(ordering)
+
+  def page(self, cursor=None):
+    """
+      Return the page pointed by 'cursor'. First page is returned when
+      cursor is None.
+    """
+    if not cursor:
+      return self._forward_page(None)
+
+    direction, values = self.decode_cursor(cursor)
+    if direction == "p":
+      return self._backward_page(values)
+    return self._forward_page(values)
+
+  def _forward_queryset(self, values):
+    queryset = self.queryset.order_by(*self.ordering)
+    if values is not None:
+      queryset = self._filter_after(queryset, self.ordering, values)
+    return queryset[:self.per_page + 1]
+
+  def _backward_queryset(self, values):
+    reversed_ordering = tuple(self._reverse(field) for field in self.ordering)
+    queryset = self._filter_after(self.queryset.order_by(*reversed_ordering), reversed_ordering, values)
+    return queryset[:self.per_page + 1]
+
+  def _filter_after(self, queryset, ordering, values):
+    # Values of a tampered cursor are rejected by fields while the lookups are built
+    try:
+      return queryset.filter(self._after(ordering, values))
+    except (ValidationError, ValueError, TypeError):
+      raise InvalidCursor("Invalid cursor")
+
+  def _forward_page(self, values):
+    rows = list(self._forward_queryset(values))
+    object_list = rows[:self.per_page]
+    next_cursor = previous_cursor = None
+
+    if len(rows) > self.per_page:
+      next_cursor = self.encode_cursor("n", object_list[-1])
+    if values is not None and object_list:
+      previous_cursor = self.encode_cursor("p", object_list[0])
+    return KeysetPage(object_list, next_cursor, previous_cursor)
+
+  def _backward_page(self, values):
+    rows = list(self._backward_queryset(values))
+    object_list = rows[:self.per_page][::-1]
+    next_cursor = previous_cursor = None
+
+    if object_list:
+      next_cursor = self.encode_cursor("n", object_list[-1])
+    if len(rows) > self.per_page:
+      previous_cursor = self.encode_cursor("p", object_list[0])
+    return KeysetPage(object_list, next_cursor, previous_cursor)
+
+  def _after(self, ordering, values):
+    """
+      Build the predicate for rows placed after 'values' in 'ordering'.
+      The leading field range condition lets the database start the index
+      scan right at the cursor.
+    """
+    fields = [(field.lstrip("-"), field.startswith("-")) for field in ordering]
+    first_name, first_desc = fields[0]
+    predicate = Q()
+
+    for index, (name, desc) in enumerate(fields):
+      condition = Q(**{f"{name}__{'lt' if desc else 'gt'}": values[index]})
+      for previous_index in range(index):
+        condition &= Q(**{fields[previous_index][0]: values[previous_index]})
+      predicate |= condition
+
+    return Q(**{f"{first_name}__{'lte' if first_desc else 'gte'}": values[0]}) & predicate
+
+  @staticmethod
+  def _reverse(field):
+    return field[1:] if field.startswith("-") else f"-{field}"
+
+  def encode_cursor(self, direction, obj):
+    values = [getattr(obj, field.lstrip("-")) for field in self.ordering]
+    payload = json.dumps({"d": direction, "v": values}, default=self._encode_value)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+  def decode_cursor(self, cursor):
+    try:
+      padding = "=" * (-len(cursor) % 4)
+      payload = json.loads(base64.urlsafe_b64decode(cursor + padding))
+      direction, values = payload["d"], payload["v"]
+    except (ValueError, TypeError, KeyError):
+      raise InvalidCursor("Invalid cursor")
+
+    if direction not in ("n", "p") or not isinstance(values, list) or len(values) != len(self.ordering):
+      raise InvalidCursor("Invalid cursor")
+    try:
+      return direction, [self._decode_value(value) for value in values]
+    except (ValueError, TypeError):
+      # A well formed but impossible date, like month 13
+      raise InvalidCursor("Invalid cursor")
+
+  @staticmethod
+  def _encode_value(value):
+    # Full precision is needed, DjangoJSONEncoder truncates microseconds.
+    if isinstance(value, datetime.datetime):
+      return value.isoformat()
+    raise TypeError(f"Cursor value {value!r} is not serializable")
+
+  @staticmethod
+  def _decode_value(value):
+    if isinstance(value, str):
+      return parse_datetime(value) or value
+    return value
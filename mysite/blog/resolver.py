@@ -0,0 +1,99 @@
+import time
+import threading
+from . import models
+from collections import OrderedDict, namedtuple
+from django.conf import settings
+from django.http import Http404
+
+PostRef = namedtuple("PostRef", ["id", "author_id", "status"])
+
+
+class PostSlugResolver:
+  """
+    Post slug resolver.
+
+    Bounded LRU cache of post slug -> PostRef(id, author_id, status), so
+    slug routed views know which post they work on, and who owns it,
+    without a lookup query. Entries expire after 'ttl' seconds, which
+    bounds how long other processes keep a renamed or deleted post slug.
+    Saved and deleted posts are invalidated in this process by signals.
+  """
+
+  def __init__(self, max_size=10000, ttl=60.0):
+    self.max_size = max_size
+    self.ttl = ttl
+    self._entries = OrderedDict()
+    self._slugs_by_id = {}
+    self._lock = threading.Lock()
+
+  def resolve(self, slug):
+    """
+      Return the PostRef of 'slug', or None if there is no such post.
+    """
+    now = time.monotonic()
+    with self._lock:
+      entry = self._entries.get(slug)
+      if entry is not None:
+        post_ref, expires_at = entry
+        if expires_at > now:
+          self._entries.move_to_end(slug)
+          return post_ref
+        self._remove(slug)
+
+    post = models.Post.objects.filter(slug=slug).values_list("id", "author_id", "status").first()
+    if post is None:
+      return None
+
+    post_ref = PostRef(*post)
+    with self._lock:
+      self._remove(slug)
+      self._remove(self._slugs_by_id.get(post_ref.id))
+      self._entries[slug] = (post_ref, now + self.ttl)
+      self._slugs_by_id[post_ref.id] = slug
+      while len(self._entries) > self.max_size:
+        self._remove(next(iter(self._entries)))
+    return post_ref
+
+  def invalidate(self, post_id, slug=None):
+    """
+      Forget a post, under its current 'slug' and under the slug it was
+      resolved with, so a slug change is noticed.
+    """
+    with self._lock:
+      self._remove(self._slugs_by_id.get(post_id))
+      self._remove(slug)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      self._slugs_by_id.clear()
+
+  def _remove(self, slug):
+    entry = self._entries.pop(slug, None)
+    if entry is not None and self._slugs_by_id.get(entry[0].id) == slug:
+      del self._slugs_by_id[entry[0].id]
+
+
+_post_resolver = None
+_post_resolver_lock = threading.Lock()
+
+
+def get_post_resolver():
+  """
+    Return the process slug resolver, configured by BLOG_SLUG_RESOLVER
+    setting.
+  """
+  global _post_resolver
+  if _post_resolver is None:
+    with _post_resolver_lock:
+      if _post_resolver is None:
+        config = settings.BLOG_SLUG_RESOLVER
+        _post_resolver = PostSlugResolver(config["MAX_SIZE"], config["TTL"])
+  return _post_resolver
+
+
+def resolve_post_or_404(slug):
+  post_ref = get_post_resolver().resolve(slug)
+  if post_ref is None:
+    raise Http404("No post found matching the query")
+  return post_ref
@@ -0,0 +1,113 @@
+import time
+import random
+import contextvars
+from django.conf import settings
+
+# Replica alias reads go to while a replica reads view runs, picked once
+# per request, see ReplicaReadsMixin
+_read_replica = contextvars.ContextVar("blog_read_replica", default=None)
+
+
+class PrimaryReplicaRouter:
+  """
+    Primary / replica database router.
+
+    Writes always go to 'default', the primary. Reads go to one of
+    BLOG_DB_REPLICAS aliases only inside 'replica_reads', which read only
+    views enter unless the client is pinned to the primary. Other reads
+    stay on the primary, they may be followed by writes.
+  """
+
+  def db_for_read(self, model, **hints):
+    return _read_replica.get()
+
+  def db_for_write(self, model, **hints):
+    return "default"
+
+  def allow_relation(self, obj1, obj2, **hints):
+    # Replicas hold the same rows as the primary
+    return True
+
+  def allow_migrate(self, db, app_label, model_name=None, **hints):
+    # Replicas get the schema through replication
+    return db == "default"
+
+
+def pick_replica():
+  """
+    Return one of BLOG_DB_REPLICAS aliases at random, None without replicas.
+  """
+  return random.choice(settings.BLOG_DB_REPLICAS) if settings.BLOG_DB_REPLICAS else None
+
+
+class replica_reads:
+  """
+    Context manager routing reads to replica 'alias', or one picked by
+    'pick_replica', until it exits. Reads inside all go to that replica.
+  """
+
+  def __init__(self, alias=None):
+    self.alias = alias
+
+  def __enter__(self):
+    self._token = _read_replica.set(self.alias or pick_replica())
+
+  def __exit__(self, *exc_info):
+    _read_replica.reset(self._token)
+
+
+class primary_reads(replica_reads):
+  """
+    Context manager keeping reads on the primary, even inside
+    'replica_reads', until it exits. Data cached until an invalidation
+    must be read from it, a lagging replica could cache old rows again
+    right after the invalidation.
+  """
+
+  def __enter__(self):
+    self._token = _read_replica.set(None)
+
+
+async def await_with_replica_reads(coroutine, alias):
+  """
+    Await 'coroutine' of an async view with reads routed to replica 'alias'.
+  """
+  with replica_reads(alias):
+    return await coroutine
+
+
+def replica_iterator(iterator, alias):
+  """
+    Iterate 'iterator', like a streaming response content, with reads
+    routed to replica 'alias' while it computes the next item only.
+  """
+  iterator = iter(iterator)
+  while True:
+    with replica_reads(alias):
+      try:
+        item = next(iterator)
+      except StopIteration:
+        return
+    yield item
+
+
+def is_pinned(request):
+  """
+    Check if the client wrote recently, its reads stay on the primary so
+    it sees its own changes whatever replicas lag.
+  """
+  try:
+    return float(request.COOKIES.get(settings.BLOG_PRIMARY_STICKINESS_COOKIE, 0)) > time.time()
+  except ValueError:
+    return False
+
+
+def pin_to_primary(response):
+  """
+    Pin the client to the primary for BLOG_PRIMARY_STICKINESS seconds.
+  """
+  window = settings.BLOG_PRIMARY_STICKINESS
+  response.set_cookie(
+    settings.BLOG_PRIMARY_STICKINESS_COOKIE, str(time.time() + window),
+    max_age=window, httponly=True, samesite="Lax"
+  )
@@ -0,0 +1,125 @@
+from . import models
+from . import pagecache
+from .facets import invalidate_feed_facets
+from .resolver import get_post_resolver
+from .managers import post_tags_synced
+from taggit.models import TaggedItem
+from django.db import transaction
+from django.dispatch import receiver
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+
+@receiver(post_delete, sender=models.PostComment)
+def decrease_comment_count(sender, instance, **kwargs):
+  """
+    Keep 'Post.comment_count' column in sync when a comment is deleted.
+    On post deletion comments are deleted first, so this update is harmless.
+  """
+  if instance.post_id is not None:
+    models.Post.objects.update_comment_count(instance.post_id, -1)
+
+
+@receiver(pre_delete, sender=models.User)
+def decrease_user_like_counts(sender, instance, **kwargs):
+  """
+    Keep 'Post.like_count' column in sync when an user, and so its likes,
+    is deleted. Likes rows are bulk deleted in the same transaction.
+  """
+  models.Post.objects.forget_user_likes(instance.pk)
+
+
+@receiver(post_save, sender=models.Post)
+@receiver(post_delete, sender=models.Post)
+@receiver(post_save, sender=models.Category)
+@receiver(post_delete, sender=models.Category)
+@receiver(post_save, sender=models.Tag)
+@receiver(post_delete, sender=models.Tag)
+@receiver(post_save, sender=TaggedItem)
+@receiver(post_delete, sender=TaggedItem)
+@receiver(post_tags_synced, sender=models.Post)
+def clear_feed_facets(sender, **kwargs):
+  """
+    Invalidate cached feed filters lists. It waits for transaction commit,
+    otherwise a concurrent request could cache again the old lists.
+  """
+  transaction.on_commit(invalidate_feed_facets)
+
+
+@receiver(post_save, sender=models.Post)
+def purge_saved_post_pages(sender, instance, created, **kwargs):
+  """
+    Purge pages showing the post and every listing it could join. Keys are
+    read after commit, so tags and category are the stored ones. A new
+    post, or one joining or leaving the feeds, changes filters component
+    authors and tags counts too.
+  """
+  if not pagecache.is_enabled():
+    return
+
+  post_id = instance.pk
+  extra_keys = [pagecache.FACETS_KEY] if created or instance.live_changed else []
+  transaction.on_commit(lambda: pagecache.purge(*pagecache.post_listing_keys([post_id]), *extra_keys))
+
+
+@receiver(post_delete, sender=models.Post)
+def purge_deleted_post_pages(sender, instance, **kwargs):
+  keys = [pagecache.post_key(instance.pk), pagecache.author_feed_key(instance.author_id), pagecache.FACETS_KEY]
+  if instance.category_id is not None:
+    keys.append(pagecache.category_feed_key(instance.category_id))
+  pagecache.purge_on_commit(*keys)
+
+
+@receiver(post_save, sender=models.PostComment)
+@receiver(post_delete, sender=models.PostComment)
+def purge_commented_post_pages(sender, instance, **kwargs):
+  if instance.post_id is not None:
+    pagecache.purge_on_commit(pagecache.post_key(instance.post_id))
+
+
+@receiver(post_save, sender=models.Category)
+@receiver(post_delete, sender=models.Category)
+def purge_category_pages(sender, instance, **kwargs):
+  pagecache.purge_on_commit(
+    pagecache.category_key(instance.pk), pagecache.category_feed_key(instance.pk), pagecache.FACETS_KEY
+  )
+
+
+@receiver(post_save, sender=models.Tag)
+@receiver(post_delete, sender=models.Tag)
+def purge_tag_pages(sender, instance, **kwargs):
+  pagecache.purge_on_commit(pagecache.tag_key(instance.pk), pagecache.tag_feed_key(instance.pk), pagecache.FACETS_KEY)
+
+
+@receiver(post_save, sender=TaggedItem)
+@receiver(post_delete, sender=TaggedItem)
+def purge_tagged_post_pages(sender, instance, **kwargs):
+  """
+    A tag added to or removed from a post changes the post page, the
+    tag listings and tags counts of filters component.
+  """
+  pagecache.purge_on_commit(
+    pagecache.tag_feed_key(instance.tag_id), pagecache.post_key(instance.object_id), pagecache.FACETS_KEY
+  )
+
+
+@receiver(post_save, sender=models.Post)
+@receiver(post_delete, sender=models.Post)
+def invalidate_post_slug(sender, instance, **kwargs):
+  """
+    Forget resolved slug of the post once transaction is committed, the
+    resolver could read again the old row before.
+  """
+  post_id, slug = instance.pk, instance.slug
+  transaction.on_commit(lambda: get_post_resolver().invalidate(post_id, slug))
+
+
+@receiver(post_tags_synced, sender=models.Post)
+def purge_synced_tags_pages(sender, instance, added, removed, **kwargs):
+  """
+    Tags set of a post was synchronized with bulk writes, which send no
+    tagged item signals.
+  """
+  pagecache.purge_on_commit(
+    pagecache.post_key(instance.pk), pagecache.FACETS_KEY,
+    *(pagecache.tag_feed_key(tag_id) for tag_id in [*added, *removed])
+  )
@@ -0,0 +1,181 @@
+import io
+import json
+from . import models
+from taggit.models import TaggedItem
+from django.urls import reverse
+from django.utils import feedgenerator
+from django.utils.xmlutils import SimplerXMLGenerator
+from django.contrib.contenttypes.models import ContentType
+
+# Posts fetched per server-side cursor round trip, and per response chunk
+FEED_CHUNK_SIZE = 10
+
+
+def _drain(buffer):
+  content = buffer.getvalue()
+  buffer.seek(0)
+  buffer.truncate()
+  return content
+
+
+class StreamingFeedMixin:
+  """
+    Streaming feed mixin.
+
+    Django feed generators write a whole document from a list of items.
+    'stream' writes the same document from an items iterator, one chunk
+    every 'chunk_size' items. Feed date is given as 'latest_date', so
+    items are never looked at twice.
+  """
+  item_element = None
+
+  def __init__(self, *args, latest_date=None, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.latest_date = latest_date
+
+  def latest_post_date(self):
+    return self.latest_date or super().latest_post_date()
+
+  def build_item(self, **kwargs):
+    """
+      Return an item dict built like 'add_item' does, without storing it.
+    """
+    self.add_item(**kwargs)
+    return self.items.pop()
+
+  def start_document(self, handler):
+    raise NotImplementedError
+
+  def end_document(self, handler):
+    raise NotImplementedError
+
+  def stream(self, items, chunk_size=FEED_CHUNK_SIZE, encoding="utf-8"):
+    buffer = io.StringIO()
+    handler = SimplerXMLGenerator(buffer, encoding)
+    self.start_document(handler)
+    for index, item in enumerate(items, 1):
+      handler.startElement(self.item_element, self.item_attributes(item))
+      self.add_item_elements(handler, item)
+      handler.endElement(self.item_element)
+      if index % chunk_size == 0:
+        yield _drain(buffer)
+    self.end_document(handler)
+    yield _drain(buffer)
+
+
+class RssStreamingFeed(StreamingFeedMixin, feedgenerator.Rss201rev2Feed):
+  item_element = "item"
+
+  def start_document(self, handler):
+    handler.startDocument()
+    handler.startElement("rss", self.rss_attributes())
+    handler.startElement("channel", self.root_attributes())
+    self.add_root_elements(handler)
+
+  def end_document(self, handler):
+    self.endChannelElement(handler)
+    handler.endElement("rss")
+
+
+class AtomStreamingFeed(StreamingFeedMixin, feedgenerator.Atom1Feed):
+  item_element = "entry"
+
+  def start_document(self, handler):
+    handler.startDocument()
+    handler.startElement("feed", self.root_attributes())
+    self.add_root_elements(handler)
+
+  def end_document(self, handler):
+    handler.endElement("feed")
+
+
+class JsonStreamingFeed(StreamingFeedMixin, feedgenerator.SyndicationFeed):
+  """
+    JSON Feed 1.1 (https://jsonfeed.org/version/1.1) streaming feed.
+  """
+  content_type = "application/feed+json; charset=utf-8"
+
+  def feed_attributes(self):
+    return {
+      "version": "https://jsonfeed.org/version/1.1",
+      "title": self.feed["title"],
+      "home_page_url": self.feed["link"],
+      "feed_url": self.feed["feed_url"],
+      "description": self.feed["description"],
+      "language": self.feed["language"],
+    }
+
+  def item_attributes(self, item):
+    attributes = {
+      "id": item["unique_id"] or item["link"],
+      "url": item["link"],
+      "title": item["title"],
+      "content_text": item["description"],
+      "date_published": item["pubdate"] and item["pubdate"].isoformat(),
+      "date_modified": item["updateddate"] and item["updateddate"].isoformat(),
+      "authors": [{"name": item["author_name"]}] if item["author_name"] else [],
+      "tags": list(item["categories"]),
+    }
+    return {key: value for key, value in attributes.items() if value not in (None, [])}
+
+  def stream(self, items, chunk_size=FEED_CHUNK_SIZE, encoding="utf-8"):
+    attributes = {key: value for key, value in self.feed_attributes().items() if value is not None}
+    # Feed object is left open after its attributes, items follow
+    chunk = [json.dumps(attributes)[:-1] + ', "items": [']
+    for index, item in enumerate(items, 1):
+      chunk.append(("," if index > 1 else "") + json.dumps(self.item_attributes(item)))
+      if index % chunk_size == 0:
+        yield "".join(chunk)
+        chunk = []
+    chunk.append("]}")
+    yield "".join(chunk)
+
+
+FEED_CLASSES = {
+  "rss": RssStreamingFeed,
+  "atom": AtomStreamingFeed,
+  "json": JsonStreamingFeed,
+}
+
+
+def post_feed_items(feed, posts, request, chunk_size=FEED_CHUNK_SIZE):
+  """
+    Yield 'feed' items of 'posts' queryset. Posts are read through a
+    server-side cursor, their tags with one query per chunk.
+  """
+  content_type = ContentType.objects.get_for_model(models.Post)
+  posts = posts.select_related("author", "category").defer("search_vector").iterator(chunk_size=chunk_size)
+
+  chunk = []
+  for post in posts:
+    chunk.append(post)
+    if len(chunk) == chunk_size:
+      yield from _post_chunk_items(feed, chunk, request, content_type)
+      chunk = []
+  yield from _post_chunk_items(feed, chunk, request, content_type)
+
+
+def _post_chunk_items(feed, posts, request, content_type):
+  if not posts:
+    return
+
+  tags = {}
+  for post_id, name in (
+    TaggedItem.objects.filter(content_type=content_type, object_id__in=[post.id for post in posts])
+    .order_by("tag__name").values_list("object_id", "tag__name")
+  ):
+    tags.setdefault(post_id, []).append(name)
+
+  for post in posts:
+    link = request.build_absolute_uri(reverse("blog:view_post", kwargs={"slug": post.slug}))
+    categories = [post.category.name] if post.category else []
+    yield feed.build_item(
+      title=post.title,
+      link=link,
+      description=post.content,
+      author_name=post.author.username,
+      pubdate=post.publish_date,
+      updateddate=post.updated_at,
+      unique_id=link,
+      categories=categories + tags.get(post.id, []),
+    )
@@ -0,0 +1,47 @@
+from django import template
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+from django.template.loader import render_to_string
+
+register = template.Library()
+
+POST_CARD_TEMPLATE = "blog/post_card.html"
+POST_CARD_CACHE_PREFIX = "blog:post_card"
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def post_card_cache_key(post):
+  """
+    Cache key of a rendered post card. It changes with every value shown
+    by the card, so outdated cards are never invalidated, just left to expire.
+  """
+  version = int(post.updated_at.timestamp() * 1000000)
+  return f"{POST_CARD_CACHE_PREFIX}:{post.id}:{version}:{post.like_count}:{post.comment_count}"
+
+
+@register.inclusion_tag(POST_CARD_TEMPLATE)
+def post_card(post):
+  """
+    Render a single post card, without cache.
+  """
+  return {"post": post}
+
+
+@register.simple_tag
+def post_cards(posts):
+  """
+    Render the cards of a feed page. Cached cards are fetched with a single
+    get_many, only missing ones are rendered and stored back.
+  """
+  keys = [post_card_cache_key(post) for post in posts]
+  cards = cache.get_many(keys)
+
+  missing_cards = {}
+  for key, post in zip(keys, posts):
+    if key not in cards:
+      missing_cards[key] = render_to_string(POST_CARD_TEMPLATE, post_card(post))
+  if missing_cards:
+    cache.set_many(missing_cards, timeout=POST_CARD_CACHE_TIMEOUT)
+    cards.update(missing_cards)
+
+  return mark_safe("".join(cards[key] for key in keys))
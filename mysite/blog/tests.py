@@ -1,3 +1,1648 @@
-from django.test import TestCase
+import io
+import os
+import json
+import base64
+import time
+import datetime
+import unittest
+from unittest import mock
+import threading
+from . import models
+from .likebuffer import LikeBuffer, write_like
+from .facets import build_feed_facets, get_feed_facets
+from .resolver import PostRef, PostSlugResolver, get_post_resolver
+from .history import is_partitioned, prune_history_batch
+from .transfer import PostImporter, export_posts
+from .routers import PrimaryReplicaRouter, is_pinned, replica_reads
+from .concurrency import run_query, shutdown_query_executor
+from . import views
+from . import pagecache
+from .pagination import InvalidCursor, KeysetPaginator
+from asgiref.sync import async_to_sync
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from django.core.cache import cache
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, connections, transaction
+from django.db.models import Count
+from django.db.backends.signals import connection_created
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.contenttypes.models import ContentType
+from taggit.models import TaggedItem
+
 
 # Create your tests here.
+def create_author(username="writer", **fields):
+  return models.User.objects.create(username=username, **fields)
+
+
+def create_post(author, slug="post", tags=None, **fields):
+  """
+    Create a post of 'author', published now unless 'fields' say
+    otherwise. Its tags are saved like the post form does when 'tags'
+    are given.
+  """
+  fields = {"title": slug, "content": "content", "status": "published", "publish_date": timezone.now(), **fields}
+  post = models.Post(slug=slug, author=author, **fields)
+  if tags is None:
+    post.save()
+  else:
+    models.Post.objects.save_with_tags(post, tags)
+  return post
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "EXPLAIN checks need PostgreSQL")
+class FeedQueryPlanTests(TestCase):
+  """
+    Feed query plan tests.
+
+    Seed the test database, then EXPLAIN every query run by feed views and
+    scheduler. Sequential scans are disabled for the session, so PostgreSQL
+    only picks one when no index can serve the query. Purpose-built indexes
+    are also checked, a full scan of an unrelated index is not enough.
+  """
+  scanned_tables = ("blog_post", "blog_postcomment", "taggit_taggeditem", "blog_post_likes")
+
+  @classmethod
+  def setUpTestData(cls):
+    now = timezone.now()
+    cls.authors = [create_author(f"author{index}") for index in range(100)]
+    cls.categories = [
+      models.Category.objects.create(name=f"category{index}", slug=f"category{index}") for index in range(100)
+    ]
+    cls.tags = [models.Tag.objects.create(name=f"tag{index}", slug=f"tag{index}") for index in range(100)]
+
+    posts = []
+    for index in range(20000):
+      post = models.Post(
+        title=f"post{index}",
+        slug=f"post{index}",
+        author=cls.authors[index % 100],
+        category=cls.categories[index // 7 % 100],
+        content="content",
+        status="published" if index % 4 else "draft",
+        publish_date=now - datetime.timedelta(minutes=index - 100),
+        deactivate_date=now + datetime.timedelta(days=1) if index % 7 == 0 else None
+      )
+      post.is_live = post.compute_is_live(now)
+      posts.append(post)
+    cls.posts = models.Post.objects.bulk_create(posts)
+
+    content_type = ContentType.objects.get_for_model(models.Post)
+    TaggedItem.objects.bulk_create([
+      TaggedItem(tag=cls.tags[index % 100], content_type=content_type, object_id=post.id)
+      for index, post in enumerate(cls.posts)
+    ])
+    models.PostComment.objects.bulk_create([
+      models.PostComment(post=cls.posts[1], author=cls.authors[0], content="comment")
+      for index in range(1000)
+    ])
+
+  def setUp(self):
+    cache.clear()
+    get_post_resolver().clear()
+    with connection.cursor() as cursor:
+      # Bulk inserts sit in GIN pending list until vacuum, merge them
+      cursor.execute("SELECT gin_clean_pending_list('blog_post_search_idx')")
+      cursor.execute("ANALYZE")
+      cursor.execute("SET LOCAL enable_seqscan = off")
+
+  def assertIndexedQueries(self, queries, expected_indexes=()):
+    plans = []
+    for query in queries:
+      sql = query["sql"]
+      if not sql.startswith("SELECT"):
+        continue
+
+      with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN {sql}")
+        plan = "\n".join(row[0] for row in cursor.fetchall())
+      plans.append(plan)
+
+      for table in self.scanned_tables:
+        self.assertNotIn(f"Seq Scan on {table} ", plan, f"{sql}\n{plan}")
+
+    for index in expected_indexes:
+      self.assertIn(index, "\n".join(plans))
+
+  def assertIndexedView(self, url, expected_indexes=()):
+    with CaptureQueriesContext(connection) as context:
+      response = self.client.get(url)
+    self.assertEqual(response.status_code, 200)
+    self.assertIndexedQueries(context.captured_queries, expected_indexes)
+
+    return response
+
+  def test_home_feed(self):
+    url = reverse("blog:home")
+    response = self.assertIndexedView(url, ["blog_post_live_feed_idx"])
+    self.assertIndexedView(f"{url}?cursor={response.context['page'].next_cursor}", ["blog_post_live_feed_idx"])
+
+  def test_filter_feeds(self):
+    self.assertIndexedView(
+      reverse("blog:author_filter", kwargs={"username": "author1"}), ["blog_post_author_feed_idx"]
+    )
+    self.assertIndexedView(
+      reverse("blog:category_filter", kwargs={"slug": "category1"}), ["blog_post_cat_feed_idx"]
+    )
+    self.assertIndexedView(reverse("blog:tags_filter", kwargs={"tag": "tag1"}))
+    self.assertIndexedView(f"{reverse('blog:multi_tags_filter')}?any=tag1,tag2,tag3&category=category1")
+    self.assertIndexedView(f"{reverse('blog:multi_tags_filter')}?all=tag1,tag2&any=tag1,tag3&author=author1")
+
+  def test_search(self):
+    self.assertIndexedView(f"{reverse('blog:search')}?q=post15", ["blog_post_search_idx"])
+
+  def test_author_posts(self):
+    self.client.force_login(self.authors[1])
+    url = reverse("blog:author_posts", kwargs={"username": "author1"})
+    response = self.assertIndexedView(url, ["blog_post_author_feed_idx"])
+    self.assertIndexedView(f"{url}?cursor={response.context['page'].next_cursor}", ["blog_post_author_feed_idx"])
+
+  def test_post_detail(self):
+    self.assertIndexedView(reverse("blog:view_post", kwargs={"slug": "post1"}), ["blog_comment_post_idx"])
+
+  def test_live_posts_scheduler(self):
+    with CaptureQueriesContext(connection) as context:
+      models.Post.objects.refresh_live_posts()
+      models.Post.objects.get_next_transition()
+    self.assertIndexedQueries(
+      context.captured_queries, ["blog_post_window_idx", "blog_post_live_deact_idx"]
+    )
+
+
+class PostCountersTests(TestCase):
+  """
+    Post counters tests.
+
+    'like_count' and 'comment_count' columns are only written by atomic
+    updates, a post saved from a stale instance must keep them.
+  """
+
+  def setUp(self):
+    self.author = create_author()
+    self.reader = create_author("reader")
+    self.post = create_post(self.author)
+
+  def test_save_keeps_counters_written_since_load(self):
+    post = models.Post.objects.get(pk=self.post.pk)
+    models.Post.objects.add_like(post.pk, self.reader.pk)
+    models.PostComment.objects.create(post=post, author=self.reader, content="comment")
+    models.Post.objects.update_comment_count(post.pk, 1)
+
+    post.content = "edited"
+    models.Post.objects.save_with_tags(post, ["a"])
+    post.refresh_from_db()
+    self.assertEqual((post.content, post.like_count, post.comment_count), ("edited", 1, 1))
+
+  def test_like_and_comment_writes(self):
+    self.assertEqual(models.Post.objects.add_like(self.post.pk, self.reader.pk), 1)
+    self.assertEqual(models.Post.objects.add_like(self.post.pk, self.reader.pk), 1)
+    self.assertEqual(models.Post.objects.remove_like(self.post.pk, self.author.pk), 1)
+    self.assertIsNone(models.Post.objects.add_like(0, self.reader.pk))
+
+    self.client.force_login(self.reader)
+    for index in range(2):
+      self.client.post(reverse("blog:add_comment", kwargs={"slug": "post"}), {"content": f"comment{index}"})
+    self.post.refresh_from_db()
+    self.assertEqual(self.post.comment_count, 2)
+
+    self.post.blog_comments.first().delete()
+    self.post.refresh_from_db()
+    self.assertEqual(self.post.comment_count, 1)
+
+  def test_rebuild_post_counters(self):
+    models.Post.objects.add_like(self.post.pk, self.reader.pk)
+    models.PostComment.objects.create(post=self.post, author=self.reader, content="comment")
+    models.Post.objects.filter(pk=self.post.pk).update(like_count=7, comment_count=0)
+
+    out = io.StringIO()
+    call_command("rebuild_post_counters", stdout=out)
+    self.assertIn("Counters rebuilt for 1 posts", out.getvalue())
+    self.post.refresh_from_db()
+    self.assertEqual((self.post.like_count, self.post.comment_count), (1, 1))
+
+  def test_deleted_user_likes_are_uncounted(self):
+    models.Post.objects.add_like(self.post.pk, self.reader.pk)
+    models.Post.objects.add_like(self.post.pk, self.author.pk)
+    self.reader.delete()
+    self.post.refresh_from_db()
+    self.assertEqual(self.post.like_count, 1)
+
+
+class KeysetPaginationTests(TestCase):
+  """
+    Keyset pagination tests.
+
+    Walking pages forward then backward must list every post once in feed
+    order, even when posts share a publish date, and a cursor which was
+    not built by the paginator must be rejected.
+  """
+
+  @classmethod
+  def setUpTestData(cls):
+    author = create_author()
+    now = timezone.now()
+    # Three posts share the same publish date, only their ids break ties
+    dates = [now, now, now, now - datetime.timedelta(hours=1), now - datetime.timedelta(hours=2)]
+    for index, date in enumerate(dates * 2):
+      create_post(
+        author, f"post{index}", title=f"python post{index}", content="python " * (index + 1),
+        publish_date=date - datetime.timedelta(days=index // 5)
+      )
+
+  def walk(self, paginator):
+    pages = [paginator.page()]
+    while pages[-1].has_next:
+      pages.append(paginator.page(pages[-1].next_cursor))
+    backward = [pages[-1]]
+    while backward[-1].has_previous:
+      backward.append(paginator.page(backward[-1].previous_cursor))
+    return pages, backward
+
+  def test_forward_and_backward_walk(self):
+    expected = list(models.Post.objects.order_by("-publish_date", "-id").values_list("id", flat=True))
+    pages, backward = self.walk(KeysetPaginator(models.Post.objects.all(), 3))
+
+    self.assertEqual([post.id for page in pages for post in page], expected)
+    self.assertEqual([len(page) for page in pages], [3, 3, 3, 1])
+    self.assertFalse(pages[0].has_previous)
+    self.assertEqual([post.id for page in reversed(backward) for post in page], expected)
+    # Previous page of the last one is the third forward page
+    self.assertEqual([post.id for post in backward[1]], [post.id for post in pages[2]])
+
+  @unittest.skipUnless(connection.vendor == "postgresql", "Search rank needs PostgreSQL")
+  def test_rank_cursors(self):
+    queryset = models.Post.objects.search("python")
+    expected = list(queryset.order_by("-rank", "-id").values_list("id", flat=True))
+    pages, backward = self.walk(KeysetPaginator(queryset, 4, ordering=("-rank", "-id")))
+
+    self.assertEqual(len(expected), 10)
+    self.assertEqual([post.id for page in pages for post in page], expected)
+    self.assertEqual([post.id for page in reversed(backward) for post in page], expected)
+    self.assertIsInstance(pages[0].object_list[0].rank, float)
+
+  def test_invalid_cursors(self):
+    paginator = KeysetPaginator(models.Post.objects.all(), 3)
+
+    def encode(payload):
+      return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    cursors = [
+      "not a cursor", encode({"d": "n", "v": [1]}), encode({"d": "x", "v": ["2021-01-01T00:00:00+00:00", 1]}),
+      encode({"d": "n", "v": ["yesterday", 1]}), encode({"d": "p", "v": ["2021-01-01T00:00:00+00:00", [1]]}),
+      encode({"d": "n", "v": ["2020-13-45T00:00:00", 1]}),
+    ]
+    for cursor in cursors:
+      with self.assertRaises(InvalidCursor):
+        paginator.page(cursor)
+      self.assertEqual(self.client.get(reverse("blog:home"), {"cursor": cursor}).status_code, 404)
+
+
+class FeedFacetsTests(TransactionTestCase):
+  """
+    Feed facets tests.
+
+    Filters lists are cached until a post, category or tag change is
+    committed, invalidation waits for commit so this is a
+    TransactionTestCase.
+  """
+
+  def setUp(self):
+    cache.clear()
+    self.author = create_author()
+
+  def assertFacets(self, categories, authors, tags):
+    facets = get_feed_facets()
+    self.assertEqual([category["slug"] for category in facets["categories"]], categories)
+    self.assertEqual([author["username"] for author in facets["authors"]], authors)
+    self.assertEqual([tag["name"] for tag in facets["tags"]], tags)
+
+  def test_facets_are_cached(self):
+    self.assertFacets([], [], [])
+    with self.assertNumQueries(0):
+      get_feed_facets()
+
+  def test_save_and_delete_invalidate_facets(self):
+    self.assertFacets([], [], [])
+    category = models.Category.objects.create(name="news", slug="news")
+    self.assertFacets(["news"], [], [])
+
+    post = create_post(self.author, category=category, tags=["python"])
+    self.assertFacets(["news"], ["writer"], ["python"])
+
+    models.Post.objects.save_with_tags(post, [])
+    self.assertFacets(["news"], ["writer"], [])
+
+    post.delete()
+    category.delete()
+    self.assertFacets([], [], [])
+
+  def test_rolled_back_change_keeps_facets(self):
+    self.assertFacets([], [], [])
+    with self.assertRaises(IntegrityError), transaction.atomic():
+      models.Category.objects.create(name="news", slug="news")
+      models.Category.objects.create(name="news", slug="other")
+    with self.assertNumQueries(0):
+      get_feed_facets()
+
+
+class LivePostsTests(TestCase):
+  """
+    Live posts tests.
+
+    'is_live' flag follows the publish window on save and is flipped by
+    the scheduler when a window starts or ends.
+  """
+
+  def setUp(self):
+    self.author = create_author()
+    self.now = timezone.now()
+
+  def create_windowed_post(self, slug, status="published", publish=0, deactivate=None):
+    hour = datetime.timedelta(hours=1)
+    return create_post(
+      self.author, slug, status=status,
+      publish_date=self.now + publish * hour, deactivate_date=deactivate and self.now + deactivate * hour
+    )
+
+  def test_save_computes_live_flag(self):
+    self.assertTrue(self.create_windowed_post("live").is_live)
+    self.assertFalse(self.create_windowed_post("scheduled", publish=1).is_live)
+    self.assertFalse(self.create_windowed_post("draft", status="draft").is_live)
+    self.assertFalse(self.create_windowed_post("ended", publish=-2, deactivate=-1).is_live)
+
+  def test_refresh_live_posts(self):
+    scheduled = self.create_windowed_post("scheduled", publish=1)
+    ending = self.create_windowed_post("ending", publish=-1, deactivate=2)
+    self.create_windowed_post("draft", status="draft", publish=-1)
+
+    self.assertEqual(models.Post.objects.get_next_transition(self.now), scheduled.publish_date)
+    self.assertEqual(models.Post.objects.refresh_live_posts(self.now), ([], []))
+
+    later = self.now + datetime.timedelta(hours=1, minutes=1)
+    self.assertEqual(models.Post.objects.refresh_live_posts(later), ([scheduled.pk], []))
+    self.assertEqual(models.Post.objects.get_next_transition(later), ending.deactivate_date)
+
+    # Deactivate date is inclusive
+    self.assertEqual(models.Post.objects.refresh_live_posts(ending.deactivate_date), ([], []))
+    end = ending.deactivate_date + datetime.timedelta(seconds=1)
+    self.assertEqual(models.Post.objects.refresh_live_posts(end), ([], [ending.pk]))
+    self.assertIsNone(models.Post.objects.get_next_transition(end))
+    self.assertEqual(
+      sorted(models.Post.objects.get_published_posts().values_list("slug", flat=True)), ["scheduled"]
+    )
+
+  def test_scheduler_command(self):
+    scheduled = self.create_windowed_post("scheduled", publish=-1)
+    models.Post.objects.filter(pk=scheduled.pk).update(is_live=False)
+
+    out = io.StringIO()
+    call_command("schedule_live_posts", "--once", stdout=out)
+    self.assertIn("1 posts published, 0 posts deactivated", out.getvalue())
+    self.assertTrue(models.Post.objects.get(pk=scheduled.pk).is_live)
+
+
+class FeedProjectionTests(TestCase):
+  """
+    Feed projection tests.
+
+    Feeds only fetch columns rendered by posts cards, post content is
+    never loaded by list views.
+  """
+
+  @classmethod
+  def setUpTestData(cls):
+    author = create_author()
+    for index in range(3):
+      create_post(author, f"post{index}", content="long content " * 100, like_count=index)
+
+  def test_for_feed_defers_content(self):
+    with self.assertNumQueries(1):
+      posts = list(models.Post.objects.for_feed().order_by("id"))
+      self.assertEqual([post.author.username for post in posts], ["writer"] * 3)
+      self.assertEqual([post.like_count for post in posts], [0, 1, 2])
+    self.assertIn("content", posts[0].get_deferred_fields())
+
+  def test_list_views_do_not_load_content(self):
+    content_column = f'{connection.ops.quote_name("blog_post")}.{connection.ops.quote_name("content")}'
+    urls = [
+      reverse("blog:home"),
+      reverse("blog:author_filter", kwargs={"username": "writer"}),
+      reverse("blog:search") + "?q=content",
+    ]
+    for url in urls:
+      with CaptureQueriesContext(connection) as context:
+        response = self.client.get(url)
+      self.assertContains(response, "post2")
+      self.assertFalse([query for query in context.captured_queries if content_column in query["sql"]], url)
+
+
+@override_settings(BLOG_COMMENTS_PAGE_SIZE=20)
+class PostViewQueriesTests(TestCase):
+  """
+    Post view queries tests.
+
+    Post page costs a fixed number of queries whatever its number of
+    comments, older comments are paginated by "Load more" requests.
+  """
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.author = create_author()
+    for slug in ("few", "many"):
+      post = create_post(cls.author, slug, tags=["python", "django"])
+      models.PostComment.objects.bulk_create([
+        models.PostComment(post=post, author=cls.author, content=f"{slug} comment{index}")
+        for index in range(1 if slug == "few" else 50)
+      ])
+
+  def setUp(self):
+    get_post_resolver().clear()
+    for slug in ("few", "many"):
+      get_post_resolver().resolve(slug)
+
+  def test_fixed_query_budget(self):
+    # Validator, post with author, category and like state, tags, comments page
+    for slug in ("few", "many"):
+      with self.assertNumQueries(4):
+        response = self.client.get(reverse("blog:view_post", kwargs={"slug": slug}))
+      self.assertEqual(len(response.context["comments_page"]), 1 if slug == "few" else 20)
+
+    # Session and user are read once more for a signed in reader
+    self.client.force_login(self.author)
+    for slug in ("few", "many"):
+      with self.assertNumQueries(6):
+        self.client.get(reverse("blog:view_post", kwargs={"slug": slug}))
+
+  def test_load_more_comments(self):
+    page = self.client.get(reverse("blog:view_post", kwargs={"slug": "many"})).context["comments_page"]
+    contents = [comment.content for comment in page]
+    while page.has_next:
+      url = reverse("blog:post_comments", kwargs={"slug": "many"})
+      with self.assertNumQueries(1):
+        response = self.client.get(url, {"cursor": page.next_cursor})
+      page = response.context["page"]
+      contents += [comment.content for comment in page]
+
+    self.assertEqual(len(contents), 50)
+    self.assertEqual(contents, list(
+      models.PostComment.objects.filter(post__slug="many").order_by("-posted_at", "-id").values_list("content", flat=True)
+    ))
+
+  def test_unknown_post_comments(self):
+    self.assertEqual(self.client.get(reverse("blog:post_comments", kwargs={"slug": "missing"})).status_code, 404)
+
+
+class PostLikeApiTests(TestCase):
+  """
+    Post like API tests.
+
+    POST likes and DELETE unlikes a post, both are idempotent and answer
+    the current likes count as JSON.
+  """
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.author = create_author()
+    cls.reader = create_author("reader")
+    cls.post = create_post(cls.author)
+
+  def setUp(self):
+    self.url = reverse("blog:api_like_post", kwargs={"pk": self.post.pk})
+
+  def test_like_and_unlike_are_idempotent(self):
+    self.client.force_login(self.reader)
+    for _ in range(2):
+      response = self.client.post(self.url)
+      self.assertEqual(response.json(), {"post": self.post.pk, "liked": True, "like_count": 1})
+    self.assertTrue(self.post.likes.filter(pk=self.reader.pk).exists())
+
+    self.client.force_login(self.author)
+    self.assertEqual(self.client.post(self.url).json()["like_count"], 2)
+    for _ in range(2):
+      response = self.client.delete(self.url)
+      self.assertEqual(response.json(), {"post": self.post.pk, "liked": False, "like_count": 1})
+    self.assertEqual(models.Post.objects.get(pk=self.post.pk).like_count, 1)
+
+  def test_anonymous_user(self):
+    for method in (self.client.post, self.client.delete):
+      response = method(self.url)
+      self.assertEqual(response.status_code, 401)
+      self.assertEqual(response.json(), {"error": "Authentication required"})
+    self.assertEqual(models.Post.objects.get(pk=self.post.pk).like_count, 0)
+
+  def test_unknown_post(self):
+    self.client.force_login(self.reader)
+    url = reverse("blog:api_like_post", kwargs={"pk": self.post.pk + 100})
+    for method in (self.client.post, self.client.delete):
+      response = method(url)
+      self.assertEqual(response.status_code, 404)
+      self.assertEqual(response.json(), {"error": "Post not found"})
+    self.assertFalse(models.Post.likes.through.objects.exists())
+
+
+class LikeBufferTests(TestCase):
+  """
+    Like buffer tests.
+
+    Check toggles coalescing, flush cost and background flusher timing.
+  """
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.users = [create_author(f"reader{index}") for index in range(50)]
+    cls.posts = [create_post(cls.users[0], f"hot{index}") for index in range(3)]
+
+  def test_toggles_are_coalesced(self):
+    like_buffer = LikeBuffer(start_flusher=False)
+    post = self.posts[0]
+    for liked in (True, False, True):
+      like_buffer.record(self.users[1].id, post.id, liked)
+    like_buffer.record(self.users[2].id, post.id, False)
+
+    self.assertEqual(like_buffer.flush(), 2)
+    self.assertEqual(like_buffer.flush(), 0)
+    post.refresh_from_db()
+    self.assertEqual(post.like_count, 1)
+    self.assertTrue(post.likes.filter(pk=self.users[1].pk).exists())
+
+  def test_flush_cost_does_not_depend_on_batch_size(self):
+    models.Post.objects.add_like(self.posts[0].id, self.users[0].id)
+    like_buffer = LikeBuffer(start_flusher=False)
+
+    like_buffer.record(self.users[1].id, self.posts[0].id, True)
+    like_buffer.record(self.users[0].id, self.posts[1].id, False)
+    with CaptureQueriesContext(connection) as small_batch:
+      like_buffer.flush()
+
+    for user in self.users:
+      for post in self.posts:
+        like_buffer.record(user.id, post.id, True)
+    like_buffer.record(self.users[0].id, self.posts[0].id, False)
+    with CaptureQueriesContext(connection) as large_batch:
+      self.assertEqual(like_buffer.flush(), len(self.users) * len(self.posts))
+
+    self.assertEqual(len(small_batch), len(large_batch))
+    self.assertEqual(
+      [post.like_count for post in models.Post.objects.filter(pk__in=[post.pk for post in self.posts]).order_by("pk")],
+      [len(self.users) - 1, len(self.users), len(self.users)]
+    )
+
+  def test_flush_applies_net_deltas(self):
+    post = self.posts[0]
+    models.Post.objects.add_like(post.id, self.users[0].id)
+    # Stored count is kept and moved by the rows really written, likes are not counted again
+    models.Post.objects.filter(pk=post.pk).update(like_count=100)
+    like_buffer = LikeBuffer(start_flusher=False)
+    like_buffer.record(self.users[0].id, post.id, True)
+    like_buffer.record(self.users[1].id, post.id, True)
+    like_buffer.record(self.users[2].id, post.id, False)
+    like_buffer.record(self.users[1].id, self.posts[1].id, False)
+
+    with CaptureQueriesContext(connection) as context:
+      like_buffer.flush()
+    self.assertFalse([query for query in context.captured_queries if "COUNT(" in query["sql"]])
+    self.assertEqual(
+      list(models.Post.objects.filter(pk__in=[post.pk, self.posts[1].pk]).order_by("pk").values_list("like_count", flat=True)),
+      [101, 0]
+    )
+
+  def test_reads_merge_pending_likes(self):
+    like_buffer = LikeBuffer(start_flusher=False)
+    like_buffer.record(self.users[1].id, self.posts[0].id, True)
+
+    self.assertEqual(like_buffer.merge(self.users[1].id, self.posts[0].id, 4, False), (5, True))
+    self.assertEqual(like_buffer.merge(self.users[1].id, self.posts[0].id, 4, True), (4, True))
+    self.assertEqual(like_buffer.merge(self.users[2].id, self.posts[0].id, 4, False), (4, False))
+
+  def assertFlushedWithin(self, like_buffer, timeout, toggles=1):
+    flushed = threading.Event()
+    like_buffer.flush = lambda: flushed.set() or 0
+    start = time.monotonic()
+    for index in range(toggles):
+      like_buffer.record(self.users[index].id, self.posts[0].id, True)
+
+    self.assertTrue(flushed.wait(timeout))
+    return time.monotonic() - start
+
+  def test_flusher_honours_flush_interval(self):
+    elapsed = self.assertFlushedWithin(LikeBuffer(flush_interval=0.2), timeout=2)
+    self.assertGreaterEqual(elapsed, 0.15)
+
+  def test_flusher_flushes_when_max_pending_is_reached(self):
+    self.assertFlushedWithin(LikeBuffer(flush_interval=60, max_pending=5), timeout=2, toggles=5)
+
+
+class TagsFilterTests(TestCase):
+  """
+    Tags filter tests.
+
+    Check AND/OR tags semantics and their composition with category and
+    author filters.
+  """
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.authors = [create_author(f"writer{index}") for index in range(2)]
+    cls.category = models.Category.objects.create(name="news", slug="news")
+    cls.posts = {}
+    for name, tags, author in (
+      ("python-django", ["python", "django"], 0), ("python", ["python"], 0),
+      ("django", ["django"], 1), ("python-django-web", ["python", "django", "web"], 1)
+    ):
+      cls.posts[name] = create_post(
+        cls.authors[author], name, category=cls.category if author else None, tags=tags
+      )
+
+  def get_filtered(self, params):
+    response = self.client.get(reverse("blog:multi_tags_filter"), params)
+    self.assertEqual(response.status_code, 200)
+    return sorted(post.slug for post in response.context["filtered_posts"])
+
+  def test_all_tags(self):
+    self.assertEqual(self.get_filtered({"all": "python,django"}), ["python-django", "python-django-web"])
+    self.assertEqual(self.get_filtered({"all": "python,django,web"}), ["python-django-web"])
+    self.assertEqual(self.get_filtered({"all": "python,python"}), ["python", "python-django", "python-django-web"])
+    self.assertEqual(self.get_filtered({"all": "python,missing"}), [])
+
+  def test_any_tags_are_not_duplicated(self):
+    self.assertEqual(
+      self.get_filtered({"any": "python,django,web"}),
+      ["django", "python", "python-django", "python-django-web"]
+    )
+
+  def test_tags_compose_with_category_and_author(self):
+    self.assertEqual(self.get_filtered({"any": "python,django", "category": "news"}), ["django", "python-django-web"])
+    self.assertEqual(self.get_filtered({"all": "django", "author": "writer0"}), ["python-django"])
+    self.assertEqual(
+      self.get_filtered({"all": "django", "any": "python,web", "author": "writer1"}), ["python-django-web"]
+    )
+
+  def test_combined_filters_run_one_query(self):
+    queryset = models.Post.objects.get_published_posts().get_posts_by_all_tags(["python", "django"])
+    with self.assertNumQueries(1):
+      posts = list(queryset.get_posts_by_tags(["web", "django"]).filter(category__slug="news").for_feed())
+    self.assertEqual([post.slug for post in posts], ["python-django-web"])
+
+  def test_single_tag_url(self):
+    response = self.client.get(reverse("blog:tags_filter", kwargs={"tag": "django"}), {"all": "python"})
+    self.assertCountEqual(
+      [post.slug for post in response.context["filtered_posts"]], ["python-django", "python-django-web"]
+    )
+
+
+@override_settings(BLOG_PAGE_CACHE={"ENABLED": True, "TIMEOUT": 60})
+class PageCacheTests(TransactionTestCase):
+  """
+    Page cache tests.
+
+    Purges run on transaction commit, so this is a TransactionTestCase.
+    Check anonymous pages are served without queries until a change
+    purges exactly the pages showing it.
+  """
+
+  def setUp(self):
+    cache.clear()
+    get_post_resolver().clear()
+    self.author = create_author()
+    self.categories = [
+      models.Category.objects.create(name=f"category{index}", slug=f"category{index}") for index in range(2)
+    ]
+    self.posts = [create_post(self.author, f"post{index}", category=self.categories[index]) for index in range(2)]
+    self.urls = {
+      "home": reverse("blog:home"),
+      "post0": reverse("blog:view_post", kwargs={"slug": "post0"}),
+      "post1": reverse("blog:view_post", kwargs={"slug": "post1"}),
+      "category0": reverse("blog:category_filter", kwargs={"slug": "category0"}),
+      "category1": reverse("blog:category_filter", kwargs={"slug": "category1"}),
+    }
+    for url in self.urls.values():
+      self.client.get(url)
+
+  def assertCached(self, *names):
+    for name, url in self.urls.items():
+      with CaptureQueriesContext(connection) as context:
+        response = self.client.get(url)
+      self.assertEqual(response.status_code, 200)
+      self.assertEqual(len(context) == 0, name in names, f"{name} cached state is wrong")
+
+  def test_anonymous_pages_are_cached(self):
+    self.assertCached(*self.urls)
+    response = self.client.get(self.urls["post0"])
+    self.assertIn(f"post-{self.posts[0].pk}", response["Surrogate-Key"].split())
+    self.assertIn("public", response["Cache-Control"])
+    self.assertIn("s-maxage=60", response["Cache-Control"])
+
+  def test_cached_pages_answer_conditional_requests(self):
+    etag = self.client.get(self.urls["post0"])["ETag"]
+    with self.assertNumQueries(0):
+      response = self.client.get(self.urls["post0"], HTTP_IF_NONE_MATCH=etag)
+    self.assertEqual(response.status_code, 304)
+
+  def test_authenticated_requests_skip_cache(self):
+    self.client.force_login(self.author)
+    with CaptureQueriesContext(connection) as context:
+      response = self.client.get(self.urls["home"])
+    self.assertNotEqual(len(context), 0)
+    self.assertNotIn("Surrogate-Key", response)
+
+  def test_comment_purges_pages_showing_post(self):
+    models.PostComment.objects.create(post=self.posts[0], author=self.author, content="comment")
+    self.assertCached("post1", "category1")
+
+  def test_like_purges_pages_showing_post(self):
+    write_like(self.posts[1].pk, self.author, True)
+    self.assertCached("post0", "category0")
+
+  def test_category_change_purges_its_pages_and_facets(self):
+    self.categories[1].name = "renamed"
+    self.categories[1].save()
+    self.assertCached("post0")
+
+  @unittest.skipUnless(connection.vendor == "postgresql", "Tag stats triggers need PostgreSQL")
+  def test_unpublish_purges_facets_counts(self):
+    def get_tag_counts():
+      response = self.client.get(self.urls["category1"])
+      return {tag["name"]: tag["count"] for tag in response.context["tags"]}
+
+    models.Post.objects.save_with_tags(self.posts[0], ["python"])
+    self.assertEqual(get_tag_counts(), {"python": 1})
+    self.posts[0].status = "draft"
+    self.posts[0].save()
+    self.assertEqual(get_tag_counts(), {})
+
+  def test_scheduled_publish_purges_listings(self):
+    post = create_post(
+      self.author, "scheduled", category=self.categories[1], publish_date=timezone.now() + datetime.timedelta(hours=1)
+    )
+    for url in self.urls.values():
+      self.client.get(url)
+    models.Post.objects.filter(pk=post.pk).update(publish_date=timezone.now())
+
+    call_command("schedule_live_posts", "--once", stdout=open(os.devnull, "w"))
+    self.assertCached("post0", "post1")
+    self.assertContains(self.client.get(self.urls["home"]), "scheduled")
+
+
+class ConditionalGetTests(TestCase):
+  """
+    Conditional GET tests.
+
+    Check post and feed pages answer repeated requests with a 304 after a
+    single query, and a full page once they change.
+  """
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.author = create_author()
+    cls.post = create_post(cls.author)
+
+  def setUp(self):
+    cache.clear()
+    get_post_resolver().clear()
+    self.urls = [
+      reverse("blog:view_post", kwargs={"slug": "post"}),
+      reverse("blog:home"),
+      reverse("blog:author_filter", kwargs={"username": "writer"}),
+    ]
+
+  def assertNotModified(self, url, queries=1, **headers):
+    with self.assertNumQueries(queries):
+      response = self.client.get(url, **headers)
+    self.assertEqual(response.status_code, 304)
+    return response
+
+  def assertModified(self, url, **headers):
+    response = self.client.get(url, **headers)
+    self.assertEqual(response.status_code, 200)
+    return response
+
+  def test_unchanged_pages_are_not_modified(self):
+    for url, queries in zip(self.urls, (1, 1, 2)):
+      response = self.assertModified(url)
+      self.assertNotModified(url, queries, HTTP_IF_NONE_MATCH=response["ETag"])
+    response = self.assertModified(self.urls[0])
+    self.assertNotModified(self.urls[0], HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+
+  def test_feed_pages_have_no_last_modified(self):
+    # A scheduled post going live only flips 'is_live', no date moves
+    scheduled = create_post(self.author, "scheduled", publish_date=timezone.now() + datetime.timedelta(minutes=1))
+    response = self.assertModified(self.urls[1])
+    self.assertFalse(response.has_header("Last-Modified"))
+
+    models.Post.objects.refresh_live_posts(scheduled.publish_date)
+    self.assertContains(self.assertModified(self.urls[1], HTTP_IF_NONE_MATCH=response["ETag"]), "scheduled")
+    self.assertModified(self.urls[1], HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+
+  def test_rendered_feed_page_reads_posts_once(self):
+    post_table = connection.ops.quote_name(models.Post._meta.db_table)
+    with CaptureQueriesContext(connection) as context:
+      self.assertModified(self.urls[1])
+    self.assertEqual(len([query for query in context.captured_queries if f"FROM {post_table}" in query["sql"]]), 1)
+
+  def test_comment_and_like_change_etag(self):
+    etags = [self.assertModified(url)["ETag"] for url in self.urls]
+    models.PostComment.objects.create(post=self.post, author=self.author, content="comment")
+    models.Post.objects.update_comment_count(self.post.id, 1)
+    for url, etag in zip(self.urls, etags):
+      self.assertModified(url, HTTP_IF_NONE_MATCH=etag)
+
+    etags = [self.assertModified(url)["ETag"] for url in self.urls]
+    models.Post.objects.add_like(self.post.id, self.author.id)
+    for url, etag in zip(self.urls, etags):
+      self.assertModified(url, HTTP_IF_NONE_MATCH=etag)
+
+  def test_new_post_changes_feed_etag(self):
+    etag = self.assertModified(self.urls[1])["ETag"]
+    create_post(self.author, "new")
+    self.assertModified(self.urls[1], HTTP_IF_NONE_MATCH=etag)
+
+  def test_etag_depends_on_user(self):
+    etag = self.assertModified(self.urls[0])["ETag"]
+    self.client.force_login(self.author)
+    self.assertNotEqual(self.assertModified(self.urls[0], HTTP_IF_NONE_MATCH=etag)["ETag"], etag)
+
+
+class PostCardCacheTests(TestCase):
+  """
+    Post card fragment cache tests.
+
+    Check a warm feed page renders no card and a changed post only
+    renders its own card again.
+  """
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.author = create_author()
+    cls.posts = [create_post(cls.author, f"post{index}") for index in range(5)]
+
+  def setUp(self):
+    cache.clear()
+    get_post_resolver().clear()
+
+  def get_rendered_cards(self):
+    response = self.client.get(reverse("blog:home"))
+    self.assertEqual(response.status_code, 200)
+    return len([template for template in response.templates if template.name == "blog/post_card.html"])
+
+  def test_warm_page_renders_no_card(self):
+    self.assertEqual(self.get_rendered_cards(), 5)
+    self.assertEqual(self.get_rendered_cards(), 0)
+
+  def test_changed_post_renders_its_card(self):
+    self.get_rendered_cards()
+    models.Post.objects.add_like(self.posts[0].id, self.author.id)
+    self.assertEqual(self.get_rendered_cards(), 1)
+    self.assertContains(self.client.get(reverse("blog:home")), "<h4>post0</h4>", count=1)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Author stats trigger needs PostgreSQL")
+class AuthorStatsTests(TestCase):
+  """
+    Author stats tests.
+
+    Check the stats trigger keeps rows equal to a full rebuild through
+    posts, likes, comments, publish window and author changes.
+  """
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.authors = [create_author(f"writer{index}") for index in range(2)]
+    now = timezone.now()
+    cls.posts = [
+      create_post(
+        cls.authors[0], f"post{index}", status="published" if index < 2 else "draft",
+        publish_date=now - datetime.timedelta(days=index)
+      ) for index in range(3)
+    ]
+
+  def get_stats(self):
+    return {
+      stats.pop("author_id"): stats
+      for stats in models.AuthorStats.objects.order_by("author_id").values()
+    }
+
+  def assertStatsMatchRebuild(self):
+    models.AuthorStats.objects.apply_total_deltas()
+    stats = self.get_stats()
+    call_command("rebuild_author_stats", stdout=open(os.devnull, "w"))
+    self.assertEqual(stats, self.get_stats())
+    return stats
+
+  def test_posts_are_counted(self):
+    stats = self.assertStatsMatchRebuild()[self.authors[0].id]
+    self.assertEqual((stats["post_count"], stats["published_count"]), (3, 2))
+    self.assertEqual(stats["last_published_at"], self.posts[0].publish_date)
+
+  def get_stats_row_version(self):
+    with connection.cursor() as cursor:
+      cursor.execute("SELECT xmin::text FROM blog_authorstats WHERE author_id = %s", [self.authors[0].id])
+      return cursor.fetchone()[0]
+
+  def test_likes_and_comments_are_applied_in_batches(self):
+    version = self.get_stats_row_version()
+    models.Post.objects.add_like(self.posts[0].id, self.authors[1].id)
+    models.Post.objects.add_like(self.posts[1].id, self.authors[1].id)
+    models.Post.objects.remove_like(self.posts[1].id, self.authors[1].id)
+    models.PostComment.objects.create(post=self.posts[2], author=self.authors[1], content="comment")
+    models.Post.objects.update_comment_count(self.posts[2].id, 1)
+
+    # Author stats row is not written by likes and comments, but once by the scheduler
+    self.assertEqual(self.get_stats_row_version(), version)
+    self.assertEqual(models.AuthorStatsDelta.objects.count(), 4)
+    call_command("schedule_live_posts", "--once", stdout=open(os.devnull, "w"))
+    self.assertNotEqual(self.get_stats_row_version(), version)
+    self.assertFalse(models.AuthorStatsDelta.objects.exists())
+    stats = self.assertStatsMatchRebuild()[self.authors[0].id]
+    self.assertEqual((stats["like_count"], stats["comment_count"]), (1, 1))
+
+  def test_publish_window_and_author_changes(self):
+    models.Post.objects.filter(pk=self.posts[0].pk).update(is_live=False)
+    stats = self.assertStatsMatchRebuild()[self.authors[0].id]
+    self.assertEqual(stats["last_published_at"], self.posts[1].publish_date)
+
+    self.posts[1].author = self.authors[1]
+    self.posts[1].save()
+    self.posts[2].delete()
+    stats = self.assertStatsMatchRebuild()
+    self.assertEqual(stats[self.authors[0].id]["post_count"], 1)
+    self.assertEqual(stats[self.authors[1].id]["published_count"], 1)
+
+  def test_author_posts_header_reads_stats(self):
+    self.client.force_login(self.authors[0])
+    response = self.client.get(reverse("blog:author_posts", kwargs={"username": "writer0"}))
+    self.assertContains(response, "2 of 3 published")
+    self.assertContains(response, "0 likes, 0 comments")
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Tag stats triggers need PostgreSQL")
+class TagStatsTests(TestCase):
+  """
+    Tag stats tests.
+
+    Check tags counts follow tags changes and posts visibility, and the
+    tags filter lists used tags by popularity.
+  """
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.author = create_author()
+    for index in range(4):
+      create_post(cls.author, f"post{index}", status="published" if index < 3 else "draft")
+
+  def setUp(self):
+    cache.clear()
+    self.posts = list(models.Post.objects.order_by("id"))
+
+  def get_counts(self):
+    return dict(models.TagStats.objects.filter(published_count__gt=0).values_list("tag__name", "published_count"))
+
+  def get_live_counts(self):
+    content_type = ContentType.objects.get_for_model(models.Post)
+    live_posts = models.Post.objects.filter(is_live=True).values("id")
+    return dict(
+      TaggedItem.objects.filter(content_type=content_type, object_id__in=live_posts)
+      .values("tag__name").annotate(total=Count("id")).values_list("tag__name", "total")
+    )
+
+  def test_counts_follow_tags_and_visibility(self):
+    self.posts[0].tags.add("python", "django")
+    self.posts[1].tags.add("python")
+    self.posts[3].tags.add("draft-only", "python")
+    self.assertEqual(self.get_counts(), {"python": 2, "django": 1})
+
+    self.posts[0].tags.remove("django")
+    models.Post.objects.filter(pk=self.posts[3].pk).update(is_live=True)
+    self.assertEqual(self.get_counts(), {"python": 3, "draft-only": 1})
+
+    self.posts[1].delete()
+    self.posts[3].status = "draft"
+    self.posts[3].save()
+    self.assertEqual(self.get_counts(), {"python": 1})
+    self.assertEqual(self.get_counts(), self.get_live_counts())
+
+  def test_tags_filter_is_sorted_by_popularity(self):
+    self.posts[0].tags.add("rare", "common")
+    self.posts[1].tags.add("common")
+    self.posts[3].tags.add("draft-only")
+
+    # One query per filters list
+    with self.assertNumQueries(3):
+      tags = build_feed_facets()["tags"]
+    self.assertEqual([(tag["name"], tag["count"]) for tag in tags], [("common", 2), ("rare", 1)])
+
+
+class TagSyncTests(TestCase):
+  """
+    Tag synchronization tests.
+
+    Check post tags are diffed against submitted ones with a constant
+    number of queries and a single history entry.
+  """
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.author = create_author()
+
+  def setUp(self):
+    get_post_resolver().clear()
+
+  def test_tags_are_added_and_removed(self):
+    post = create_post(self.author, tags=["a", "b", "c"])
+    models.Post.objects.save_with_tags(post, ["b", "c", "d"])
+
+    self.assertEqual(sorted(post.tags.names()), ["b", "c", "d"])
+    self.assertEqual(post.history.count(), 2)
+    self.assertEqual(post.history.first().history_change_reason, "Tags: +d, -a")
+
+  def test_sync_cost_does_not_depend_on_tags(self):
+    queries = []
+    for size in (5, 50):
+      post = create_post(self.author, f"post{size}", tags=[f"old{size}-{index}" for index in range(size)])
+      with CaptureQueriesContext(connection) as context:
+        models.Post.objects.save_with_tags(post, [f"new{size}-{index}" for index in range(size)])
+      queries.append(len(context))
+      self.assertEqual(post.tags.count(), size)
+
+    self.assertEqual(queries[0], queries[1])
+
+  def test_edit_form_shows_and_syncs_tags(self):
+    post = create_post(self.author, tags=["a", "b"])
+    self.client.force_login(self.author)
+    url = reverse("blog:edit_post", kwargs={"slug": "post"})
+    self.assertContains(self.client.get(url), 'value="a, b"')
+
+    response = self.client.post(url, {
+      "title": "post", "slug": "post", "content": "content", "status": "published",
+      "publish_date": timezone.now().strftime("%d/%m/%Y"), "tag": "b, c"
+    })
+    self.assertEqual(response.status_code, 302)
+    self.assertEqual(sorted(post.tags.names()), ["b", "c"])
+
+
+class PostSlugResolverTests(TransactionTestCase):
+  """
+    Post slug resolver tests.
+
+    Invalidation runs on transaction commit, so this is a
+    TransactionTestCase.
+  """
+
+  def setUp(self):
+    get_post_resolver().clear()
+    self.author = create_author()
+    self.posts = [create_post(self.author, f"post{index}") for index in range(3)]
+
+  def test_resolved_slugs_are_cached(self):
+    resolver = PostSlugResolver()
+    with self.assertNumQueries(1):
+      self.assertEqual(resolver.resolve("post0"), PostRef(self.posts[0].id, self.author.id, "published"))
+      self.assertEqual(resolver.resolve("post0").id, self.posts[0].id)
+    with self.assertNumQueries(1):
+      self.assertIsNone(resolver.resolve("missing"))
+
+  def test_least_recently_used_slug_is_evicted(self):
+    resolver = PostSlugResolver(max_size=2)
+    resolver.resolve("post0")
+    resolver.resolve("post1")
+    resolver.resolve("post0")
+    resolver.resolve("post2")
+    with self.assertNumQueries(0):
+      resolver.resolve("post0")
+      resolver.resolve("post2")
+    with self.assertNumQueries(1):
+      resolver.resolve("post1")
+
+  def test_entries_expire(self):
+    resolver = PostSlugResolver(ttl=0.05)
+    resolver.resolve("post0")
+    time.sleep(0.1)
+    with self.assertNumQueries(1):
+      resolver.resolve("post0")
+
+  def test_slug_change_and_delete_invalidate(self):
+    resolver = get_post_resolver()
+    resolver.resolve("post0")
+    resolver.resolve("post1")
+
+    self.posts[0].slug = "renamed"
+    self.posts[0].save()
+    self.assertIsNone(resolver.resolve("post0"))
+    self.assertEqual(resolver.resolve("renamed").id, self.posts[0].id)
+
+    self.posts[1].delete()
+    self.assertIsNone(resolver.resolve("post1"))
+
+  def test_like_by_slug_skips_post_lookup(self):
+    self.client.force_login(self.author)
+    url = reverse("blog:like_post", kwargs={"slug": "post0"})
+    self.client.post(url)
+    with CaptureQueriesContext(connection) as context:
+      self.client.post(url)
+    self.assertFalse(any('"blog_post"."slug"' in query["sql"] for query in context.captured_queries))
+    self.assertEqual(models.Post.objects.get(pk=self.posts[0].pk).like_count, 1)
+
+
+class OwnerPermissionTests(TestCase):
+  """
+    Owner permission tests.
+
+    Check denied requests are rejected before any work: only session,
+    user and a single post owner lookup queries run.
+  """
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.owner = create_author("owner")
+    cls.intruder = create_author("intruder")
+    cls.admin = create_author("admin", is_superuser=True)
+    cls.post = create_post(cls.owner)
+
+  def setUp(self):
+    get_post_resolver().clear()
+    self.client.force_login(self.intruder)
+
+  def assertDenied(self, method, url, queries):
+    with self.assertNumQueries(queries):
+      response = getattr(self.client, method)(url, {"title": "stolen", "content": "stolen"})
+    self.assertEqual(response.status_code, 403)
+
+  def test_edit_is_denied_before_work(self):
+    url = reverse("blog:edit_post", kwargs={"slug": "post"})
+    self.assertDenied("get", url, 3)
+    self.assertDenied("post", url, 2)
+    self.assertEqual(models.Post.objects.get(pk=self.post.pk).title, "post")
+
+  def test_delete_is_denied_before_work(self):
+    self.assertDenied("post", reverse("blog:delete_post", kwargs={"slug": "post"}), 3)
+    self.assertTrue(models.Post.objects.filter(pk=self.post.pk).exists())
+
+  def test_author_posts_is_denied_before_work(self):
+    self.assertDenied("get", reverse("blog:author_posts", kwargs={"username": "owner"}), 2)
+
+  def test_owner_and_superuser_are_allowed(self):
+    for user in (self.owner, self.admin):
+      self.client.force_login(user)
+      self.assertEqual(self.client.get(reverse("blog:edit_post", kwargs={"slug": "post"})).status_code, 200)
+      self.assertEqual(self.client.get(reverse("blog:author_posts", kwargs={"username": "owner"})).status_code, 200)
+
+  def test_anonymous_users_are_sent_to_sign_in(self):
+    self.client.logout()
+    self.assertEqual(self.client.get(reverse("blog:edit_post", kwargs={"slug": "post"})).status_code, 302)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "History partitioning needs PostgreSQL")
+@override_settings(BLOG_HISTORY_RETENTION={"blog.Post": {"KEEP_LAST": 2, "KEEP_DAYS": 30, "THIN_DAILY": True}})
+class HistoryRetentionTests(TestCase):
+  """
+    History retention tests.
+
+    Check prune_history keeps what policies ask for, batches can be
+    resumed, and the audit query of one post stays index-backed with the
+    monthly partitioned layout.
+  """
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.author = create_author()
+    now = timezone.now()
+    for index in range(2):
+      post = create_post(cls.author, f"post{index}", status="draft", publish_date=now)
+      for edit in range(5):
+        post.content = f"edit{edit}"
+        post.save()
+
+      # Newest first: today, two edits 100 days ago, 101 days ago, two edits 200 days ago
+      ages = [(0, 0), (100, 1), (100, 2), (101, 0), (200, 1), (200, 2)]
+      for history_id, (days, minutes) in zip(post.history.values_list("history_id", flat=True), ages):
+        models.Post.history.filter(history_id=history_id).update(
+          history_date=now - datetime.timedelta(days=days, minutes=minutes)
+        )
+
+  def setUp(self):
+    self.posts = list(models.Post.objects.order_by("id"))
+
+  def prune(self, *args):
+    call_command("prune_history", "--model", "blog.Post", *args, stdout=open(os.devnull, "w"))
+
+  def get_ages(self, post):
+    now = timezone.now()
+    return [(now - date).days for date in post.history.values_list("history_date", flat=True)]
+
+  def test_last_rows_and_daily_snapshots_are_kept(self):
+    self.prune()
+    self.assertEqual(self.get_ages(self.posts[0]), [0, 100, 101, 200])
+
+  @override_settings(BLOG_HISTORY_RETENTION={"blog.Post": {"KEEP_LAST": 1, "KEEP_DAYS": 150}})
+  def test_recent_rows_are_kept(self):
+    self.prune()
+    self.assertEqual(self.get_ages(self.posts[0]), [0, 100, 100, 101])
+
+  def test_dry_run_and_resume(self):
+    self.prune("--dry-run")
+    self.assertEqual(models.Post.history.count(), 12)
+
+    self.prune("--batch-size", "1", "--after-id", str(self.posts[0].id))
+    self.assertEqual(self.posts[0].history.count(), 6)
+    self.assertEqual(self.posts[1].history.count(), 4)
+
+  def test_failed_run_prints_resume_id(self):
+    batches = []
+
+    def failing_batch(*args, **kwargs):
+      if batches:
+        raise DatabaseError("statement timeout")
+      batches.append(prune_history_batch(*args, **kwargs))
+      return batches[-1]
+
+    err = io.StringIO()
+    with mock.patch("blog.management.commands.prune_history.prune_history_batch", failing_batch), \
+        self.assertRaises(DatabaseError):
+      call_command("prune_history", "--model", "blog.Post", "--batch-size", "1", stdout=io.StringIO(), stderr=err)
+    self.assertIn(f"--model blog.Post --after-id {self.posts[0].id}", err.getvalue())
+
+  def assertAuditQueryIsIndexed(self, post):
+    sql, params = post.history.all().query.sql_with_params()
+    with connection.cursor() as cursor:
+      cursor.execute("SET LOCAL enable_seqscan = off")
+      cursor.execute(f"EXPLAIN {sql}", params)
+      plan = "\n".join(row[0] for row in cursor.fetchall())
+    self.assertNotIn("Seq Scan", plan, plan)
+    # Rows come in audit order from the index, Merge Append of partitions included
+    self.assertNotIn("Sort  (", plan, plan)
+
+  def test_audit_query_is_indexed(self):
+    self.assertAuditQueryIsIndexed(self.posts[0])
+
+  def test_partitioned_layout(self):
+    call_command("partition_history", "--model", "blog.Post", stdout=open(os.devnull, "w"))
+    self.assertTrue(is_partitioned(models.Post.history.model))
+    self.assertEqual(models.Post.history.count(), 12)
+
+    self.posts[0].save()
+    self.assertEqual(self.posts[0].history.count(), 7)
+    self.assertAuditQueryIsIndexed(self.posts[0])
+
+    self.prune()
+    self.assertEqual(self.get_ages(self.posts[0]), [0, 0, 100, 101, 200])
+    call_command("partition_history", "--model", "blog.Post", stdout=open(os.devnull, "w"))
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Bulk created rows ids need PostgreSQL")
+class PostTransferTests(TestCase):
+  """
+    Post import and export tests.
+
+    Check an export imported again gives the same posts, tags, likes and
+    comments, and import queries depend on batches, not on posts.
+  """
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.authors = [create_author(f"writer{index}") for index in range(2)]
+    category = models.Category.objects.create(name="category", slug="category")
+    now = timezone.now()
+    for index in range(3):
+      post = create_post(
+        cls.authors[index % 2], f"post{index}", category=category if index else None,
+        publish_date=now, tags=[f"tag{index}", "shared"]
+      )
+      models.Post.objects.add_like(post.id, cls.authors[1].id)
+      models.PostComment.objects.create(post=post, author=cls.authors[0], content=f"comment{index}")
+      models.Post.objects.update_comment_count(post.id, 1)
+
+  def export(self):
+    stream = io.StringIO()
+    export_posts(stream, chunk_size=2)
+    return stream.getvalue()
+
+  def test_round_trip(self):
+    exported = self.export()
+    self.assertEqual(len(exported.splitlines()), 3)
+    models.Post.objects.all().delete()
+    models.Category.objects.all().delete()
+    self.authors[1].delete()
+
+    self.assertEqual(PostImporter(batch_size=2).import_lines(exported.splitlines()), (3, 0))
+    self.assertEqual(self.export(), exported)
+
+    post = models.Post.objects.get(slug="post1")
+    self.assertEqual((post.like_count, post.comment_count, post.is_live), (1, 1, True))
+    history = post.history.get()
+    self.assertEqual((history.history_change_reason, history.history_date), ("Imported", post.created_at))
+
+  def test_existing_posts_are_skipped(self):
+    self.assertEqual(PostImporter().import_lines(self.export().splitlines()), (0, 3))
+
+  def test_queries_do_not_depend_on_posts(self):
+    queries = []
+    for size in (5, 20):
+      lines = [
+        json.dumps({
+          "title": f"new{size}-{index}", "slug": f"new{size}-{index}", "author": f"author{size}-{index}",
+          "category": {"name": f"category{size}-{index}", "slug": f"category{size}-{index}"},
+          "content": "content", "status": "published", "publish_date": "2021-01-15T00:00:00Z",
+          "tags": [f"tag{size}-{index}"], "likes": ["writer0"],
+          "comments": [{"author": "writer1", "content": "comment", "posted_at": "2021-01-16T00:00:00Z"}],
+        }) for index in range(size)
+      ]
+      with CaptureQueriesContext(connection) as context:
+        PostImporter(batch_size=size).import_lines(lines)
+      queries.append(len(context))
+
+    self.assertEqual(queries[0], queries[1])
+
+
+@override_settings(BLOG_SYNDICATION_ENTRIES=2)
+class SyndicationFeedTests(TestCase):
+  """
+    Syndication feed tests.
+
+    Check feeds stream the newest posts in every format and an unchanged
+    feed poll costs a single query.
+  """
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.author = create_author()
+    cls.category = models.Category.objects.create(name="category", slug="category")
+    now = timezone.now()
+    for index in range(3):
+      create_post(
+        cls.author, f"post{index}", content=f"content{index}", category=cls.category if index else None,
+        publish_date=now - datetime.timedelta(hours=3 - index), tags=["python"] if index < 2 else []
+      )
+
+  def get_feed(self, url, **headers):
+    response = self.client.get(url, **headers)
+    if response.status_code == 200:
+      self.assertTrue(response.streaming)
+    return response
+
+  def get_titles(self, url):
+    content = b"".join(self.get_feed(url).streaming_content)
+    return [item["title"] for item in json.loads(content)["items"]]
+
+  def test_formats(self):
+    response = self.get_feed(reverse("blog:feed", args=["rss"]))
+    self.assertEqual(response["Content-Type"], "application/rss+xml; charset=utf-8")
+    rss = b"".join(response.streaming_content).decode()
+    self.assertIn("<title>post2</title>", rss)
+    self.assertIn("<category>category</category>", rss)
+    self.assertNotIn("post0", rss)
+
+    self.assertContains(self.get_feed(reverse("blog:feed", args=["atom"])), "<entry>", count=2)
+
+    content = b"".join(self.get_feed(reverse("blog:feed", args=["json"])).streaming_content)
+    items = json.loads(content)["items"]
+    self.assertEqual([item["title"] for item in items], ["post2", "post1"])
+    self.assertEqual(items[1]["tags"], ["category", "python"])
+
+    self.assertEqual(self.client.get(reverse("blog:feed", args=["xml"])).status_code, 404)
+
+  def test_filtered_feeds(self):
+    self.assertEqual(self.get_titles(reverse("blog:tag_feed", args=["python", "json"])), ["post1", "post0"])
+    self.assertEqual(self.get_titles(reverse("blog:category_feed", args=["category", "json"])), ["post2", "post1"])
+    self.assertEqual(self.get_feed(reverse("blog:author_feed", args=["writer", "rss"])).status_code, 200)
+    missing_urls = [
+      reverse("blog:author_feed", args=["missing", "rss"]),
+      reverse("blog:category_feed", args=["missing", "rss"]),
+      reverse("blog:tag_feed", args=["missing", "rss"]),
+    ]
+    for url in missing_urls:
+      self.assertEqual(self.get_feed(url).status_code, 404)
+      self.assertEqual(self.get_feed(url, HTTP_IF_NONE_MATCH="*").status_code, 404)
+    url = reverse("blog:category_feed", args=["category", "rss"])
+    with self.assertNumQueries(2):
+      self.assertEqual(self.get_feed(url, HTTP_IF_NONE_MATCH="*").status_code, 304)
+
+  def test_unchanged_feed_poll(self):
+    url = reverse("blog:feed", args=["atom"])
+    response = self.get_feed(url)
+    with self.assertNumQueries(1):
+      self.assertEqual(self.get_feed(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+    self.assertFalse(response.has_header("Last-Modified"))
+
+    # An older post leaving the feed window is noticed too, and no date can tell it
+    models.Post.objects.filter(slug="post1").update(is_live=False)
+    self.assertEqual(self.get_feed(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+    self.assertEqual(self.get_feed(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60)).status_code, 200)
+
+
+class AsyncViewTests(TransactionTestCase):
+  """
+    Async views tests.
+
+    ASGI requests are routed to async views, whose queries run in other
+    threads and connections, so this is a TransactionTestCase. They must
+    render the same pages as sync views.
+  """
+
+  def setUp(self):
+    # Query threads connections would outlive the test database
+    self.addCleanup(shutdown_query_executor)
+    cache.clear()
+    get_post_resolver().clear()
+    self.author = create_author()
+    category = models.Category.objects.create(name="category", slug="category")
+    for index in range(3):
+      create_post(self.author, f"post{index}", category=category, tags=["python"])
+
+  def async_get(self, url, **headers):
+    async def get():
+      return await self.async_client.get(url, **headers)
+    return async_to_sync(get)()
+
+  def test_feeds_match_sync_views(self):
+    urls = {
+      reverse("blog:home"): views.AsyncHomeView,
+      reverse("blog:author_filter", kwargs={"username": "writer"}): views.AsyncAuthorFilterView,
+      reverse("blog:category_filter", kwargs={"slug": "category"}): views.AsyncCategoryFilterView,
+      reverse("blog:tags_filter", kwargs={"tag": "python"}): views.AsyncTagsFilterView,
+    }
+    for url, view_class in urls.items():
+      response = self.async_get(url)
+      self.assertIsInstance(response.context["view"], view_class)
+      self.assertEqual(response.content, self.client.get(url).content)
+      self.assertContains(response, "<h4>post2</h4>")
+
+  def test_post_view(self):
+    url = reverse("blog:view_post", kwargs={"slug": "post1"})
+    response = self.async_get(url)
+    self.assertIsInstance(response.context["view"], views.AsyncPostView)
+    self.assertEqual(response.context["post"].slug, "post1")
+    self.assertEqual([tag.name for tag in response.context["post"].tags.all()], ["python"])
+
+    # Async client takes raw header names
+    self.assertEqual(self.async_get(url, **{"if-none-match": response["ETag"]}).status_code, 304)
+    self.assertEqual(self.async_get(reverse("blog:view_post", kwargs={"slug": "missing"})).status_code, 404)
+
+  @override_settings(BLOG_PAGE_CACHE={"ENABLED": True, "TIMEOUT": 300})
+  def test_page_cache(self):
+    url = reverse("blog:home")
+    response = self.async_get(url)
+    self.assertIn("feed", response["Surrogate-Key"])
+    # Cached pages are not rendered again
+    cached_response = self.async_get(url)
+    self.assertIsNone(cached_response.context)
+    self.assertEqual(cached_response.content, response.content)
+
+  @override_settings(BLOG_ASYNC_QUERY_THREADS=1)
+  def test_query_threads_keep_connections(self):
+    url = reverse("blog:view_post", kwargs={"slug": "post1"})
+    self.async_get(url)
+    opened = []
+    def count_connection(sender, connection, **kwargs):
+      opened.append(connection.alias)
+    connection_created.connect(count_connection)
+    self.addCleanup(connection_created.disconnect, count_connection)
+    for _ in range(3):
+      self.async_get(url)
+    self.assertEqual(opened, [])
+
+  def test_logged_in_user(self):
+    self.client.force_login(self.author)
+    self.async_client.cookies = self.client.cookies
+    response = self.async_get(reverse("blog:view_post", kwargs={"slug": "post1"}))
+    self.assertEqual(response.context["user"], self.author)
+    self.assertFalse(response.context["liked_post"])
+
+
+@override_settings(BLOG_DB_REPLICAS=["replica"])
+class ReplicaRoutingTests(TransactionTestCase):
+  """
+    Database replica routing tests.
+
+    A 'replica' alias is added for these tests, a second connection to the
+    test database, whose queries can be told apart. Both connections must
+    see committed rows, so this is a TransactionTestCase.
+  """
+
+  def setUp(self):
+    connections.databases["replica"] = dict(connections.databases["default"])
+    self.addCleanup(self.remove_replica)
+    cache.clear()
+    get_post_resolver().clear()
+    self.author = create_author()
+    self.post = create_post(self.author, tags=["python"])
+
+  def remove_replica(self):
+    connections["replica"].close()
+    del connections["replica"]
+    del connections.databases["replica"]
+
+  @override_settings(BLOG_DB_REPLICAS=["replica1", "replica2"])
+  def test_router(self):
+    router = PrimaryReplicaRouter()
+    self.assertIsNone(router.db_for_read(models.Post))
+    with replica_reads():
+      alias = router.db_for_read(models.Post)
+      self.assertIn(alias, ["replica1", "replica2"])
+      self.assertEqual(router.db_for_write(models.Post), "default")
+      # Reads keep the replica picked on entry
+      self.assertEqual({router.db_for_read(models.Category) for _ in range(10)}, {alias})
+      # Async views queries are routed the same in query threads
+      self.assertEqual(async_to_sync(run_query)(router.db_for_read, models.Post), alias)
+    self.assertIsNone(router.db_for_read(models.Post))
+    self.assertFalse(router.allow_migrate("replica1", "blog"))
+
+  def test_views_read_from_replicas(self):
+    post_table = connection.ops.quote_name(models.Post._meta.db_table)
+    urls = [
+      reverse("blog:home"),
+      reverse("blog:view_post", kwargs={"slug": "post"}),
+      reverse("blog:tags_filter", kwargs={"tag": "python"}),
+      reverse("blog:feed", kwargs={"feed_format": "rss"}),
+    ]
+    for url in urls:
+      with CaptureQueriesContext(connections["replica"]) as replica_queries, \
+          CaptureQueriesContext(connection) as primary_queries:
+        response = self.client.get(url)
+        content = b"".join(response) if response.streaming else response.content
+      self.assertIn(b"post", content)
+      self.assertTrue(any(post_table in query["sql"] for query in replica_queries), url)
+      self.assertFalse(any(post_table in query["sql"] for query in primary_queries), url)
+
+  def test_cached_data_is_read_from_primary(self):
+    category_table = connection.ops.quote_name(models.Category._meta.db_table)
+    with CaptureQueriesContext(connections["replica"]) as replica_queries, \
+        CaptureQueriesContext(connection) as primary_queries:
+      self.client.get(reverse("blog:home"))
+    self.assertFalse(any(category_table in query["sql"] for query in replica_queries))
+    self.assertTrue(any(category_table in query["sql"] for query in primary_queries))
+
+  @override_settings(BLOG_PAGE_CACHE={"ENABLED": True, "TIMEOUT": 60})
+  def test_purged_pages_are_not_stored_during_replica_lag(self):
+    url = reverse("blog:home")
+    self.client.get(url)
+    with self.assertNumQueries(0, using="replica"):
+      self.client.get(url)
+
+    pagecache.purge(pagecache.FEED_KEY)
+    for _ in range(2):
+      with CaptureQueriesContext(connections["replica"]) as replica_queries:
+        self.assertEqual(self.client.get(url).status_code, 200)
+      self.assertNotEqual(len(replica_queries), 0)
+
+    # Same as a purge BLOG_PRIMARY_STICKINESS seconds ago
+    with override_settings(BLOG_PRIMARY_STICKINESS=0):
+      pagecache.purge(pagecache.FEED_KEY)
+    self.client.get(url)
+    with self.assertNumQueries(0, using="replica"):
+      self.client.get(url)
+
+  def test_writers_stick_to_primary(self):
+    self.client.force_login(self.author)
+    with CaptureQueriesContext(connections["replica"]) as replica_queries:
+      response = self.client.post(reverse("blog:add_comment", kwargs={"slug": "post"}), {"content": "comment"})
+      self.assertIn(settings.BLOG_PRIMARY_STICKINESS_COOKIE, response.cookies)
+      response = self.client.post(reverse("blog:api_like_post", kwargs={"pk": self.post.pk}))
+      self.assertEqual(response.json()["like_count"], 1)
+      response = self.client.get(reverse("blog:view_post", kwargs={"slug": "post"}))
+    self.assertEqual(len(replica_queries), 0)
+    self.assertEqual(len(response.context["comments_page"].object_list), 1)
+
+    # Pin expires after BLOG_PRIMARY_STICKINESS seconds
+    request = RequestFactory().get("/")
+    request.COOKIES[settings.BLOG_PRIMARY_STICKINESS_COOKIE] = str(time.time() - 1)
+    self.assertFalse(is_pinned(request))
+
+
+class BootCommandsTests(TestCase):
+  """
+    Boot commands tests.
+
+    Container start runs migrate_if_needed and backfill_history, their
+    cost must not depend on already migrated schema or tracked objects.
+  """
+
+  def test_migrate_if_needed_skips_current_schema(self):
+    out = io.StringIO()
+    with CaptureQueriesContext(connection) as queries:
+      call_command("migrate_if_needed", stdout=out)
+    self.assertIn("No pending migrations", out.getvalue())
+    self.assertFalse(any(query["sql"].startswith(("CREATE", "ALTER")) for query in queries))
+
+  def test_backfill_history_only_missing_objects(self):
+    author = create_author()
+    tracked = models.Category.objects.create(name="tracked", slug="tracked")
+    models.Category.objects.bulk_create([
+      models.Category(name=f"bulk{index}", slug=f"bulk{index}") for index in range(3)
+    ])
+    post = create_post(author, status="draft")
+    post.history.all().delete()
+
+    out = io.StringIO()
+    call_command("backfill_history", "--model", "blog.Category", "--model", "blog.Post", "--batch-size", "2", stdout=out)
+    self.assertIn("blog.Category: 3 historical rows created", out.getvalue())
+    self.assertIn("blog.Post: 1 historical rows created", out.getvalue())
+    self.assertEqual(tracked.history.count(), 1)
+    self.assertEqual(post.history.get().history_change_reason, "Backfilled")
+
+    out = io.StringIO()
+    call_command("backfill_history", stdout=out)
+    self.assertNotIn(": 1", out.getvalue())
+    self.assertIn("blog.Category: 0 historical rows created", out.getvalue())
\ No newline at end of file
@@ -0,0 +1,290 @@
+import json
+import datetime
+from . import models
+from . import pagecache
+from .facets import invalidate_feed_facets
+from taggit.models import TaggedItem
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
+
+IMPORT_CHANGE_REASON = "Imported"
+
+
+class PostJSONEncoder(DjangoJSONEncoder):
+  """
+    JSON encoder keeping dates microseconds. DjangoJSONEncoder truncates
+    them to milliseconds, which could reorder posts of feeds sorted by date.
+  """
+
+  def default(self, o):
+    if isinstance(o, datetime.datetime):
+      return o.isoformat()
+    return super().default(o)
+
+
+def export_posts(stream, queryset=None, chunk_size=500):
+  """
+    Write posts as JSON lines to 'stream', one post per line with its
+    tags, likes and comments. Posts are read through a server-side cursor
+    and related rows with three queries per chunk, so memory only holds a
+    chunk. Returns the number of exported posts.
+  """
+  if queryset is None:
+    queryset = models.Post.objects.all()
+  posts = queryset.order_by("id").select_related("author", "category").defer("search_vector")
+
+  exported = 0
+  chunk = []
+  for post in posts.iterator(chunk_size=chunk_size):
+    chunk.append(post)
+    if len(chunk) == chunk_size:
+      exported += _export_chunk(stream, chunk)
+      chunk = []
+  if chunk:
+    exported += _export_chunk(stream, chunk)
+  return exported
+
+
+def _export_chunk(stream, posts):
+  post_ids = [post.id for post in posts]
+  tags, likes, comments = {}, {}, {}
+
+  content_type = ContentType.objects.get_for_model(models.Post)
+  for post_id, name in (
+    TaggedItem.objects.filter(content_type=content_type, object_id__in=post_ids)
+    .order_by("id").values_list("object_id", "tag__name")
+  ):
+    tags.setdefault(post_id, []).append(name)
+  for post_id, username in (
+    models.Post.likes.through.objects.filter(post_id__in=post_ids)
+    .order_by("id").values_list("post_id", "user__username")
+  ):
+    likes.setdefault(post_id, []).append(username)
+  for comment in (
+    models.PostComment.objects.filter(post_id__in=post_ids)
+    .order_by("posted_at", "id").values("post_id", "author__username", "content", "posted_at")
+  ):
+    comments.setdefault(comment["post_id"], []).append({
+      "author": comment["author__username"], "content": comment["content"], "posted_at": comment["posted_at"]
+    })
+
+  for post in posts:
+    record = {
+      "title": post.title,
+      "slug": post.slug,
+      "author": post.author.username,
+      "category": post.category and {"name": post.category.name, "slug": post.category.slug},
+      "content": post.content,
+      "status": post.status,
+      "publish_date": post.publish_date,
+      "deactivate_date": post.deactivate_date,
+      "created_at": post.created_at,
+      "updated_at": post.updated_at,
+      "tags": tags.get(post.id, []),
+      "likes": likes.get(post.id, []),
+      "comments": comments.get(post.id, []),
+    }
+    stream.write(json.dumps(record, cls=PostJSONEncoder) + "\n")
+  return len(posts)
+
+
+def _parse_date(value):
+  if value is None:
+    return None
+  date = parse_datetime(value)
+  if date is None:
+    raise ValueError(f"Invalid date: {value}")
+  return date
+
+
+class PostImporter:
+  """
+    Post importer.
+
+    Import posts written by 'export_posts', in batches of 'batch_size'
+    posts. Every batch is a transaction of bulk inserts: posts, tagged
+    items, likes, comments and their history rows. Authors, categories
+    and tags are resolved through in-memory maps shared by every batch,
+    missing ones are bulk created. Posts whose slug or title already
+    exists are skipped, so an interrupted import can be run again.
+  """
+
+  def __init__(self, batch_size=500):
+    self.batch_size = batch_size
+    self.users = {}
+    self.categories = {}
+    self.tags = {}
+
+  def import_lines(self, lines):
+    """
+      Import JSON lines from 'lines' iterable. Returns (imported, skipped)
+      posts counts.
+    """
+    imported = skipped = 0
+    batch = []
+    for line in lines:
+      line = line.strip()
+      if not line:
+        continue
+      batch.append(json.loads(line))
+      if len(batch) == self.batch_size:
+        created = self.import_batch(batch)
+        imported, skipped = imported + created, skipped + len(batch) - created
+        batch = []
+    if batch:
+      created = self.import_batch(batch)
+      imported, skipped = imported + created, skipped + len(batch) - created
+    return imported, skipped
+
+  def import_batch(self, records):
+    """
+      Import a batch of post records in a single transaction. Returns the
+      number of created posts.
+    """
+    with transaction.atomic():
+      records = self._new_records(records)
+      if not records:
+        return 0
+
+      self._resolve_users(
+        {record["author"] for record in records} |
+        {username for record in records for username in record.get("likes", [])} |
+        {comment["author"] for record in records for comment in record.get("comments", [])}
+      )
+      self._resolve_categories([record["category"] for record in records if record.get("category")])
+      self._resolve_tags({name for record in records for name in record.get("tags", [])})
+
+      now = timezone.now()
+      posts = [self._build_post(record, now) for record in records]
+      models.Post.objects.bulk_create(posts)
+      self._restore_dates(models.Post, posts, ["created_at", "updated_at"])
+      models.Post.history.bulk_history_create(posts, default_change_reason=IMPORT_CHANGE_REASON)
+
+      content_type = ContentType.objects.get_for_model(models.Post)
+      TaggedItem.objects.bulk_create([
+        TaggedItem(content_type=content_type, object_id=post.id, tag_id=self.tags[name])
+        for post, record in zip(posts, records) for name in dict.fromkeys(record.get("tags", []))
+      ])
+      models.Post.likes.through.objects.bulk_create([
+        models.Post.likes.through(post_id=post.id, user_id=self.users[username])
+        for post, record in zip(posts, records) for username in dict.fromkeys(record.get("likes", []))
+      ])
+
+      comments = [
+        self._build_comment(post, comment)
+        for post, record in zip(posts, records) for comment in record.get("comments", [])
+      ]
+      models.PostComment.objects.bulk_create(comments)
+      self._restore_dates(models.PostComment, comments, ["posted_at"])
+      models.PostComment.history.bulk_history_create(comments, default_change_reason=IMPORT_CHANGE_REASON)
+
+      # Bulk inserts send no post_save, caches are invalidated here
+      transaction.on_commit(invalidate_feed_facets)
+      if pagecache.is_enabled():
+        pagecache.purge_on_commit(pagecache.FACETS_KEY, *pagecache.post_listing_keys(post.id for post in posts))
+
+    return len(posts)
+
+  def _new_records(self, records):
+    """
+      Drop records whose post already exists, or repeated in the batch.
+    """
+    slugs = [record["slug"] for record in records]
+    titles = [record["title"] for record in records]
+    existing = set()
+    for slug, title in models.Post.objects.filter(Q(slug__in=slugs) | Q(title__in=titles)).values_list("slug", "title"):
+      existing.update((("slug", slug), ("title", title)))
+
+    new_records = []
+    for record in records:
+      keys = (("slug", record["slug"]), ("title", record["title"]))
+      if not existing.intersection(keys):
+        existing.update(keys)
+        new_records.append(record)
+    return new_records
+
+  def _resolve_users(self, usernames):
+    missing = [username for username in usernames if username not in self.users]
+    if not missing:
+      return
+
+    self.users.update(models.User.objects.filter(username__in=missing).values_list("username", "id"))
+    created = models.User.objects.bulk_create([
+      models.User(username=username, password=make_password(None))
+      for username in missing if username not in self.users
+    ])
+    self.users.update((user.username, user.id) for user in created)
+
+  def _resolve_categories(self, categories):
+    missing = {category["slug"]: category for category in categories if category["slug"] not in self.categories}
+    if not missing:
+      return
+
+    # A category with the same name and another slug is reused
+    for category_id, name, slug in models.Category.objects.filter(
+      Q(slug__in=missing) | Q(name__in=[category["name"] for category in missing.values()])
+    ).values_list("id", "name", "slug"):
+      for category in missing.values():
+        if slug == category["slug"] or name == category["name"]:
+          self.categories[category["slug"]] = category_id
+
+    created = models.Category.objects.bulk_create([
+      models.Category(name=category["name"], slug=slug)
+      for slug, category in missing.items() if slug not in self.categories
+    ])
+    models.Category.history.bulk_history_create(created, default_change_reason=IMPORT_CHANGE_REASON)
+    self.categories.update((category.slug, category.id) for category in created)
+
+  def _resolve_tags(self, names):
+    missing = [name for name in names if name not in self.tags]
+    if missing:
+      self.tags.update(models.Post.objects.get_or_create_tags(missing))
+
+  def _build_post(self, record, now):
+    category = record.get("category")
+    post = models.Post(
+      title=record["title"],
+      slug=record["slug"],
+      author_id=self.users[record["author"]],
+      category_id=category and self.categories[category["slug"]],
+      content=record["content"],
+      status=record.get("status", "draft"),
+      publish_date=_parse_date(record["publish_date"]),
+      deactivate_date=_parse_date(record.get("deactivate_date")),
+      like_count=len(set(record.get("likes", []))),
+      comment_count=len(record.get("comments", [])),
+    )
+    # bulk_create skips Post.save, 'is_live' flag is computed here
+    post.is_live = post.compute_is_live(now)
+    post._imported_dates = {
+      "created_at": _parse_date(record.get("created_at")),
+      "updated_at": _parse_date(record.get("updated_at")),
+    }
+    return post
+
+  def _build_comment(self, post, record):
+    comment = models.PostComment(post_id=post.id, author_id=self.users[record["author"]], content=record["content"])
+    comment._imported_dates = {"posted_at": _parse_date(record.get("posted_at"))}
+    return comment
+
+  def _restore_dates(self, model, objs, fields):
+    """
+      Auto dates are set to now by bulk_create, exported ones are written
+      back in a single update. History rows are dated like them.
+    """
+    restored = []
+    for obj in objs:
+      dates = {field: date for field, date in obj._imported_dates.items() if date is not None}
+      for field, date in dates.items():
+        setattr(obj, field, date)
+      if dates:
+        restored.append(obj)
+      obj._history_date = getattr(obj, fields[0])
+
+    if restored:
+      model.objects.bulk_update(restored, fields, batch_size=self.batch_size)
@@ -17,11 +17,19 @@ urlpatterns = [
     path("create_category/", views.CreateCategoryView.as_view(), name="create_category"),
     path("post/<slug:slug>/", views.PostView.as_view(), name="view_post"),
     path("post/<slug:slug>/add_comment/", views.CreateCommentView.as_view(), name="add_comment"),
+    path("post/<slug:slug>/comments/", views.PostCommentsView.as_view(), name="post_comments"),
     path("post/<slug:slug>/like/", views.LikePostView, name="like_post"),
     path("post/<slug:slug>/unlike/", views.UnlikePostView, name="unlike_post"),
+    path("api/posts/<int:pk>/like/", views.PostLikeApiView.as_view(), name="api_like_post"),
     path("post/<slug:slug>/edit/", views.EditPostView.as_view(), name="edit_post"),
     path("post/<slug:slug>/delete/", views.DeletePostView.as_view(), name="delete_post"),
     path("filter/author/<str:username>/", views.AuthorFilterView.as_view(), name="author_filter"),
     path("filter/category/<slug:slug>/", views.CategoryFilterView.as_view(), name="category_filter"),
-    path("filter/tags/<str:tag>/", views.TagsFilterView.as_view(), name="tags_filter")
+    path("filter/tags/", views.TagsFilterView.as_view(), name="multi_tags_filter"),
+    path("filter/tags/<str:tag>/", views.TagsFilterView.as_view(), name="tags_filter"),
+    path("search/", views.SearchView.as_view(), name="search"),
+    path("feeds/<str:feed_format>/", views.PostFeedView.as_view(), name="feed"),
+    path("feeds/author/<str:username>/<str:feed_format>/", views.AuthorFeedView.as_view(), name="author_feed"),
+    path("feeds/category/<slug:slug>/<str:feed_format>/", views.CategoryFeedView.as_view(), name="category_feed"),
+    path("feeds/tag/<str:tag>/<str:feed_format>/", views.TagFeedView.as_view(), name="tag_feed"),
 ]
\ No newline at end of file
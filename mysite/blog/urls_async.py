@@ -0,0 +1,19 @@
+from . import views
+from .urls import urlpatterns as sync_urlpatterns
+from django.urls import path
+
+# Same routes as blog/urls.py, read only views are async
+ASYNC_VIEWS = {
+    "home": views.AsyncHomeView,
+    "view_post": views.AsyncPostView,
+    "author_filter": views.AsyncAuthorFilterView,
+    "category_filter": views.AsyncCategoryFilterView,
+    "multi_tags_filter": views.AsyncTagsFilterView,
+    "tags_filter": views.AsyncTagsFilterView,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name].as_view(), name=pattern.name)
+    if pattern.name in ASYNC_VIEWS else pattern
+    for pattern in sync_urlpatterns
+]
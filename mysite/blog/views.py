@@ -1,16 +1,29 @@
 from . import forms
 from . import models
+from .likebuffer import get_like_buffer, write_like
+from . import pagecache
+from . import syndication
+from .resolver import get_post_resolver, resolve_post_or_404
+from .concurrency import run_query
+from .mixins import (
+  AsyncConditionalGetMixin, AsyncFeedMixin, AsyncPageCacheMixin, AsyncViewMixin, ConditionalGetMixin,
+  FeedFacetsMixin, KeysetPaginationMixin, OwnerRequiredMixin, PageCacheMixin, PostSlugMixin, ReplicaReadsMixin
+)
+from .pagination import KeysetPaginator
+import asyncio
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, FloatField, Max, OuterRef, Subquery, Sum, Value
 from django.template import loader
 from django.urls import reverse_lazy, reverse
 from django.contrib.auth import login, logout
 from django.shortcuts import get_object_or_404
 from django.views.generic.base import TemplateView
-from django.core.exceptions import PermissionDenied
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponse, HttpResponseRedirect
-from django.views.generic import CreateView, ListView, DetailView, UpdateView, DeleteView
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.views.generic import View, CreateView, ListView, DetailView, UpdateView, DeleteView
 
 
 # Create your views here.
@@ -32,7 +45,9 @@ class SignupView(CreateView):
   success_url = reverse_lazy("blog:sign_in")
 
 
-class HomeView(ListView):
+class HomeView(
+  ReplicaReadsMixin, PageCacheMixin, ConditionalGetMixin, FeedFacetsMixin, KeysetPaginationMixin, ListView
+):
   """
     Home view.
 
@@ -41,26 +56,19 @@ class HomeView(ListView):
   """
   model = models.Post
   template_name = "blog/home.html"
+  surrogate_keys = (pagecache.FEED_KEY, pagecache.FACETS_KEY)
 
-  def get_context_data(self, **kwargs):
+  def get_queryset(self):
     """
-      Override context_data function for custom requirements.
-      New context variables created:
-        - object_list: Save published posts from every registered users.
-        - categories: Save created categories for filter component
-        - authors: Save users who have published posts for filter component
-        - tags: Save created tags
+      Override get_queryset function for returning published posts from
+      every registered users. They are paginated by KeysetPaginationMixin.
     """
-    context = super().get_context_data(**kwargs)
-    context["object_list"] = models.Post.objects.get_published_posts()
-    context["categories"] = models.Category.objects.all()
-    context["authors"] = models.User.objects.filter(blog_posts__isnull=False).distinct("username")
-    context["tags"] = models.Tag.objects.all()
-    
-    return context
+    return models.Post.objects.get_published_posts().for_feed()
 
 
-class AuthorPostsView(ListView):
+class AuthorPostsView(
+  ReplicaReadsMixin, OwnerRequiredMixin, FeedFacetsMixin, KeysetPaginationMixin, ListView
+):
   """
     Author post view.
 
@@ -69,35 +77,30 @@ class AuthorPostsView(ListView):
   model = models.Post
   template_name = "blog/author_posts.html"
 
-  def dispatch(self, request, *args, **kwargs):
+  def is_owner(self, user):
     """
-      Override dispatch function for security reason.
-      Check if current user is accessing to their own author post view.
+      Override is_owner function for security reason.
+      Check if current user is accessing to their own author post view,
+      usernames are compared so no query is needed.
       A superuser can enter to every user posts.
     """
-    handler = super().dispatch(request, *args, **kwargs)
-    
-    if not (self.request.user.username == self.kwargs["username"] or self.request.user.is_superuser):
-      raise PermissionDenied
-    return handler
+    return user.is_authenticated and user.username == self.kwargs["username"]
+
+  def get_queryset(self):
+    """
+      Override get_queryset function for returning every post the selected
+      user created. They are paginated by KeysetPaginationMixin.
+    """
+    self.selected_author = get_object_or_404(models.User, username=self.kwargs["username"])
+    return models.Post.objects.get_posts_by_author(self.selected_author).for_feed()
 
   def get_context_data(self, **kwargs):
     """
-      Override context_data function for custom requirements.
-      New context variables created:
-        - object_list: Save every post the current user created.
-        - categories: Save created categories for filter component
-        - authors: Save users who have published posts for filter component
-        - tags: Save created tags
+      Override context_data function for adding author totals to the
+      header, read from their AuthorStats row.
     """
     context = super().get_context_data(**kwargs)
-    selected_author = get_object_or_404(models.User, username=self.kwargs["username"])
-
-    context["object_list"] = models.Post.objects.get_posts_by_author(selected_author)
-    context["categories"] = models.Category.objects.all()
-    context["authors"] = models.User.objects.filter(blog_posts__isnull=False).distinct("username")
-    context["tags"] = models.Tag.objects.all()
-    
+    context["author_stats"] = models.AuthorStats.objects.filter(pk=self.selected_author.pk).first()
     return context
 
 
@@ -114,19 +117,17 @@ class CreatePostView(LoginRequiredMixin, CreateView):
   def form_valid(self, form):
     """
       Override form_valid function for save every tag typed by user.
-      Tags is manager by Django-taggit package.
+      Tags is manager by Django-taggit package, they are synchronized
+      with PostManager.save_with_tags.
     """
-    tags = form.cleaned_data["tag"]
     self.object = form.save(commit=False)
     self.object.author = self.request.user
-    self.object.save()
-    
-    if tags:
-      self.object.tags.add(*tags)
+    models.Post.objects.save_with_tags(self.object, form.cleaned_data["tag"])
+
     return HttpResponseRedirect(self.get_success_url())
 
 
-class EditPostView(LoginRequiredMixin, UpdateView):
+class EditPostView(LoginRequiredMixin, OwnerRequiredMixin, PostSlugMixin, UpdateView):
   """
     Edit post view.
 
@@ -136,17 +137,22 @@ class EditPostView(LoginRequiredMixin, UpdateView):
   form_class = forms.PostForm
   template_name = "blog/edit_post.html"
 
-  def dispatch(self, request, *args, **kwargs):
+  def get_owner_id(self):
     """
-      Override dispatch function for security reason.
-      Check if current user is accessing to their own post.
-      A superuser can edit every user posts.
+      Override get_owner_id function for security reason.
+      Post owner comes from the slug resolver, before the post is loaded
+      or saved. A superuser can edit every user posts.
     """
-    handler = super().dispatch(request, *args, **kwargs)
-    
-    if not (self.request.user == self.object.author or self.request.user.is_superuser):
-      raise PermissionDenied
-    return handler
+    return self.post_ref.author_id
+
+  def get_initial(self):
+    """
+      Override get_initial function for showing current post tags, tags
+      missing from submitted form are removed from the post.
+    """
+    initial = super().get_initial()
+    initial["tag"] = self.object.tags.all()
+    return initial
 
   def get_success_url(self):
     """
@@ -157,19 +163,17 @@ class EditPostView(LoginRequiredMixin, UpdateView):
   def form_valid(self, form):
     """
       Override form_valid function for save every tag typed by user.
-      Tags is manager by Django-taggit package.
+      Tags is manager by Django-taggit package, they are synchronized
+      with PostManager.save_with_tags.
     """
-    tags = form.cleaned_data["tag"]
     self.object = form.save(commit=False)
     self.object.author = self.request.user
-    self.object.save()
-    
-    if tags:
-      self.object.tags.add(*tags)
+    models.Post.objects.save_with_tags(self.object, form.cleaned_data["tag"])
+
     return HttpResponseRedirect(self.get_success_url())
 
 
-class PostView(DetailView):
+class PostView(ReplicaReadsMixin, PageCacheMixin, ConditionalGetMixin, PostSlugMixin, DetailView):
   """
     Post view.
 
@@ -178,26 +182,110 @@ class PostView(DetailView):
   model = models.Post
   template_name = "blog/view_post.html"
 
-  def get_context_data(self, **kwargs):
+  def get_queryset(self):
+    """
+      Override get_queryset function for fetching post author, category and
+      current user like state in a single query. Tags are prefetched.
+    """
+    return (
+      models.Post.objects.select_related("author", "category")
+      .prefetch_related("tags")
+      .with_liked_by(self.request.user)
+    )
+
+  def get_comments_page(self, post_id):
+    """
+      Return the first page of post comments, newest first.
+    """
+    paginator = KeysetPaginator(
+      models.PostComment.objects.filter(post_id=post_id).select_related("author"),
+      settings.BLOG_COMMENTS_PAGE_SIZE,
+      ordering=PostCommentsView.page_ordering
+    )
+    return paginator.page()
+
+  def get_context_data(self, comments_page=None, **kwargs):
     """
       Override context_data function for create a few context variables
       for comment section and like/unlike post component.
       New context variables created:
         - comment_form: Contains comment form to attach it in post view template.
         - liked_post: Boolean variable that means if current user like current post.
+        - comments_page: First page of comments, older ones are loaded from
+          PostCommentsView. It may be given when it was fetched beforehand.
     """
     context = super().get_context_data(**kwargs)
     context["comment_form"] = forms.CommentForm
-    liked_post = False
+    context["liked_post"] = self.object.liked_post
 
-    if self.request.user.is_authenticated:
-      liked_post = self.request.user.likes.filter(slug=self.kwargs["slug"]).exists()
-    
-    context["liked_post"] = liked_post
+    like_buffer = get_like_buffer()
+    if like_buffer is not None and self.request.user.is_authenticated:
+      self.object.like_count, context["liked_post"] = like_buffer.merge(
+        self.request.user.id, self.object.id, self.object.like_count, self.object.liked_post
+      )
+
+    if comments_page is None:
+      comments_page = self.get_comments_page(self.object.id)
+    context["comments_page"] = comments_page
     return context
 
+  def get_validator(self):
+    """
+      Post page changes when the post is edited, commented or liked. They
+      are read in a single query, latest comment comes from comments index.
+    """
+    last_comment = models.PostComment.objects.filter(post=OuterRef("pk")).order_by("-posted_at", "-id")
+    post = (
+      models.Post.objects.filter(pk=self.post_ref.id)
+      .with_liked_by(self.request.user)
+      .annotate(last_comment=Subquery(last_comment.values("posted_at")[:1]))
+      .values("id", "updated_at", "like_count", "comment_count", "liked_post", "last_comment")
+      .first()
+    )
+    if post is None:
+      return None
+
+    like_buffer = get_like_buffer()
+    if like_buffer is not None and self.request.user.is_authenticated:
+      post["like_count"], post["liked_post"] = like_buffer.merge(
+        self.request.user.id, post["id"], post["like_count"], post["liked_post"]
+      )
+    return post, max(filter(None, (post["updated_at"], post["last_comment"])))
+
+  def get_surrogate_keys(self, context):
+    """
+      Post page shows the post, its comments, likes, category and tags.
+    """
+    keys = [pagecache.post_key(self.object.pk)]
+    if self.object.category_id is not None:
+      keys.append(pagecache.category_key(self.object.category_id))
+    keys += [pagecache.tag_key(tag.pk) for tag in self.object.tags.all()]
+    return keys
+
+
+class PostCommentsView(ReplicaReadsMixin, PostSlugMixin, KeysetPaginationMixin, ListView):
+  """
+    Post comments view.
+
+    This List view returns a page of post comments as an HTML fragment.
+    It is used by "Load more" button of post view comments section.
+  """
+  template_name = "blog/comments_list.html"
+  context_object_name = "comments"
+  page_ordering = ("-posted_at", "-id")
+
+  def get_page_size(self):
+    return settings.BLOG_COMMENTS_PAGE_SIZE
+
+  def get_queryset(self):
+    """
+      Override get_queryset function for returning post comments. Post id
+      comes from the slug resolver, an unknown slug is a 404.
+    """
+    return models.PostComment.objects.filter(post_id=self.post_ref.id).select_related("author")
 
-class CreateCommentView(LoginRequiredMixin, CreateView):
+
+class CreateCommentView(LoginRequiredMixin, PostSlugMixin, CreateView):
   """
     Create comment view.
 
@@ -209,18 +297,25 @@ class CreateCommentView(LoginRequiredMixin, CreateView):
     """
       Override get_success_url to redicted user when their commented current post.
     """
-    return reverse("blog:view_post", kwargs={"slug": self.object.post.slug})
+    return reverse("blog:view_post", kwargs={"slug": self.kwargs["slug"]})
 
   def form_valid(self, form):
     """
       Override form_valid function for checking if current post exists and save
-      user comment.
+      user comment. Post id comes from the slug resolver, if the post was
+      deleted meanwhile the comment foreign key is rejected.
     """
-    post = get_object_or_404(models.Post, slug=self.kwargs["slug"])
     self.object = form.save(commit=False)
-    self.object.post = post
+    self.object.post_id = self.post_ref.id
     self.object.author = self.request.user
-    self.object.save()
+
+    try:
+      with transaction.atomic():
+        self.object.save()
+        models.Post.objects.update_comment_count(self.post_ref.id, 1)
+    except IntegrityError:
+      get_post_resolver().invalidate(self.post_ref.id)
+      raise Http404("No post found matching the query")
     
     return HttpResponseRedirect(self.get_success_url())
 
@@ -232,8 +327,8 @@ def LikePostView(request, slug):
 
     This view check if current post to like exists and allows users to like it.
   """
-  post = get_object_or_404(models.Post, slug=slug)
-  post.likes.add(request.user)
+  post_ref = resolve_post_or_404(slug)
+  write_like(post_ref.id, request.user, True)
   
   return HttpResponseRedirect(
     reverse("blog:view_post", kwargs={"slug": slug})
@@ -247,15 +342,40 @@ def UnlikePostView(request, slug):
 
     This view check if current post to like exists and allows users to unlike it.
   """
-  post = get_object_or_404(models.Post, slug=slug)
-  post.likes.remove(request.user)
+  post_ref = resolve_post_or_404(slug)
+  write_like(post_ref.id, request.user, False)
   
   return HttpResponseRedirect(
     reverse("blog:view_post", kwargs={"slug": slug})
   )
 
 
-class DeletePostView(LoginRequiredMixin, DeleteView):
+class PostLikeApiView(LoginRequiredMixin, View):
+  """
+    Post like API view.
+
+    JSON endpoint for like (POST) and unlike (DELETE) a post by its id.
+    Both methods are idempotent, every request is a single database write
+    statement (or a buffered toggle, see LikeBuffer) and the response
+    contains the new likes count.
+  """
+
+  def handle_no_permission(self):
+    return JsonResponse({"error": "Authentication required"}, status=401)
+
+  def post(self, request, pk):
+    return self.like_response(pk, write_like(pk, request.user, True), True)
+
+  def delete(self, request, pk):
+    return self.like_response(pk, write_like(pk, request.user, False), False)
+
+  def like_response(self, pk, like_count, liked):
+    if like_count is None:
+      return JsonResponse({"error": "Post not found"}, status=404)
+    return JsonResponse({"post": pk, "liked": liked, "like_count": like_count})
+
+
+class DeletePostView(LoginRequiredMixin, OwnerRequiredMixin, PostSlugMixin, DeleteView):
   """
     Delete post view.
 
@@ -264,17 +384,13 @@ class DeletePostView(LoginRequiredMixin, DeleteView):
   model = models.Post
   success_url = reverse_lazy("blog:home")
 
-  def dispatch(self, request, *args, **kwargs):
+  def get_owner_id(self):
     """
-      Override dispatch function for security reason.
-      Check if current user is accessing to their own post.
-      A superuser can delete every user posts.
+      Override get_owner_id function for security reason.
+      Post owner comes from the slug resolver, before the post is loaded
+      or deleted. A superuser can delete every user posts.
     """
-    handler = super().dispatch(request, *args, **kwargs)
-    
-    if not (self.request.user == self.object.author or self.request.user.is_superuser):
-      raise PermissionDenied
-    return handler
+    return self.post_ref.author_id
 
 
 class CreateCategoryView(LoginRequiredMixin, CreateView):
@@ -288,7 +404,9 @@ class CreateCategoryView(LoginRequiredMixin, CreateView):
   success_url = reverse_lazy("blog:home")
 
 
-class AuthorFilterView(ListView):
+class AuthorFilterView(
+  ReplicaReadsMixin, PageCacheMixin, ConditionalGetMixin, FeedFacetsMixin, KeysetPaginationMixin, ListView
+):
   """
     Author filter view.
 
@@ -296,26 +414,24 @@ class AuthorFilterView(ListView):
   """
   model = models.Post
   template_name = "blog/author_filter.html"
+  context_object_name = "filtered_posts"
+  surrogate_keys = (pagecache.FACETS_KEY,)
 
-  def get_context_data(self, **kwargs):
+  def get_queryset(self):
     """
-      Override context_data function for create a few context variables
-      for posts filtering.
-      New context variables created:
-        - filtered_posts: Contains posts filtered by certain author.
+      Override get_queryset function for returning published posts filtered
+      by certain author. They are paginated by KeysetPaginationMixin.
     """
-    context = super().get_context_data(**kwargs)
-    selected_author = get_object_or_404(models.User, username=self.kwargs["username"])
+    self.selected_author = get_object_or_404(models.User, username=self.kwargs["username"])
+    return models.Post.objects.get_published_posts().get_posts_by_author(self.selected_author).for_feed()
 
-    context["filtered_posts"] = models.Post.objects.get_published_posts().get_posts_by_author(selected_author)
-    context["categories"] = models.Category.objects.all()
-    context["authors"] = models.User.objects.filter(blog_posts__isnull=False).distinct("username")
-    context["tags"] = models.Tag.objects.all()
-    
-    return context
+  def get_surrogate_keys(self, context):
+    return super().get_surrogate_keys(context) + [pagecache.author_feed_key(self.selected_author.pk)]
 
 
-class CategoryFilterView(ListView):
+class CategoryFilterView(
+  ReplicaReadsMixin, PageCacheMixin, ConditionalGetMixin, FeedFacetsMixin, KeysetPaginationMixin, ListView
+):
   """
     Category filter view.
 
@@ -323,46 +439,266 @@ class CategoryFilterView(ListView):
   """
   model = models.Post
   template_name = "blog/category_filter.html"
+  context_object_name = "filtered_posts"
+  surrogate_keys = (pagecache.FACETS_KEY,)
 
-  def get_context_data(self, **kwargs):
+  def get_queryset(self):
     """
-      Override context_data function for create a few context variables
-      for posts filtering.
-      New context variables created:
-        - filtered_posts: Contains posts filtered by certain category.
+      Override get_queryset function for returning published posts filtered
+      by certain category. They are paginated by KeysetPaginationMixin.
     """
-    context = super().get_context_data(**kwargs)
-    selected_category = get_object_or_404(models.Category, slug=self.kwargs["slug"])
+    self.selected_category = get_object_or_404(models.Category, slug=self.kwargs["slug"])
+    return models.Post.objects.get_published_posts().get_posts_by_category(self.selected_category).for_feed()
 
-    context["filtered_posts"] = models.Post.objects.get_published_posts().get_posts_by_category(selected_category)
-    context["categories"] = models.Category.objects.all()
-    context["authors"] = models.User.objects.filter(blog_posts__isnull=False).distinct("username")
-    context["tags"] = models.Tag.objects.all()
-    
-    return context
+  def get_surrogate_keys(self, context):
+    return super().get_surrogate_keys(context) + [pagecache.category_feed_key(self.selected_category.pk)]
 
 
-class TagsFilterView(ListView):
+class TagsFilterView(
+  ReplicaReadsMixin, PageCacheMixin, ConditionalGetMixin, FeedFacetsMixin, KeysetPaginationMixin, ListView
+):
   """
     Tags filter view.
 
-    This list view shows every post filtered by certain tag.
+    This list view shows every post filtered by tags. Posts having all tags
+    in 'all' GET parameter and any tag in 'any' GET parameter (comma
+    separated) are shown, they can be narrowed with 'category' slug and
+    'author' username GET parameters. A single tag can be given in URL.
   """
   model = models.Post
   template_name = "blog/tags_filter.html"
+  context_object_name = "filtered_posts"
+  surrogate_keys = (pagecache.FACETS_KEY,)
 
-  def get_context_data(self, **kwargs):
+  def get_tags(self, param):
     """
-      Override context_data function for create a few context variables
-      for posts filtering.
-      New context variables created:
-        - filtered_posts: Contains posts filtered by certain tag.
+      Return the distinct tags names of a comma separated GET parameter.
     """
+    tags = (tag.strip() for tag in self.request.GET.get(param, "").split(","))
+    return list(dict.fromkeys(tag for tag in tags if tag))
+
+  def get_queryset(self):
+    """
+      Override get_queryset function for returning published posts filtered
+      by tags, category and author in a single query. They are paginated
+      by KeysetPaginationMixin.
+    """
+    self.all_tags = self.get_tags("all")
+    self.any_tags = self.get_tags("any")
+    if "tag" in self.kwargs:
+      self.all_tags.insert(0, self.kwargs["tag"])
+
+    queryset = models.Post.objects.get_published_posts()
+    if self.all_tags:
+      queryset = queryset.get_posts_by_all_tags(self.all_tags)
+    if self.any_tags:
+      queryset = queryset.get_posts_by_tags(self.any_tags)
+    if self.request.GET.get("category"):
+      queryset = queryset.filter(category__slug=self.request.GET["category"])
+    if self.request.GET.get("author"):
+      queryset = queryset.filter(author__username=self.request.GET["author"])
+    return queryset.for_feed()
+
+  def get_context_data(self, **kwargs):
     context = super().get_context_data(**kwargs)
+    context["all_tags"] = self.all_tags
+    context["any_tags"] = self.any_tags
+    return context
 
-    context["filtered_posts"] = models.Post.objects.get_published_posts().get_posts_by_tags([self.kwargs["tag"]])
-    context["categories"] = models.Category.objects.all()
-    context["authors"] = models.User.objects.filter(blog_posts__isnull=False).distinct("username")
-    context["tags"] = models.Tag.objects.all()
-    
-    return context
\ No newline at end of file
+  def get_surrogate_keys(self, context):
+    """
+      Posts joining the page are tagged, so tags keys are enough. Feed key
+      is used when there is no tag filter or a tag does not exist yet.
+    """
+    keys = super().get_surrogate_keys(context)
+    names = set(self.all_tags + self.any_tags)
+    tags = list(models.Tag.objects.filter(name__in=names).values_list("id", flat=True))
+    keys += [pagecache.tag_feed_key(tag_id) for tag_id in tags]
+    if len(tags) < len(names) or not names:
+      keys.append(pagecache.FEED_KEY)
+    return keys
+
+
+class SearchView(ReplicaReadsMixin, FeedFacetsMixin, KeysetPaginationMixin, ListView):
+  """
+    Search view.
+
+    This list view shows published posts matching 'q' GET parameter,
+    ranked by relevance.
+  """
+  model = models.Post
+  template_name = "blog/search.html"
+  page_ordering = ("-rank", "-id")
+
+  def get_queryset(self):
+    """
+      Override get_queryset function for returning published posts matching
+      the searched text. They are paginated by KeysetPaginationMixin.
+    """
+    text = self.request.GET.get("q", "").strip()
+    if not text:
+      return models.Post.objects.none().annotate(rank=Value(0.0, output_field=FloatField()))
+    return models.Post.objects.get_published_posts().search(text).for_feed()
+
+
+class PostFeedView(ReplicaReadsMixin, ConditionalGetMixin, View):
+  """
+    Post feed view.
+
+    Syndication feed of latest published posts, as RSS, Atom or JSON Feed
+    ('feed_format' URL kwarg). Only the newest BLOG_SYNDICATION_ENTRIES
+    posts are listed and the document is streamed while posts are read.
+    A poll of an unchanged feed is answered with a 304 after a single
+    aggregate query over those posts, and the lookup of the feed author,
+    category or tag.
+  """
+  feed_title = "Latest posts"
+
+  def get_feed_class(self):
+    try:
+      return syndication.FEED_CLASSES[self.kwargs["feed_format"]]
+    except KeyError:
+      raise Http404("Unknown feed format")
+
+  def get_queryset(self):
+    return models.Post.objects.get_published_posts()
+
+  def get_entries(self):
+    return self.get_queryset().order_by("-publish_date", "-id")[:settings.BLOG_SYNDICATION_ENTRIES]
+
+  def get_feed_title(self):
+    """
+      Return feed title, a missing author, category or tag raises a 404.
+      It is called by the validator, so a conditional request for a
+      missing feed is a 404 too, not a 304.
+    """
+    return self.feed_title
+
+  def get_validator(self):
+    """
+      Feed changes when one of its posts is edited, or a post joins or
+      leaves it. Edits move newest 'updated_at', scheduled posts going live
+      move newest 'publish_date', and count and ids sum notice the rest.
+      A post deleted or unpublished moves no date, so feeds are only
+      validated by their ETag. Newest date is kept for the feed document.
+    """
+    self.get_feed_class()
+    self.title = self.get_feed_title()
+    state = models.Post.objects.filter(pk__in=self.get_entries().values("pk")).aggregate(
+      updated_at=Max("updated_at"), publish_date=Max("publish_date"), count=Count("id"), ids=Sum("id")
+    )
+    dates = [date for date in (state["updated_at"], state["publish_date"]) if date is not None]
+    self.latest_date = max(dates, default=None)
+    return (self.kwargs["feed_format"], state), None
+
+  def get(self, request, *args, **kwargs):
+    feed_class = self.get_feed_class()
+    title = self.title
+    feed = feed_class(
+      title=title,
+      link=request.build_absolute_uri(reverse("blog:home")),
+      description=title,
+      feed_url=request.build_absolute_uri(),
+      language=settings.LANGUAGE_CODE,
+      latest_date=self.latest_date,
+    )
+    items = syndication.post_feed_items(feed, self.get_entries(), request)
+    return StreamingHttpResponse(feed.stream(items), content_type=feed.content_type)
+
+
+class AuthorFeedView(PostFeedView):
+  """
+    Author feed view.
+
+    Syndication feed of latest published posts of an author.
+  """
+
+  def get_queryset(self):
+    return super().get_queryset().filter(author__username=self.kwargs["username"])
+
+  def get_feed_title(self):
+    author = get_object_or_404(models.User, username=self.kwargs["username"])
+    return f"Posts by {author.username}"
+
+
+class CategoryFeedView(PostFeedView):
+  """
+    Category feed view.
+
+    Syndication feed of latest published posts of a category.
+  """
+
+  def get_queryset(self):
+    return super().get_queryset().filter(category__slug=self.kwargs["slug"])
+
+  def get_feed_title(self):
+    category = get_object_or_404(models.Category, slug=self.kwargs["slug"])
+    return f"Posts in {category.name}"
+
+
+class TagFeedView(PostFeedView):
+  """
+    Tag feed view.
+
+    Syndication feed of latest published posts having a tag.
+  """
+
+  def get_queryset(self):
+    return super().get_queryset().get_posts_by_tags([self.kwargs["tag"]])
+
+  def get_feed_title(self):
+    tag = get_object_or_404(models.Tag, name=self.kwargs["tag"])
+    return f"Posts tagged {tag.name}"
+
+
+# Async versions of read only views, routed under ASGI (see blog/urls_async.py)
+class AsyncHomeView(AsyncPageCacheMixin, AsyncConditionalGetMixin, AsyncFeedMixin, HomeView):
+  """
+    Async home view.
+
+    HomeView for ASGI, feed page and filters lists are fetched concurrently.
+  """
+
+
+class AsyncAuthorFilterView(AsyncPageCacheMixin, AsyncConditionalGetMixin, AsyncFeedMixin, AuthorFilterView):
+  """
+    Async author filter view.
+
+    AuthorFilterView for ASGI, feed page and filters lists are fetched
+    concurrently once the author is found.
+  """
+
+
+class AsyncCategoryFilterView(AsyncPageCacheMixin, AsyncConditionalGetMixin, AsyncFeedMixin, CategoryFilterView):
+  """
+    Async category filter view.
+
+    CategoryFilterView for ASGI, feed page and filters lists are fetched
+    concurrently once the category is found.
+  """
+
+
+class AsyncTagsFilterView(AsyncPageCacheMixin, AsyncConditionalGetMixin, AsyncFeedMixin, TagsFilterView):
+  """
+    Async tags filter view.
+
+    TagsFilterView for ASGI, feed page and filters lists are fetched
+    concurrently.
+  """
+
+
+class AsyncPostView(AsyncPageCacheMixin, AsyncConditionalGetMixin, AsyncViewMixin, PostView):
+  """
+    Async post view.
+
+    PostView for ASGI. Post, with its tags and current user like state,
+    and the first comments page are fetched concurrently.
+  """
+
+  async def get(self, request, *args, **kwargs):
+    post_ref = await run_query(lambda: self.post_ref)
+    self.object, comments_page = await asyncio.gather(
+      run_query(self.get_object), run_query(self.get_comments_page, post_ref.id)
+    )
+    context = self.get_context_data(object=self.object, comments_page=comments_page)
+    return self.render_to_response(context)
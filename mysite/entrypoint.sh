@@ -1,5 +1,7 @@
-python manage.py makemigrations
-python manage.py migrate --noinput
+#!/bin/sh
+set -e
+
+# Migrations are part of the repository, they are only applied when pending
+python manage.py migrate_if_needed
 python manage.py init_admin
-python manage.py populate_history --auto
-python manage.py runserver 0.0.0.0:8000
\ No newline at end of file
+exec gunicorn --config gunicorn.conf.py
@@ -0,0 +1,24 @@
+import os
+import multiprocessing
+
+# BLOG_SERVER selects the WSGI application, served by threaded workers, or
+# the ASGI one, served by Uvicorn workers. Async views queries run in
+# BLOG_ASYNC_QUERY_THREADS threads of every ASGI worker.
+if os.environ.get("BLOG_SERVER", "wsgi") == "asgi":
+    wsgi_app = "mysite.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "mysite.wsgi:application"
+    worker_class = "gthread"
+
+bind = os.environ.get("BLOG_SERVER_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("BLOG_SERVER_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("BLOG_SERVER_THREADS", 4))
+timeout = int(os.environ.get("BLOG_SERVER_TIMEOUT", 30))
+
+# Application is imported once, before forking workers, which share its
+# memory and start serving at once. Database connections, caches and
+# threads are only opened by workers.
+preload_app = True
+
+accesslog = "-"
@@ -44,12 +44,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'blog.middleware.AsgiUrlconfMiddleware',
+    'blog.middleware.PrimaryStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'mysite.urls'
@@ -84,6 +87,42 @@ DATABASES = {
         'PASSWORD': os.environ.get("POSTGRES_PASSWORD"),
         'HOST': os.environ.get("POSTGRES_HOST"),
         'PORT': os.environ.get("POSTGRES_PORT"),
+        # Async views query threads and WSGI threads keep their connection
+        # between queries and requests for this many seconds.
+        'CONN_MAX_AGE': int(os.environ.get("POSTGRES_CONN_MAX_AGE", 60)),
+    }
+}
+
+# Read replicas of the default database, one alias per comma separated
+# host of POSTGRES_REPLICA_HOSTS. Read only views read from them, see
+# blog/routers.py. Tests read replicas through the test default database.
+for index, host in enumerate(filter(None, os.environ.get("POSTGRES_REPLICA_HOSTS", "").split(",")), 1):
+    DATABASES[f"replica{index}"] = {
+        **DATABASES["default"],
+        'NAME': os.environ.get("POSTGRES_REPLICA_DB", DATABASES["default"]["NAME"]),
+        'HOST': host.strip(),
+        'PORT': os.environ.get("POSTGRES_REPLICA_PORT", DATABASES["default"]["PORT"]),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['blog.routers.PrimaryReplicaRouter']
+
+BLOG_DB_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+
+# Clients which sent a write request read from the default database for
+# BLOG_PRIMARY_STICKINESS seconds, so they do not miss their own changes
+# while replicas lag. It is tracked by a cookie.
+BLOG_PRIMARY_STICKINESS = int(os.environ.get("BLOG_PRIMARY_STICKINESS", 10))
+BLOG_PRIMARY_STICKINESS_COOKIE = "blog_primary"
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        'LOCATION': os.environ.get("CACHE_LOCATION", ""),
     }
 }
 
@@ -127,8 +166,54 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.1/howto/static-files/
 
 STATIC_URL = '/static/'
+# Collected when the Docker image is built, outside the mounted source, and
+# served by WhiteNoise under both WSGI and ASGI servers.
+STATIC_ROOT = os.environ.get("STATIC_ROOT", BASE_DIR / "staticfiles")
 
 # LOGIN
 LOGIN_URL = "blog:sign_in"
 LOGIN_REDIRECT_URL = "blog:home"
-LOGOUT_REDIRECT_URL = "blog:index"
\ No newline at end of file
+LOGOUT_REDIRECT_URL = "blog:index"
+
+# BLOG
+BLOG_FEED_PAGE_SIZE = int(os.environ.get("BLOG_FEED_PAGE_SIZE", 20))
+BLOG_COMMENTS_PAGE_SIZE = int(os.environ.get("BLOG_COMMENTS_PAGE_SIZE", 20))
+# Posts listed by RSS, Atom and JSON feeds
+BLOG_SYNDICATION_ENTRIES = int(os.environ.get("BLOG_SYNDICATION_ENTRIES", 20))
+
+# Write-behind like buffer, see blog/likebuffer.py
+BLOG_LIKE_BUFFER = {
+    "ENABLED": os.environ.get("BLOG_LIKE_BUFFER_ENABLED", "0") == "1",
+    "FLUSH_INTERVAL": float(os.environ.get("BLOG_LIKE_BUFFER_FLUSH_INTERVAL", 1.0)),
+    "MAX_PENDING": int(os.environ.get("BLOG_LIKE_BUFFER_MAX_PENDING", 1000)),
+}
+
+# Anonymous full-page cache, see blog/pagecache.py. Purges go through
+# Django cache, so every worker must share the same cache backend.
+BLOG_PAGE_CACHE = {
+    "ENABLED": os.environ.get("BLOG_PAGE_CACHE_ENABLED", "0") == "1",
+    "TIMEOUT": int(os.environ.get("BLOG_PAGE_CACHE_TIMEOUT", 300)),
+}
+
+# Post slug -> id resolver LRU cache, see blog/resolver.py
+BLOG_SLUG_RESOLVER = {
+    "MAX_SIZE": int(os.environ.get("BLOG_SLUG_RESOLVER_MAX_SIZE", 10000)),
+    "TTL": float(os.environ.get("BLOG_SLUG_RESOLVER_TTL", 60)),
+}
+
+# ASGI requests are routed with this urlconf, where read only views are
+# async. Their queries run concurrently in a thread pool of
+# BLOG_ASYNC_QUERY_THREADS threads, each one keeping a database connection
+# open, see CONN_MAX_AGE.
+BLOG_ASGI_URLCONF = os.environ.get("BLOG_ASGI_URLCONF", "mysite.urls_async")
+BLOG_ASYNC_QUERY_THREADS = int(os.environ.get("BLOG_ASYNC_QUERY_THREADS", 10))
+
+# History retention policies by tracked model, applied by prune_history
+# command, see blog/history.py. A row is pruned once it is out of the
+# KEEP_LAST newest rows of its object and older than KEEP_DAYS days. With
+# THIN_DAILY, the last row of each day is kept too.
+BLOG_HISTORY_RETENTION = {
+    "blog.Post": {"KEEP_LAST": 50, "KEEP_DAYS": 90, "THIN_DAILY": True},
+    "blog.Category": {"KEEP_LAST": 20, "KEEP_DAYS": 365, "THIN_DAILY": False},
+    "blog.PostComment": {"KEEP_LAST": 5, "KEEP_DAYS": 30, "THIN_DAILY": True},
+}
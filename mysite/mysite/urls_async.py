@@ -0,0 +1,10 @@
+"""mysite URL Configuration for ASGI requests
+
+Same as mysite/urls.py, blog read only views are async. ASGI requests are
+routed here by blog.middleware.AsgiUrlconfMiddleware.
+"""
+from django.conf.urls import url, include
+
+urlpatterns = [
+    url("", include(("blog.urls_async", "blog"), namespace="blog"))
+]